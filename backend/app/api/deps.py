@@ -1,13 +1,25 @@
+import time
+from datetime import timedelta
 from typing import Callable, Iterable
 
 from fastapi import Depends, Header, HTTPException, status, Response
-from jose import JWTError, jwt
+from jose import JWTError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import text
 
 from app.core.config import settings
-from app.tenancy.deps import get_tenant_db
+from app.db.session import SessionLocal, tenant_session
+from app.tenancy.cache import resolve_tenant, tenant_cache
+from app.tenancy.deps import get_async_tenant_db, get_tenant_db
+from app.services.rbac import (
+    build_rbac_claims,
+    claims_are_current,
+    current_rbac_version,
+    get_request_permissions,
+    get_request_permissions_async,
+)
 from app.services.security import create_access_token
+from app.services.tokens import decode_access_token, refresh_policy
 
 
 def get_bearer_token(authorization: str | None = Header(default=None, alias="Authorization")) -> str:
@@ -16,27 +28,66 @@ def get_bearer_token(authorization: str | None = Header(default=None, alias="Aut
     return authorization.split(" ", 1)[1]
 
 
-def get_current_user_id(response: Response, token: str = Depends(get_bearer_token)) -> int:
+def get_token_payload(token: str = Depends(get_bearer_token)) -> dict:
+    try:
+        # Decode and validate token (exp enforced by library, verified payloads memoized)
+        return decode_access_token(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+def _has_stale_rbac_claims(payload: dict) -> bool:
+    claims = payload.get("rbac")
+    if not settings.jwt_embed_permissions or not claims:
+        return False
+    tenant = tenant_cache.get(payload.get("tenant") or "")
+    return tenant is not None and not claims_are_current(claims, current_rbac_version(tenant.slug))
+
+
+def _refreshed_rbac_claims(payload: dict) -> dict | None:
+    """Carry a token's permission digest forward, re-issuing it if the tenant's RBAC version moved."""
+    claims = payload.get("rbac")
+    if not settings.jwt_embed_permissions or not claims or not payload.get("tenant"):
+        return None
+    public_db = SessionLocal()
+    try:
+        # Served from the tenant and RBAC version caches on the hot path
+        tenant = resolve_tenant(public_db, payload["tenant"])
+        rbac_version = current_rbac_version(tenant.slug, public_db) if tenant else None
+    finally:
+        public_db.close()
+    if tenant is None or rbac_version is None:
+        return None
+    if claims_are_current(claims, rbac_version):
+        return claims
+    if settings.jwt_stale_permissions_policy == "reject":
+        raise HTTPException(status_code=401, detail="Permissions changed, please sign in again")
+    with tenant_session(tenant.schema_name) as tenant_db:
+        return build_rbac_claims(tenant_db, int(payload["sub"]), rbac_version)
+
+
+def get_current_user_id(response: Response, payload: dict = Depends(get_token_payload)) -> int:
     try:
-        # Decode and validate token (exp enforced by library)
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
         sub = payload.get("sub")
         # Enforce idle timeout based on 'iat' claim to handle inactivity
         issued_at = payload.get("iat")
         if issued_at is not None:
-            from datetime import datetime, timezone, timedelta
-            now = datetime.now(timezone.utc)
-            iat_dt = datetime.fromtimestamp(int(issued_at), tz=timezone.utc)
-            idle_limit = timedelta(minutes=settings.session_idle_timeout_minutes)
-            if now - iat_dt > idle_limit:
+            now = time.time()
+            if refresh_policy.is_idle_expired(int(issued_at), now):
                 raise HTTPException(status_code=401, detail="Session expired due to inactivity")
-            # Sliding session: refresh token so active users stay logged in
-            extra = {}
-            tenant = payload.get("tenant")
-            if tenant:
-                extra["tenant"] = tenant
-            new_token = create_access_token(subject=str(sub), expires_delta=idle_limit, extra=extra)
-            response.headers["X-Refreshed-Token"] = new_token
+            # Sliding session: refresh token so active users stay logged in. Young
+            # tokens are left alone unless their permission digest went stale.
+            if refresh_policy.should_refresh(int(issued_at), now) or _has_stale_rbac_claims(payload):
+                extra = {}
+                tenant = payload.get("tenant")
+                if tenant:
+                    extra["tenant"] = tenant
+                rbac = _refreshed_rbac_claims(payload)
+                if rbac:
+                    extra["rbac"] = rbac
+                idle_limit = timedelta(seconds=refresh_policy.idle_timeout_seconds)
+                new_token = create_access_token(subject=str(sub), expires_delta=idle_limit, extra=extra)
+                response.headers["X-Refreshed-Token"] = new_token
         if sub is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         return int(sub)
@@ -50,18 +101,9 @@ def require_roles(required: Iterable[str]) -> Callable:
     def dependency(
         db: Session = Depends(get_tenant_db),
         user_id: int = Depends(get_current_user_id),
+        payload: dict = Depends(get_token_payload),
     ) -> None:
-        rows = db.execute(
-            text(
-                """
-                SELECT r.name FROM roles r
-                JOIN user_roles ur ON ur.role_id = r.id
-                WHERE ur.user_id = :uid
-                """
-            ),
-            {"uid": user_id},
-        ).scalars().all()
-        if not set(rows).intersection(required_set):
+        if not get_request_permissions(db, user_id, payload).has_any_role(required_set):
             raise HTTPException(status_code=403, detail="Insufficient role")
 
     return dependency
@@ -73,20 +115,39 @@ def require_permissions(required: Iterable[str]) -> Callable:
     def dependency(
         db: Session = Depends(get_tenant_db),
         user_id: int = Depends(get_current_user_id),
+        payload: dict = Depends(get_token_payload),
+    ) -> None:
+        if not get_request_permissions(db, user_id, payload).has_any_permission(required_set):
+            raise HTTPException(status_code=403, detail="Insufficient permission")
+
+    return dependency
+
+
+def require_roles_async(required: Iterable[str]) -> Callable:
+    """require_roles for routes running on the async tenant session."""
+    required_set = set(r.strip() for r in required)
+
+    async def dependency(
+        db: AsyncSession = Depends(get_async_tenant_db),
+        user_id: int = Depends(get_current_user_id),
+        payload: dict = Depends(get_token_payload),
+    ) -> None:
+        if not (await get_request_permissions_async(db, user_id, payload)).has_any_role(required_set):
+            raise HTTPException(status_code=403, detail="Insufficient role")
+
+    return dependency
+
+
+def require_permissions_async(required: Iterable[str]) -> Callable:
+    """require_permissions for routes running on the async tenant session."""
+    required_set = set(p.strip() for p in required)
+
+    async def dependency(
+        db: AsyncSession = Depends(get_async_tenant_db),
+        user_id: int = Depends(get_current_user_id),
+        payload: dict = Depends(get_token_payload),
     ) -> None:
-        rows = db.execute(
-            text(
-                """
-                SELECT DISTINCT p.name
-                FROM permissions p
-                JOIN role_permissions rp ON rp.permission_id = p.id
-                JOIN user_roles ur ON ur.role_id = rp.role_id
-                WHERE ur.user_id = :uid
-                """
-            ),
-            {"uid": user_id},
-        ).scalars().all()
-        if not set(rows).intersection(required_set):
+        if not (await get_request_permissions_async(db, user_id, payload)).has_any_permission(required_set):
             raise HTTPException(status_code=403, detail="Insufficient permission")
 
     return dependency
@@ -3,6 +3,7 @@ from fastapi import Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+from app.services.audit import AuditEvent, audit_writer
 from app.tenancy.deps import get_tenant_db
 from app.api.deps import get_current_user_id
 
@@ -17,7 +18,11 @@ def log_audit_event(
     new_values: Optional[dict] = None,
     request: Optional[Request] = None
 ):
-    """Log security-relevant events for audit trail"""
+    """Log security-relevant events for audit trail.
+
+    The event is buffered and written in a batch by the audit writer, so the
+    request pays no database round trip (unless AUDIT_MODE is "sync").
+    """
     try:
         ip_address = None
         user_agent = None
@@ -32,27 +37,20 @@ def log_audit_event(
             
             user_agent = request.headers.get('User-Agent', '')[:500]  # Truncate
         
-        # Get current tenant schema
-        tenant_schema = db.execute(text("SELECT current_schema()")).scalar()
-        
-        db.execute(text("""
-            INSERT INTO audit_logs 
-            (user_id, action, resource_type, resource_id, old_values, new_values, 
-             ip_address, user_agent, tenant_schema)
-            VALUES (:user_id, :action, :resource_type, :resource_id, :old_values, 
-                    :new_values, :ip_address, :user_agent, :tenant_schema)
-        """), {
-            "user_id": user_id,
-            "action": action,
-            "resource_type": resource_type,
-            "resource_id": resource_id,
-            "old_values": old_values,
-            "new_values": new_values,
-            "ip_address": ip_address,
-            "user_agent": user_agent,
-            "tenant_schema": tenant_schema
-        })
-        db.commit()
+        # Tenant sessions carry their schema; others still ask the database
+        tenant_schema = db.info.get("tenant_schema") or db.execute(text("SELECT current_schema()")).scalar()
+        
+        audit_writer.enqueue(AuditEvent(
+            tenant_schema=tenant_schema,
+            user_id=user_id,
+            action=action,
+            resource_type=resource_type,
+            resource_id=resource_id,
+            old_values=old_values,
+            new_values=new_values,
+            ip_address=ip_address,
+            user_agent=user_agent,
+        ))
     except Exception as e:
         print(f"Audit logging failed: {e}")
         # Don't fail the main operation if audit logging fails
@@ -3,6 +3,7 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
@@ -13,10 +14,15 @@ from app.schemas.academic import (
     AttendanceCreate, AttendanceRead, AttendanceUpdate,
     AcademicRecordCreate, AcademicRecordRead, AcademicRecordUpdate,
     BulkAttendanceCreate, StudentAcademicSummary,
-    ExamScheduleCreate, ExamScheduleRead, ExamScheduleUpdate
+    ExamScheduleCreate, ExamScheduleRead, ExamScheduleUpdate,
+    ReportCardBatch
 )
-from app.tenancy.deps import get_tenant_db
-from app.api.deps import require_roles, require_permissions, get_current_user_id
+from app.tenancy.deps import get_async_tenant_db, get_tenant_db
+from app.api.deps import require_roles, require_permissions, require_permissions_async, get_current_user_id
+from app.services.attendance import upsert_attendance
+from app.services.grading import get_grading_engine, invalidate_grading
+from app.services.report_cards import get_class_report_cards, get_school_report_cards, invalidate_report_cards
+from app.services.term_results import classes_of_students, get_term_results, refresh_term_results
 
 
 router = APIRouter()
@@ -25,42 +31,13 @@ router = APIRouter()
 def _compute_grade_for_scores(db: Session, ca_score: Optional[float], exam_score: Optional[float], explicit_overall: Optional[float]) -> tuple[Optional[float], Optional[str], Optional[float]]:
     """Compute overall score, grade letter, and grade points using current grading policy and grade scales.
     Returns (overall_score, grade_letter, grade_points)."""
-    policy = db.execute(text("SELECT policy_type, ca_weight, exam_weight FROM grading_policies LIMIT 1")).mappings().first()
-    ca_w = float(policy.ca_weight) if policy and policy.ca_weight is not None else 40.0
-    ex_w = float(policy.exam_weight) if policy and policy.exam_weight is not None else 60.0
-
-    overall: Optional[float] = None
-    if explicit_overall is not None:
-        overall = float(explicit_overall)
-    elif ca_score is not None or exam_score is not None:
-        ca = float(ca_score or 0)
-        ex = float(exam_score or 0)
-        overall = round((ca * ca_w / 100.0) + (ex * ex_w / 100.0), 2)
-
-    # Determine grade via grade scales
-    letter: Optional[str] = None
-    points: Optional[float] = None
-    if overall is not None:
-        scales = db.execute(text("""
-            SELECT letter, min_score, max_score, points
-            FROM grade_scales
-            ORDER BY sort_order ASC, min_score DESC
-        """)).mappings().all()
-        for s in scales:
-            try:
-                if float(s.min_score) <= overall <= float(s.max_score):
-                    letter = s.letter
-                    points = float(s.points) if s.points is not None else None
-                    break
-            except Exception:
-                continue
-    return overall, letter, points
+    return get_grading_engine(db).compute(ca_score, exam_score, explicit_overall)
 
 
 # Class Management
-@router.get("/classes", response_model=List[ClassRead], dependencies=[Depends(require_permissions(["academic.read"]))])
-def list_classes(
-    db: Session = Depends(get_tenant_db),
+@router.get("/classes", response_model=List[ClassRead], dependencies=[Depends(require_permissions_async(["academic.read"]))])
+async def list_classes(
+    db: AsyncSession = Depends(get_async_tenant_db),
     user_id: int = Depends(get_current_user_id),
     academic_year: Optional[str] = Query(None)
 ):
@@ -71,7 +48,7 @@ def list_classes(
         params["year"] = academic_year
     query += " ORDER BY name"
     
-    rows = db.execute(text(query), params).mappings().all()
+    rows = (await db.execute(text(query), params)).mappings().all()
     return [ClassRead(**dict(r)) for r in rows]
 
 
@@ -106,8 +83,8 @@ def create_class(payload: ClassCreate, db: Session = Depends(get_tenant_db)):
 
 
 @router.get("/classes/{class_id}", response_model=ClassRead)
-def get_class(class_id: int, db: Session = Depends(get_tenant_db), user_id: int = Depends(get_current_user_id)):
-    row = db.execute(text("SELECT * FROM classes WHERE id = :id"), {"id": class_id}).mappings().first()
+async def get_class(class_id: int, db: AsyncSession = Depends(get_async_tenant_db), user_id: int = Depends(get_current_user_id)):
+    row = (await db.execute(text("SELECT * FROM classes WHERE id = :id"), {"id": class_id})).mappings().first()
     if not row:
         raise HTTPException(status_code=404, detail="Class not found")
     return ClassRead(**dict(row))
@@ -155,9 +132,9 @@ def update_class(class_id: int, payload: ClassUpdate, db: Session = Depends(get_
 
 
 # Subject Management
-@router.get("/subjects", response_model=List[SubjectRead], dependencies=[Depends(require_permissions(["academic.read"]))])
-def list_subjects(db: Session = Depends(get_tenant_db), user_id: int = Depends(get_current_user_id)):
-    rows = db.execute(text("SELECT * FROM subjects ORDER BY name")).mappings().all()
+@router.get("/subjects", response_model=List[SubjectRead], dependencies=[Depends(require_permissions_async(["academic.read"]))])
+async def list_subjects(db: AsyncSession = Depends(get_async_tenant_db), user_id: int = Depends(get_current_user_id)):
+    rows = (await db.execute(text("SELECT * FROM subjects ORDER BY name"))).mappings().all()
     return [SubjectRead(**dict(r)) for r in rows]
 
 
@@ -184,17 +161,17 @@ def create_subject(payload: SubjectCreate, db: Session = Depends(get_tenant_db))
 
 
 @router.get("/subjects/{subject_id}", response_model=SubjectRead)
-def get_subject(subject_id: int, db: Session = Depends(get_tenant_db), user_id: int = Depends(get_current_user_id)):
-    row = db.execute(text("SELECT * FROM subjects WHERE id = :id"), {"id": subject_id}).mappings().first()
+async def get_subject(subject_id: int, db: AsyncSession = Depends(get_async_tenant_db), user_id: int = Depends(get_current_user_id)):
+    row = (await db.execute(text("SELECT * FROM subjects WHERE id = :id"), {"id": subject_id})).mappings().first()
     if not row:
         raise HTTPException(status_code=404, detail="Subject not found")
     return SubjectRead(**dict(row))
 
 
 # Class-Subject Assignment
-@router.get("/class-subjects", response_model=List[ClassSubjectRead], dependencies=[Depends(require_permissions(["academic.read"]))])
-def list_class_subjects(
-    db: Session = Depends(get_tenant_db),
+@router.get("/class-subjects", response_model=List[ClassSubjectRead], dependencies=[Depends(require_permissions_async(["academic.read"]))])
+async def list_class_subjects(
+    db: AsyncSession = Depends(get_async_tenant_db),
     user_id: int = Depends(get_current_user_id),
     class_id: Optional[int] = Query(None)
 ):
@@ -210,7 +187,7 @@ def list_class_subjects(
         params["class_id"] = class_id
     query += " ORDER BY c.name, s.name"
     
-    rows = db.execute(text(query), params).mappings().all()
+    rows = (await db.execute(text(query), params)).mappings().all()
     return [ClassSubjectRead(**dict(r)) for r in rows]
 
 
@@ -240,9 +217,9 @@ def assign_subject_to_class(payload: ClassSubjectCreate, db: Session = Depends(g
 
 
 # Attendance Management
-@router.get("/attendance", response_model=List[AttendanceRead], dependencies=[Depends(require_permissions(["academic.read"]))])
-def list_attendance(
-    db: Session = Depends(get_tenant_db),
+@router.get("/attendance", response_model=List[AttendanceRead], dependencies=[Depends(require_permissions_async(["academic.read"]))])
+async def list_attendance(
+    db: AsyncSession = Depends(get_async_tenant_db),
     user_id: int = Depends(get_current_user_id),
     class_id: Optional[int] = Query(None),
     date: Optional[date] = Query(None),
@@ -269,7 +246,7 @@ def list_attendance(
     
     query += " ORDER BY a.date DESC, s.first_name"
     
-    rows = db.execute(text(query), params).mappings().all()
+    rows = (await db.execute(text(query), params)).mappings().all()
     # created_at may be absent in test table; pass through None
     return [AttendanceRead(**dict(r)) for r in rows]
 
@@ -315,23 +292,13 @@ def create_attendance(payload: AttendanceCreate, db: Session = Depends(get_tenan
 @router.post("/attendance/bulk", dependencies=[Depends(require_permissions(["academic.attendance"]))])
 def create_bulk_attendance(payload: BulkAttendanceCreate, db: Session = Depends(get_tenant_db), user_id: int = Depends(get_current_user_id)):
     try:
-        for record in payload.attendance_records:
-            db.execute(
-                text("""
-                    INSERT INTO attendance(student_id, class_id, date, status, notes, recorded_by)
-                    VALUES (:student, :class, :date, :status, :notes, :recorded_by)
-                    ON CONFLICT (student_id, class_id, date) DO UPDATE SET
-                    status = EXCLUDED.status, notes = EXCLUDED.notes, recorded_by = EXCLUDED.recorded_by
-                """),
-                {
-                    "student": record.student_id,
-                    "class": payload.class_id,
-                    "date": payload.date,
-                    "status": record.status,
-                    "notes": record.notes,
-                    "recorded_by": user_id,
-                }
-            )
+        upsert_attendance(
+            db,
+            payload.class_id,
+            payload.date,
+            [(r.student_id, r.status, r.notes) for r in payload.attendance_records],
+            user_id,
+        )
         db.commit()
         return {"message": f"Attendance recorded for {len(payload.attendance_records)} students"}
     except Exception as ex:
@@ -340,9 +307,9 @@ def create_bulk_attendance(payload: BulkAttendanceCreate, db: Session = Depends(
 
 
 # Academic Records
-@router.get("/academic-records", response_model=List[AcademicRecordRead], dependencies=[Depends(require_permissions(["academic.read"]))])
-def list_academic_records(
-    db: Session = Depends(get_tenant_db),
+@router.get("/academic-records", response_model=List[AcademicRecordRead], dependencies=[Depends(require_permissions_async(["academic.read"]))])
+async def list_academic_records(
+    db: AsyncSession = Depends(get_async_tenant_db),
     user_id: int = Depends(get_current_user_id),
     student_id: Optional[int] = Query(None),
     class_id: Optional[int] = Query(None),
@@ -379,7 +346,7 @@ def list_academic_records(
     
     query += " ORDER BY ar.student_id, ar.subject_id, ar.term"
     
-    rows = db.execute(text(query), params).mappings().all()
+    rows = (await db.execute(text(query), params)).mappings().all()
     return [AcademicRecordRead(**dict(r)) for r in rows]
 
 
@@ -437,6 +404,7 @@ def create_academic_record(payload: AcademicRecordCreate, db: Session = Depends(
             "year": payload.academic_year
         }).mappings().first()
         db.commit()
+        invalidate_report_cards(db)
         return AcademicRecordRead(**dict(row))
     except Exception as ex:
         db.rollback()
@@ -446,9 +414,9 @@ def create_academic_record(payload: AcademicRecordCreate, db: Session = Depends(
 # Report Card and Analytics remain below ...
 
 # Grading policy management
-@router.get("/grading/policy", dependencies=[Depends(require_permissions(["academic.read"]))])
-def get_grading_policy(db: Session = Depends(get_tenant_db), user_id: int = Depends(get_current_user_id)):
-    row = db.execute(text("SELECT id, policy_type, ca_weight, exam_weight, pass_mark FROM grading_policies LIMIT 1")).mappings().first()
+@router.get("/grading/policy", dependencies=[Depends(require_permissions_async(["academic.read"]))])
+async def get_grading_policy(db: AsyncSession = Depends(get_async_tenant_db), user_id: int = Depends(get_current_user_id)):
+    row = (await db.execute(text("SELECT id, policy_type, ca_weight, exam_weight, pass_mark FROM grading_policies LIMIT 1"))).mappings().first()
     if not row:
         raise HTTPException(status_code=404, detail="Grading policy not found")
     return dict(row)
@@ -483,12 +451,13 @@ def update_grading_policy(
     db.execute(text(q), params)
     row = db.execute(text("SELECT id, policy_type, ca_weight, exam_weight, pass_mark FROM grading_policies LIMIT 1")).mappings().first()
     db.commit()
+    invalidate_grading(db)
     return dict(row)
 
 
-@router.get("/grading/scales", dependencies=[Depends(require_permissions(["academic.read"]))])
-def get_grade_scales(db: Session = Depends(get_tenant_db), user_id: int = Depends(get_current_user_id)):
-    rows = db.execute(text("SELECT id, letter, min_score, max_score, points, remarks, sort_order FROM grade_scales ORDER BY sort_order ASC, min_score DESC")).mappings().all()
+@router.get("/grading/scales", dependencies=[Depends(require_permissions_async(["academic.read"]))])
+async def get_grade_scales(db: AsyncSession = Depends(get_async_tenant_db), user_id: int = Depends(get_current_user_id)):
+    rows = (await db.execute(text("SELECT id, letter, min_score, max_score, points, remarks, sort_order FROM grade_scales ORDER BY sort_order ASC, min_score DESC"))).mappings().all()
     return [dict(r) for r in rows]
 
 
@@ -509,6 +478,7 @@ def create_grade_scale(
     """), {"l": letter, "min": min_score, "max": max_score, "p": points, "r": remarks, "o": sort_order or 0})
     row = db.execute(text("SELECT id, letter, min_score, max_score, points, remarks, sort_order FROM grade_scales WHERE letter = :l AND min_score = :min AND max_score = :max"), {"l": letter, "min": min_score, "max": max_score}).mappings().first()
     db.commit()
+    invalidate_grading(db)
     return dict(row)
 
 
@@ -552,6 +522,7 @@ def update_grade_scale(
         raise HTTPException(status_code=404, detail="Scale not found")
     row = db.execute(text("SELECT id, letter, min_score, max_score, points, remarks, sort_order FROM grade_scales WHERE id = :id"), {"id": scale_id}).mappings().first()
     db.commit()
+    invalidate_grading(db)
     return dict(row)
 
 
@@ -561,6 +532,7 @@ def delete_grade_scale(scale_id: int, db: Session = Depends(get_tenant_db), user
     if res.rowcount == 0:
         raise HTTPException(status_code=404, detail="Scale not found")
     db.commit()
+    invalidate_grading(db)
     return {"message": "Deleted"}
 
 
@@ -583,30 +555,70 @@ def finalize_results(
     if class_id:
         q += " AND class_id = :cid"
         params["cid"] = class_id
-    db.execute(text(q), params)
+    student_ids = db.execute(text(q + " RETURNING student_id"), params).scalars().all()
+    # Positions depend on every classmate, so the affected classes are ranked whole
+    ranked = refresh_term_results(db, academic_year, term, classes_of_students(db, set(student_ids)))
     db.commit()
-    return {"message": "Results finalized"}
+    invalidate_report_cards(db)
+    return {"message": "Results finalized", "finalized": len(student_ids), "ranked": ranked}
+
+
+@router.get("/term-results", dependencies=[Depends(require_permissions(["academic.read"]))])
+def list_term_results(
+    term: str = Query(...),
+    academic_year: str = Query(...),
+    class_name: Optional[str] = Query(None),
+    db: Session = Depends(get_tenant_db),
+):
+    """Term averages, GPAs and class positions stored when results were finalized."""
+    return get_term_results(db, academic_year, term, class_name)
+
+
+@router.get("/report-cards", response_model=ReportCardBatch, dependencies=[Depends(require_permissions_async(["reports.generate"]))])
+async def generate_report_cards(
+    term: str = Query(...),
+    academic_year: str = Query(...),
+    class_name: Optional[str] = Query(None, description="Omit to generate cards for every class"),
+    db: AsyncSession = Depends(get_async_tenant_db),
+):
+    """Report cards with class positions for one class or the whole school, from finalized results."""
+    if class_name:
+        classes = {class_name: await get_class_report_cards(db, class_name, academic_year, term)}
+    else:
+        classes = await get_school_report_cards(db, academic_year, term)
+    return {
+        "academic_year": academic_year,
+        "term": term,
+        "classes": [
+            {
+                "class_name": name or "Not Assigned",
+                "students": sorted(cards.values(), key=lambda c: (c.get("class_position") or 0, c["student_id"])),
+            }
+            for name, cards in sorted(classes.items(), key=lambda item: item[0] or "")
+            if cards
+        ],
+    }
 
 
 # Parent endpoints
-@router.get("/parent/students", dependencies=[Depends(require_permissions(["academic.read"]))])
-def list_parent_students(db: Session = Depends(get_tenant_db), user_id: int = Depends(get_current_user_id)):
-    rows = db.execute(text("""
+@router.get("/parent/students", dependencies=[Depends(require_permissions_async(["academic.read"]))])
+async def list_parent_students(db: AsyncSession = Depends(get_async_tenant_db), user_id: int = Depends(get_current_user_id)):
+    rows = (await db.execute(text("""
         SELECT s.id, s.first_name, s.last_name, s.admission_no, s.class_name
         FROM parent_students ps
         JOIN students s ON ps.student_id = s.id
         WHERE ps.parent_user_id = :uid
         ORDER BY s.first_name, s.last_name
-    """), {"uid": user_id}).mappings().all()
+    """), {"uid": user_id})).mappings().all()
     return [dict(r) for r in rows]
 
 
-@router.get("/parent/results", dependencies=[Depends(require_permissions(["academic.read"]))])
-def parent_results(
+@router.get("/parent/results", dependencies=[Depends(require_permissions_async(["academic.read"]))])
+async def parent_results(
     student_id: Optional[int] = Query(None),
     term: Optional[str] = Query(None),
     academic_year: Optional[str] = Query(None),
-    db: Session = Depends(get_tenant_db),
+    db: AsyncSession = Depends(get_async_tenant_db),
     user_id: int = Depends(get_current_user_id)
 ):
     query = """
@@ -629,5 +641,5 @@ def parent_results(
         query += " AND ar.academic_year = :yr"
         params["yr"] = academic_year
     query += " ORDER BY ar.academic_year DESC, ar.term, ar.student_id"
-    rows = db.execute(text(query), params).mappings().all()
+    rows = (await db.execute(text(query), params)).mappings().all()
     return [dict(r) for r in rows]
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from typing import Optional, Tuple
 
 from app.schemas.auth import LoginRequest, Token
-from app.services.security import create_access_token, verify_password
+from app.core.config import settings
+from app.services.rbac import build_rbac_claims, current_rbac_version, get_effective_permissions
+from app.services.password_hasher import password_hasher
+from app.services.security import create_access_token
+from app.services.user_directory import find_user, register_user
+from app.tenancy.domains import DomainTarget, resolve_email_domain
 from app.tenancy.deps import get_tenant_db
 from app.api.deps import get_current_user_id
 
@@ -11,71 +17,49 @@ from app.api.deps import get_current_user_id
 router = APIRouter()
 
 
+def _store_rehash(db: Session, table: str, user_id: int, new_hash: str) -> None:
+    """Replace a hash made with outdated bcrypt parameters after a successful login."""
+    db.execute(text(f"UPDATE {table} SET hashed_password = :h WHERE id = :id"), {"h": new_hash, "id": user_id})
+    db.commit()
+
+
+def _login_target(email: str) -> Tuple[Optional[DomainTarget], bool]:
+    """The tenant to authenticate an email against, and whether it came from the user directory.
+
+    The directory answers with one indexed lookup. The email domain decides
+    between accounts in several schools and covers users not yet in the
+    directory.
+    """
+    from app.db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        entries = find_user(db, email)
+    finally:
+        db.close()
+    if len(entries) == 1:
+        return DomainTarget(entries[0].slug, entries[0].schema_name), True
+    by_domain = resolve_email_domain(email.split('@')[-1])
+    if not entries:
+        return by_domain, False
+    if by_domain and any(e.schema_name == by_domain.schema_name for e in entries):
+        return by_domain, True
+    return None, True
+
+
 @router.post("/simple-login", response_model=Token)
 def simple_login(payload: LoginRequest):
-    """Simplified login that auto-detects tenant from email domain"""
-    from app.db.session import SessionLocal
-    
-    # Extract domain from email to determine tenant
-    email_domain = payload.username.split('@')[-1]
-    tenant_slug = None
-    
-    # Map email domains to tenant slugs
-    domain_mapping = {
-        'parent.ndirande-high.edu': 'ndirande-high',
-        'ndirande-high.edu': 'ndirande-high',
-        'teacher.ndirande-high.edu': 'ndirande-high',
-        'admin.ndirande-high.edu': 'ndirande-high',
-    }
-    
-    # Check if we have a direct mapping
-    if email_domain in domain_mapping:
-        tenant_slug = domain_mapping[email_domain]
-    else:
-        # Fallback: try to extract tenant from email pattern
-        if 'ndirande' in email_domain.lower():
-            tenant_slug = 'ndirande-high'
-        else:
-            # Try to find tenant by partial matching
-            public_db = SessionLocal()
-            try:
-                # Look for tenant by slug pattern
-                domain_parts = email_domain.replace('.edu', '').replace('.', '-').split('-')
-                for part in domain_parts:
-                    if len(part) > 2:  # Ignore very short parts
-                        tenant_row = public_db.execute(
-                            text("SELECT slug FROM public.tenants WHERE slug ILIKE :pattern"),
-                            {"pattern": f"%{part}%"}
-                        ).first()
-                        if tenant_row:
-                            tenant_slug = tenant_row.slug
-                            break
-            finally:
-                public_db.close()
-        
-        if not tenant_slug:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, 
-                detail="Could not determine school from email address. Please contact your administrator."
-            )
-    
-    # Now connect to tenant database and authenticate
+    """Simplified login that finds the tenant from the user directory or the email domain"""
     from app.db.session import tenant_session
-    from app.tenancy.service import TenantService
     
-    # First, get the tenant's schema name
-    public_db = SessionLocal()
-    try:
-        tenant_service = TenantService(public_db)
-        tenant = tenant_service.get_by_slug(tenant_slug)
-        if not tenant:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, 
-                detail="Invalid school configuration"
-            )
-        schema_name = tenant.schema_name
-    finally:
-        public_db.close()
+    target, in_directory = _login_target(payload.username)
+    if not target:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, 
+            detail="Could not determine school from email address. Please contact your administrator."
+        )
+    tenant_slug = target.slug
+    schema_name = target.schema_name
     
     # Now connect to tenant database
     with tenant_session(schema_name) as tenant_db:
@@ -86,30 +70,67 @@ def simple_login(payload: LoginRequest):
         
         if not user_row:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-        if not verify_password(payload.password, user_row.hashed_password):
+        verified, new_hash = password_hasher.verify(payload.password, user_row.hashed_password)
+        if not verified:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
         if not user_row.is_active:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+        if new_hash:
+            _store_rehash(tenant_db, "users", user_row.id, new_hash)
+        if not in_directory:
+            # Users created outside the API get their directory entry on first login
+            register_user(tenant_db, user_row.id, user_row.email, schema_name)
+            tenant_db.commit()
 
         # Create token with tenant context
+        extra = {"tenant": tenant_slug}
+        if settings.jwt_embed_permissions:
+            from app.db.session import SessionLocal
+            from app.tenancy.cache import resolve_tenant
+
+            public_db = SessionLocal()
+            try:
+                tenant = resolve_tenant(public_db, tenant_slug)
+            finally:
+                public_db.close()
+            rbac_version = current_rbac_version(tenant.slug) if tenant else None
+            rbac = build_rbac_claims(tenant_db, user_row.id, rbac_version) if rbac_version is not None else None
+            if rbac:
+                extra["rbac"] = rbac
         token = create_access_token(
             subject=str(user_row.id),
-            extra={"tenant": tenant_slug}
+            extra=extra
         )
         return Token(access_token=token)
 
 
 @router.post("/login", response_model=Token)
-def login(payload: LoginRequest, db: Session = Depends(get_tenant_db)):
+def login(
+    payload: LoginRequest,
+    db: Session = Depends(get_tenant_db),
+    x_tenant: str | None = Header(default=None, alias="X-Tenant"),
+):
     user_row = db.execute(text("SELECT id, email, hashed_password, is_active FROM users WHERE email=:e"), {"e": payload.username}).first()
     if not user_row:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    if not verify_password(payload.password, user_row.hashed_password):
+    verified, new_hash = password_hasher.verify(payload.password, user_row.hashed_password)
+    if not verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     if not user_row.is_active:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
-
-    token = create_access_token(subject=str(user_row.id))
+    if new_hash:
+        _store_rehash(db, "users", user_row.id, new_hash)
+
+    extra = {}
+    if settings.jwt_embed_permissions and x_tenant:
+        # get_tenant_db has just resolved the tenant, so this is a cache hit
+        from app.tenancy.cache import tenant_cache
+        tenant = tenant_cache.get(x_tenant.strip())
+        rbac_version = current_rbac_version(tenant.slug, db) if tenant else None
+        rbac = build_rbac_claims(db, user_row.id, rbac_version) if rbac_version is not None else None
+        if rbac:
+            extra = {"tenant": tenant.slug, "rbac": rbac}
+    token = create_access_token(subject=str(user_row.id), extra=extra or None)
     return Token(access_token=token)
 
 
@@ -127,10 +148,13 @@ def super_admin_login(payload: LoginRequest):
 
         if not user_row:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-        if not verify_password(payload.password, user_row.hashed_password):
+        verified, new_hash = password_hasher.verify(payload.password, user_row.hashed_password)
+        if not verified:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
         if not user_row.is_active:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+        if new_hash:
+            _store_rehash(db, "public.platform_admins", user_row.id, new_hash)
 
         # Create platform token with super admin privileges; no tenant claim
         token = create_access_token(
@@ -166,9 +190,8 @@ def me(request: Request, user_id: int = Depends(get_current_user_id)):
     # Get tenant schema from slug
     public_db = SessionLocal()
     try:
-        from app.tenancy.service import TenantService
-        tenant_service = TenantService(public_db)
-        tenant = tenant_service.get_by_slug(tenant_slug)
+        from app.tenancy.cache import resolve_tenant
+        tenant = resolve_tenant(public_db, tenant_slug)
         if not tenant:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tenant not found")
         schema_name = tenant.schema_name
@@ -180,30 +203,9 @@ def me(request: Request, user_id: int = Depends(get_current_user_id)):
         user = tenant_db.execute(text("SELECT id, email, full_name, is_active FROM users WHERE id=:id"), {"id": user_id}).mappings().first()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
-        roles = tenant_db.execute(
-            text(
-                """
-                SELECT r.name FROM roles r
-                JOIN user_roles ur ON ur.role_id = r.id
-                WHERE ur.user_id = :uid
-                """
-            ),
-            {"uid": user_id},
-        ).scalars().all()
-        permissions = tenant_db.execute(
-            text(
-                """
-                SELECT DISTINCT p.name
-                FROM permissions p
-                JOIN role_permissions rp ON rp.permission_id = p.id
-                JOIN user_roles ur ON ur.role_id = rp.role_id
-                WHERE ur.user_id = :uid
-                """
-            ),
-            {"uid": user_id},
-        ).scalars().all()
+        perms = get_effective_permissions(tenant_db, user_id)
         data = dict(user)
-        data.update({"roles": roles, "permissions": permissions})
+        data.update({"roles": sorted(perms.roles), "permissions": sorted(perms.permissions)})
         return data
 
 
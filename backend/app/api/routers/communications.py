@@ -1,16 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import Optional
-from app.tenancy.deps import get_tenant_db
-from app.api.deps import get_current_user_id, require_permissions
+from app.tenancy.deps import get_async_tenant_db, get_tenant_db
+from app.api.deps import get_current_user_id, require_permissions, require_permissions_async
 
 router = APIRouter()
 
 # List announcements
-@router.get("/announcements", dependencies=[Depends(require_permissions(["communications.read"]))])
-def list_announcements(
-    db: Session = Depends(get_tenant_db),
+@router.get("/announcements", dependencies=[Depends(require_permissions_async(["communications.read"]))])
+async def list_announcements(
+    db: AsyncSession = Depends(get_async_tenant_db),
     user_id: int = Depends(get_current_user_id),
     published: Optional[bool] = Query(None),
     search: Optional[str] = Query(None)
@@ -33,7 +34,7 @@ def list_announcements(
         params["s"] = f"%{search.lower()}%"
     query += " ORDER BY COALESCE(a.published_at, a.created_at) DESC, a.id DESC"
 
-    rows = db.execute(text(query), params).mappings().all()
+    rows = (await db.execute(text(query), params)).mappings().all()
     return [dict(r) for r in rows]
 
 
@@ -88,9 +89,9 @@ def create_announcement(
 
 
 # Get announcement
-@router.get("/announcements/{ann_id}", dependencies=[Depends(require_permissions(["communications.read"]))])
-def get_announcement(ann_id: int, db: Session = Depends(get_tenant_db), user_id: int = Depends(get_current_user_id)):
-    row = db.execute(
+@router.get("/announcements/{ann_id}", dependencies=[Depends(require_permissions_async(["communications.read"]))])
+async def get_announcement(ann_id: int, db: AsyncSession = Depends(get_async_tenant_db), user_id: int = Depends(get_current_user_id)):
+    row = (await db.execute(
         text(
             """
             SELECT a.id, a.title, a.content, a.audience_type, a.audience_value,
@@ -103,7 +104,7 @@ def get_announcement(ann_id: int, db: Session = Depends(get_tenant_db), user_id:
             """
         ),
         {"id": ann_id},
-    ).mappings().first()
+    )).mappings().first()
     if not row:
         raise HTTPException(status_code=404, detail="Announcement not found")
     return dict(row)
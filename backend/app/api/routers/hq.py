@@ -1,9 +1,21 @@
-from fastapi import APIRouter, Depends
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
-from app.db.session import get_public_session, tenant_session
+from app.db.pool_metrics import pool_metrics, pool_status
+from app.services.audit import audit_writer
+from app.services.password_hasher import password_hasher
+from app.db.session import (
+    async_engine,
+    async_tenant_engine,
+    engine,
+    get_public_session,
+    tenant_engine,
+)
 from app.api.deps import require_hq_access
+from app.tenancy.metrics import dashboard_counts
 
 
 router = APIRouter()
@@ -16,27 +28,43 @@ def list_tenants(db: Session = Depends(get_public_session)):
 
 
 @router.get("/summary", dependencies=[Depends(require_hq_access)])
-def summary(db: Session = Depends(get_public_session)):
+def summary(
+    db: Session = Depends(get_public_session),
+    mode: Optional[str] = Query(None, pattern="^(stored|exact|estimate)$"),
+):
     tenants = db.execute(text("SELECT id, name, slug, schema_name FROM tenants ORDER BY id ASC")).mappings().all()
+    counts = dashboard_counts(db, [t["schema_name"] for t in tenants], ["students", "invoices", "payments"], mode)
     results: list[dict] = []
     for t in tenants:
-        schema = t["schema_name"]
-        students = invoices = payments = 0
-        try:
-            with tenant_session(schema) as tdb:
-                students = int(tdb.execute(text("SELECT count(*) FROM students")).scalar() or 0)
-                invoices = int(tdb.execute(text("SELECT count(*) FROM invoices")).scalar() or 0)
-                payments = int(tdb.execute(text("SELECT count(*) FROM payments")).scalar() or 0)
-        except Exception:
-            pass
         results.append({
             "id": t["id"],
             "name": t["name"],
             "slug": t["slug"],
-            "students": students,
-            "invoices": invoices,
-            "payments": payments,
+            **counts[t["schema_name"]],
         })
     return {"tenants": results}
 
 
+@router.get("/pool", dependencies=[Depends(require_hq_access)])
+def pool_usage():
+    """Connection pool occupancy plus checkout wait/hold times per tenant schema."""
+    pools = {
+        "sync_pool": pool_status(engine.pool),
+        "async_pool": pool_status(async_engine.sync_engine.pool),
+    }
+    if tenant_engine is not engine:
+        pools["tenant_sync_pool"] = pool_status(tenant_engine.pool)
+        pools["tenant_async_pool"] = pool_status(async_tenant_engine.sync_engine.pool)
+    return {**pools, "tenants": pool_metrics.snapshot()}
+
+
+@router.get("/password-hashing", dependencies=[Depends(require_hq_access)])
+def password_hashing_usage():
+    """Password hashing pool occupancy plus queue wait and latency per operation."""
+    return password_hasher.snapshot()
+
+
+@router.get("/audit", dependencies=[Depends(require_hq_access)])
+def audit_writer_usage():
+    """Audit buffer depth plus events written and dropped by this worker process."""
+    return audit_writer.snapshot()
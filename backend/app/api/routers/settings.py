@@ -1,11 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
 
 from app.tenancy.deps import get_tenant_db
 from app.api.deps import require_permissions, get_current_user_id
+from app.services.rbac import (
+    get_effective_permissions,
+    invalidate_tenant_permissions,
+    invalidate_user_permissions,
+)
+from app.services.audit import as_utc_naive, query_audit_logs
+from app.services.user_directory import register_user, unregister_user
 
 router = APIRouter()
 
@@ -61,6 +69,18 @@ class RolePermissionAssignment(BaseModel):
     role_id: int
     permission_id: int
 
+class AuditLogRead(BaseModel):
+    id: int
+    user_id: Optional[int]
+    action: str
+    resource_type: str
+    resource_id: Optional[int]
+    old_values: Optional[Dict[str, Any]]
+    new_values: Optional[Dict[str, Any]]
+    ip_address: Optional[str]
+    user_agent: Optional[str]
+    created_at: datetime
+
 # User Management Endpoints
 @router.get("/users", response_model=List[UserRead], dependencies=[Depends(require_permissions(["settings.manage"]))])
 def list_users(
@@ -72,16 +92,7 @@ def list_users(
 ):
     """List all users with their roles and permissions."""
     # Check if user is a Super Administrator
-    super_admin_check = db.execute(
-        text("""
-            SELECT COUNT(*) FROM user_roles ur
-            JOIN roles r ON ur.role_id = r.id
-            WHERE ur.user_id = :user_id AND r.name = 'Super Administrator'
-        """),
-        {"user_id": user_id}
-    ).scalar()
-    
-    if super_admin_check == 0:
+    if "Super Administrator" not in get_effective_permissions(db, user_id).roles:
         raise HTTPException(
             status_code=403, 
             detail="Access denied. Only Super Administrators can access user management."
@@ -140,22 +151,13 @@ def create_user(
 ):
     """Create a new user."""
     # Check if user is a Super Administrator
-    super_admin_check = db.execute(
-        text("""
-            SELECT COUNT(*) FROM user_roles ur
-            JOIN roles r ON ur.role_id = r.id
-            WHERE ur.user_id = :user_id AND r.name = 'Super Administrator'
-        """),
-        {"user_id": current_user_id}
-    ).scalar()
-    
-    if super_admin_check == 0:
+    if "Super Administrator" not in get_effective_permissions(db, current_user_id).roles:
         raise HTTPException(
             status_code=403, 
             detail="Access denied. Only Super Administrators can create users."
         )
     
-    from app.services.security import hash_password
+    from app.services.password_hasher import password_hasher
     
     # Check if user already exists
     existing = db.execute(text("SELECT id FROM users WHERE email = :email"), {"email": user_data.email}).scalar()
@@ -163,7 +165,7 @@ def create_user(
         raise HTTPException(status_code=400, detail="User with this email already exists")
     
     # Create user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = password_hasher.hash(user_data.password)
     result = db.execute(
         text("""
             INSERT INTO users(email, full_name, hashed_password, is_active)
@@ -179,6 +181,7 @@ def create_user(
     )
     
     new_user = result.mappings().first()
+    register_user(db, new_user.id, new_user.email)
     db.commit()
     
     return UserRead(
@@ -205,16 +208,7 @@ def update_user(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Check if user is a Super Administrator
-    super_admin_check = db.execute(
-        text("""
-            SELECT COUNT(*) FROM user_roles ur
-            JOIN roles r ON ur.role_id = r.id
-            WHERE ur.user_id = :user_id AND r.name = 'Super Administrator'
-        """),
-        {"user_id": current_user_id}
-    ).scalar()
-    
-    if super_admin_check == 0:
+    if "Super Administrator" not in get_effective_permissions(db, current_user_id).roles:
         raise HTTPException(
             status_code=403, 
             detail="Access denied. Only Super Administrators can update users."
@@ -257,6 +251,8 @@ def update_user(
         text("SELECT id, email, full_name, is_active, created_at, updated_at FROM users WHERE id = :id"),
         {"id": user_id}
     ).mappings().first()
+    if user_data.email is not None:
+        register_user(db, user_id, updated_user.email)
     
     # Get user roles
     roles = db.execute(
@@ -293,16 +289,7 @@ def delete_user(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Check if user is a Super Administrator
-    super_admin_check = db.execute(
-        text("""
-            SELECT COUNT(*) FROM user_roles ur
-            JOIN roles r ON ur.role_id = r.id
-            WHERE ur.user_id = :user_id AND r.name = 'Super Administrator'
-        """),
-        {"user_id": current_user_id}
-    ).scalar()
-    
-    if super_admin_check == 0:
+    if "Super Administrator" not in get_effective_permissions(db, current_user_id).roles:
         raise HTTPException(
             status_code=403, 
             detail="Access denied. Only Super Administrators can delete users."
@@ -313,7 +300,9 @@ def delete_user(
     
     # Delete user
     db.execute(text("DELETE FROM users WHERE id = :id"), {"id": user_id})
+    unregister_user(db, user_id)
     db.commit()
+    invalidate_user_permissions(db, user_id)
     
     return {"message": "User deleted successfully"}
 
@@ -325,16 +314,7 @@ def list_roles(
 ):
     """List all roles with their permissions and user counts."""
     # Check if user is a Super Administrator
-    super_admin_check = db.execute(
-        text("""
-            SELECT COUNT(*) FROM user_roles ur
-            JOIN roles r ON ur.role_id = r.id
-            WHERE ur.user_id = :user_id AND r.name = 'Super Administrator'
-        """),
-        {"user_id": user_id}
-    ).scalar()
-    
-    if super_admin_check == 0:
+    if "Super Administrator" not in get_effective_permissions(db, user_id).roles:
         raise HTTPException(
             status_code=403, 
             detail="Access denied. Only Super Administrators can access role management."
@@ -377,16 +357,7 @@ def create_role(
 ):
     """Create a new role."""
     # Check if user is a Super Administrator
-    super_admin_check = db.execute(
-        text("""
-            SELECT COUNT(*) FROM user_roles ur
-            JOIN roles r ON ur.role_id = r.id
-            WHERE ur.user_id = :user_id AND r.name = 'Super Administrator'
-        """),
-        {"user_id": current_user_id}
-    ).scalar()
-    
-    if super_admin_check == 0:
+    if "Super Administrator" not in get_effective_permissions(db, current_user_id).roles:
         raise HTTPException(
             status_code=403, 
             detail="Access denied. Only Super Administrators can create roles."
@@ -483,6 +454,8 @@ def update_role(
     ).scalar()
     
     db.commit()
+    # Role names feed every member's cached role set
+    invalidate_tenant_permissions(db)
     
     return RoleRead(
         id=updated_role.id,
@@ -521,6 +494,7 @@ def delete_role(
     # Delete role
     db.execute(text("DELETE FROM roles WHERE id = :id"), {"id": role_id})
     db.commit()
+    invalidate_tenant_permissions(db)
     
     return {"message": "Role deleted successfully"}
 
@@ -532,16 +506,7 @@ def list_permissions(
 ):
     """List all available permissions."""
     # Check if user is a Super Administrator
-    super_admin_check = db.execute(
-        text("""
-            SELECT COUNT(*) FROM user_roles ur
-            JOIN roles r ON ur.role_id = r.id
-            WHERE ur.user_id = :user_id AND r.name = 'Super Administrator'
-        """),
-        {"user_id": user_id}
-    ).scalar()
-    
-    if super_admin_check == 0:
+    if "Super Administrator" not in get_effective_permissions(db, user_id).roles:
         raise HTTPException(
             status_code=403, 
             detail="Access denied. Only Super Administrators can access permission management."
@@ -601,6 +566,7 @@ def assign_role_to_user(
     )
     
     db.commit()
+    invalidate_user_permissions(db, user_id)
     return {"message": "Role assigned successfully"}
 
 @router.delete("/users/{user_id}/roles/{role_id}", dependencies=[Depends(require_permissions(["settings.manage"]))])
@@ -627,6 +593,7 @@ def remove_role_from_user(
     )
     
     db.commit()
+    invalidate_user_permissions(db, user_id)
     return {"message": "Role removed successfully"}
 
 # Role-Permission Assignment Endpoints
@@ -664,6 +631,7 @@ def assign_permission_to_role(
     )
     
     db.commit()
+    invalidate_tenant_permissions(db)
     return {"message": "Permission assigned successfully"}
 
 @router.delete("/roles/{role_id}/permissions/{permission_id}", dependencies=[Depends(require_permissions(["settings.manage"]))])
@@ -690,8 +658,31 @@ def remove_permission_from_role(
     )
     
     db.commit()
+    invalidate_tenant_permissions(db)
     return {"message": "Permission removed successfully"}
 
+# Audit Trail Endpoint
+@router.get("/audit-logs", response_model=List[AuditLogRead], dependencies=[Depends(require_permissions(["settings.manage"]))])
+def list_audit_logs(
+    db: Session = Depends(get_tenant_db),
+    date_from: Optional[datetime] = Query(None, description="Start of the range (UTC if no offset); defaults to 7 days ago"),
+    date_to: Optional[datetime] = Query(None, description="End of the range, exclusive; defaults to now"),
+    actor_id: Optional[int] = Query(None, alias="user_id"),
+    action: Optional[str] = Query(None),
+    resource_type: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    """Audit events in a date range, newest first. Only the monthly partitions in range are read."""
+    date_to = as_utc_naive(date_to or datetime.now(timezone.utc))
+    date_from = as_utc_naive(date_from) if date_from else date_to - timedelta(days=7)
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="date_from must be before date_to")
+    return query_audit_logs(
+        db, date_from, date_to,
+        user_id=actor_id, action=action, resource_type=resource_type, limit=limit, offset=offset,
+    )
+
 # System Information Endpoint
 @router.get("/system-info", dependencies=[Depends(require_permissions(["settings.manage"]))])
 def get_system_info(
@@ -700,16 +691,7 @@ def get_system_info(
 ):
     """Get system statistics and information."""
     # Check if user is a Super Administrator
-    super_admin_check = db.execute(
-        text("""
-            SELECT COUNT(*) FROM user_roles ur
-            JOIN roles r ON ur.role_id = r.id
-            WHERE ur.user_id = :user_id AND r.name = 'Super Administrator'
-        """),
-        {"user_id": user_id}
-    ).scalar()
-    
-    if super_admin_check == 0:
+    if "Super Administrator" not in get_effective_permissions(db, user_id).roles:
         raise HTTPException(
             status_code=403, 
             detail="Access denied. Only Super Administrators can access system information."
@@ -891,13 +873,17 @@ def super_admin_list_permissions(
 
 
 @router.get("/super-admin/system-info")
-def super_admin_system_info():
+def super_admin_system_info(mode: Optional[str] = Query(None, pattern="^(stored|exact|estimate)$")):
     """Get system statistics across all tenants for super admin."""
     from app.db.session import SessionLocal
+    from app.tenancy.metrics import dashboard_counts
     
     db = SessionLocal()
     try:
-        tenants = db.execute(text("SELECT id, name, slug FROM tenants ORDER BY id")).mappings().all()
+        tenants = db.execute(text("SELECT id, name, slug, schema_name FROM tenants ORDER BY id")).mappings().all()
+        counts = dashboard_counts(
+            db, [t.schema_name for t in tenants], ["users", "active_users", "roles", "permissions"], mode
+        )
         
         total_stats = {
             "total_users": 0,
@@ -910,14 +896,11 @@ def super_admin_system_info():
         tenant_details = []
         
         for tenant in tenants:
-            # Set search path to this tenant
-            db.execute(text(f'SET LOCAL search_path TO "{tenant.slug}", public'))
-            
-            # Get tenant statistics
-            user_count = db.execute(text("SELECT COUNT(*) FROM users")).scalar() or 0
-            active_users = db.execute(text("SELECT COUNT(*) FROM users WHERE is_active = true")).scalar() or 0
-            role_count = db.execute(text("SELECT COUNT(*) FROM roles")).scalar() or 0
-            permission_count = db.execute(text("SELECT COUNT(*) FROM permissions")).scalar() or 0
+            tenant_stats = counts[tenant.schema_name]
+            user_count = tenant_stats["users"]
+            active_users = tenant_stats["active_users"]
+            role_count = tenant_stats["roles"]
+            permission_count = tenant_stats["permissions"]
             
             total_stats["total_users"] += user_count
             total_stats["active_users"] += active_users
@@ -1,73 +1,203 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import base64
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import List, Optional
 
-from app.schemas.students import StudentCreate, StudentRead, StudentUpdate
+from app.schemas.students import StudentCreate, StudentRead, StudentSearchResult, StudentUpdate
 from sqlalchemy.exc import IntegrityError
-from app.tenancy.deps import get_tenant_db
-from app.api.deps import require_roles, require_permissions, get_current_user_id
+from app.tenancy.deps import get_async_tenant_db, get_tenant_db
+from app.api.deps import require_roles, require_permissions, require_permissions_async, get_current_user_id
+from app.services.rbac import get_effective_permissions_async
+from app.services.report_cards import invalidate_report_cards
 
 
 router = APIRouter()
 
 
-@router.get("", response_model=List[StudentRead], dependencies=[Depends(require_permissions(["students.read"]))])
-def list_students(
-    db: Session = Depends(get_tenant_db), 
+# Columns a client may request through ``fields``
+STUDENT_FIELDS = tuple(StudentRead.model_fields)
+# Keyset order for paginated listings; id breaks ties between namesakes
+_SORT_KEYS = ("first_name", "last_name", "id")
+
+
+def _encode_cursor(row) -> str:
+    raw = json.dumps([row[k] for k in _SORT_KEYS], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(_SORT_KEYS):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+async def _teacher_class_scope(db: AsyncSession, user_id: int) -> Optional[List[str]]:
+    """Class names a teacher-only user may see, or None when the user is not scoped."""
+    roles = (await get_effective_permissions_async(db, user_id)).roles
+    if "Teacher" not in roles or ("Administrator" in roles or "Head Teacher" in roles or "Tenant Admin" in roles or "School Administrator" in roles):
+        return None
+    return (await db.execute(text(
+        """
+        SELECT c.name
+        FROM teacher_assignments ta
+        JOIN classes c ON ta.class_id = c.id
+        WHERE ta.teacher_id = :uid
+        """
+    ), {"uid": user_id})).scalars().all()
+
+
+def _class_filter(class_rows: List[str], params: dict) -> str:
+    placeholders = ", ".join([f":c{i}" for i, _ in enumerate(class_rows)])
+    for i, cname in enumerate(class_rows):
+        params[f"c{i}"] = cname
+    return f" AND class_name IN ({placeholders})"
+
+
+@router.get("", response_model=List[StudentRead], dependencies=[Depends(require_permissions_async(["students.read"]))])
+async def list_students(
+    response: Response,
+    db: AsyncSession = Depends(get_async_tenant_db), 
     user_id: int = Depends(get_current_user_id),
     class_name: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
-    q: Optional[str] = Query(None)
+    q: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; enables keyset pagination"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma separated subset of student fields to return"),
+    include_total: bool = Query(False, description="Also count all matching students into X-Total-Count"),
 ):
-    # Determine roles for scoping
-    roles = db.execute(text(
-        """
-        SELECT r.name FROM roles r
-        JOIN user_roles ur ON ur.role_id = r.id
-        WHERE ur.user_id = :uid
-        """
-    ), {"uid": user_id}).scalars().all()
+    selected = None
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = sorted(set(selected) - set(STUDENT_FIELDS))
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
 
-    query = "SELECT * FROM students WHERE 1=1"
+    where = "WHERE 1=1"
     params: dict = {}
     
     if class_name:
-        query += " AND class_name = :class"
+        where += " AND class_name = :class"
         params["class"] = class_name
     if status:
-        query += " AND status = :status"
+        where += " AND status = :status"
         params["status"] = status
     if q:
-        query += " AND (LOWER(first_name || ' ' || last_name) LIKE :q OR LOWER(admission_no) LIKE :q OR LOWER(COALESCE(student_number,'')) LIKE :q)"
+        where += " AND (LOWER(first_name || ' ' || last_name) LIKE :q OR LOWER(admission_no) LIKE :q OR LOWER(COALESCE(student_number,'')) LIKE :q)"
         params["q"] = f"%{q.lower()}%"
     
     # Scope: if Teacher and not an admin role, limit to classes they teach
-    if "Teacher" in roles and not ("Administrator" in roles or "Head Teacher" in roles or "Tenant Admin" in roles or "School Administrator" in roles):
-        class_rows = db.execute(text(
-            """
-            SELECT c.name
-            FROM teacher_assignments ta
-            JOIN classes c ON ta.class_id = c.id
-            WHERE ta.teacher_id = :uid
-            """
-        ), {"uid": user_id}).scalars().all()
+    class_rows = await _teacher_class_scope(db, user_id)
+    if class_rows is not None:
         if not class_rows:
             return []
-        placeholders = ", ".join([f":c{i}" for i, _ in enumerate(class_rows)])
-        for i, cname in enumerate(class_rows):
-            params[f"c{i}"] = cname
-        query += f" AND class_name IN ({placeholders})"
+        where += _class_filter(class_rows, params)
 
-    query += " ORDER BY first_name, last_name"
-    
-    rows = db.execute(text(query), params).mappings().all()
+    if include_total:
+        # Counted only on request: it scans every matching row, unlike the page itself
+        total = (await db.execute(text(f"SELECT COUNT(*) FROM students {where}"), params)).scalar()
+        response.headers["X-Total-Count"] = str(total or 0)
+
+    if cursor is not None:
+        params["cur_first"], params["cur_last"], params["cur_id"] = _decode_cursor(cursor)
+        where += " AND (first_name, last_name, id) > (:cur_first, :cur_last, :cur_id)"
+
+    columns = "*" if selected is None else ", ".join(dict.fromkeys([*selected, *_SORT_KEYS]))
+    query = f"SELECT {columns} FROM students {where} ORDER BY first_name, last_name, id"
+    if limit is not None:
+        # One extra row tells us whether another page exists
+        query += " LIMIT :limit"
+        params["limit"] = limit + 1
+
+    rows = (await db.execute(text(query), params)).mappings().all()
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1])
+
+    if selected is not None:
+        # Projected rows skip StudentRead construction and response validation
+        return JSONResponse(
+            content=jsonable_encoder([{f: r[f] for f in selected} for r in rows]),
+            headers=dict(response.headers),
+        )
     return [StudentRead(**dict(r)) for r in rows]
 
 
-@router.get("/{student_id}", response_model=StudentRead, dependencies=[Depends(require_permissions(["students.read"]))])
-def get_student(student_id: int, db: Session = Depends(get_tenant_db), user_id: int = Depends(get_current_user_id)):
-    row = db.execute(text("SELECT * FROM students WHERE id = :id"), {"id": student_id}).mappings().first()
+# Queries shorter than a trigram cannot use the GIN indexes; they fall back to
+# prefix matching on the text_pattern_ops indexes
+_MIN_TRIGRAM_QUERY = 3
+
+
+@router.get("/search", response_model=List[StudentSearchResult], dependencies=[Depends(require_permissions_async(["students.read"]))])
+async def search_students(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_tenant_db),
+    user_id: int = Depends(get_current_user_id),
+):
+    """Ranked front-desk lookup by name, admission number or student number.
+
+    Exact admission/student numbers rank first, then prefix matches, then
+    substring matches; longer queries also match misspelt names by trigram
+    similarity.
+    """
+    term = q.strip().lower()
+    if not term:
+        return []
+    params: dict = {"q": term, "prefix": f"{term}%", "contains": f"%{term}%", "limit": limit}
+    full_name = "lower(first_name || ' ' || last_name)"
+    number = "lower(COALESCE(student_number, ''))"
+
+    rank = f"""
+        CASE
+            WHEN lower(admission_no) = :q OR {number} = :q THEN 3
+            WHEN lower(first_name) LIKE :prefix OR lower(last_name) LIKE :prefix
+                 OR lower(admission_no) LIKE :prefix OR {full_name} LIKE :prefix THEN 2
+            ELSE 1
+        END
+    """
+    if len(term) < _MIN_TRIGRAM_QUERY:
+        where = f"""
+            (lower(first_name) LIKE :prefix OR lower(last_name) LIKE :prefix
+             OR lower(admission_no) LIKE :prefix OR {number} LIKE :prefix)
+        """
+        score = rank
+    else:
+        where = f"""
+            ({full_name} LIKE :contains OR lower(admission_no) LIKE :contains
+             OR {number} LIKE :contains OR {full_name} % :q)
+        """
+        score = f"{rank} + similarity({full_name}, :q)"
+
+    class_rows = await _teacher_class_scope(db, user_id)
+    if class_rows is not None:
+        if not class_rows:
+            return []
+        where += _class_filter(class_rows, params)
+
+    rows = (await db.execute(text(f"""
+        SELECT id, first_name, last_name, admission_no, student_number, class_name, {score} AS score
+        FROM students
+        WHERE {where}
+        ORDER BY score DESC, first_name, last_name, id
+        LIMIT :limit
+    """), params)).mappings().all()
+    return [StudentSearchResult(**dict(r)) for r in rows]
+
+
+@router.get("/{student_id}", response_model=StudentRead, dependencies=[Depends(require_permissions_async(["students.read"]))])
+async def get_student(student_id: int, db: AsyncSession = Depends(get_async_tenant_db), user_id: int = Depends(get_current_user_id)):
+    row = (await db.execute(text("SELECT * FROM students WHERE id = :id"), {"id": student_id})).mappings().first()
     if not row:
         raise HTTPException(status_code=404, detail="Student not found")
     return StudentRead(**dict(row))
@@ -165,6 +295,7 @@ def delete_student(student_id: int, db: Session = Depends(get_tenant_db), user_i
     try:
         db.execute(text("DELETE FROM students WHERE id = :id"), {"id": student_id})
         db.commit()
+        invalidate_report_cards(db)
         return {"status": "deleted"}
     except Exception as ex:
         db.rollback()
@@ -224,6 +355,7 @@ def update_student(student_id: int, payload: StudentUpdate, db: Session = Depend
         if not row:
             raise HTTPException(status_code=404, detail="Student not found")
         db.commit()
+        invalidate_report_cards(db)
         return StudentRead(**dict(row))
     except HTTPException as ex:
         # Preserve explicit HTTP errors
@@ -234,9 +366,9 @@ def update_student(student_id: int, payload: StudentUpdate, db: Session = Depend
 
 
 @router.get("/{student_id}/attendance")
-def get_student_attendance(
+async def get_student_attendance(
     student_id: int,
-    db: Session = Depends(get_tenant_db),
+    db: AsyncSession = Depends(get_async_tenant_db),
     user_id: int = Depends(get_current_user_id),
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None)
@@ -258,14 +390,14 @@ def get_student_attendance(
     
     query += " ORDER BY a.date DESC"
     
-    rows = db.execute(text(query), params).mappings().all()
+    rows = (await db.execute(text(query), params)).mappings().all()
     return [dict(r) for r in rows]
 
 
 @router.get("/classes/available")
-def get_available_classes(db: Session = Depends(get_tenant_db), user_id: int = Depends(get_current_user_id)):
+async def get_available_classes(db: AsyncSession = Depends(get_async_tenant_db), user_id: int = Depends(get_current_user_id)):
     """Get list of available classes for student assignment."""
-    rows = db.execute(text("SELECT id, name, grade_level FROM classes ORDER BY grade_level, name")).mappings().all()
+    rows = (await db.execute(text("SELECT id, name, grade_level FROM classes ORDER BY grade_level, name"))).mappings().all()
     return [{"id": r.id, "name": r.name, "grade_level": r.grade_level} for r in rows]
 
 
@@ -1,5 +1,5 @@
 from datetime import date
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
@@ -9,11 +9,18 @@ from app.schemas.teachers import (
     TeacherCreate, TeacherRead, TeacherUpdate,
     TeacherAssignmentCreate, TeacherAssignmentRead,
     TeacherPerformanceCreate, TeacherPerformanceRead,
-    TeacherDashboard
+    TeacherDashboard,
+    MarkSheetCreate, MarkSheetEntry, MarkSheetResult, MarkSheetRowResult,
+    RegisterCreate, RegisterResult
 )
 from app.tenancy.deps import get_tenant_db
 from app.api.deps import require_roles, require_permissions, get_current_user_id
-from app.services.security import hash_password
+from app.services.attendance import upsert_attendance
+from app.services.grading import GradingEngine, get_grading_engine
+from app.services.rbac import get_effective_permissions
+from app.services.report_cards import invalidate_report_cards
+from app.services.user_directory import register_user
+from app.services.password_hasher import password_hasher
 
 
 router = APIRouter()
@@ -106,14 +113,8 @@ def list_teachers(
     user_id: int = Depends(get_current_user_id),
     is_active: Optional[bool] = Query(None)
 ):
-    # Determine roles for scoping
-    user_roles = db.execute(text(
-        """
-        SELECT r.name FROM roles r
-        JOIN user_roles ur ON ur.role_id = r.id
-        WHERE ur.user_id = :uid
-        """
-    ), {"uid": user_id}).scalars().all()
+    # Determine roles for scoping (shared with the permission dependency)
+    user_roles = get_effective_permissions(db, user_id).roles
 
     query = """
         SELECT u.id, u.email, u.full_name, u.is_active, u.created_at, u.updated_at,
@@ -158,11 +159,11 @@ def get_teacher(teacher_id: int, db: Session = Depends(get_tenant_db), user_id:
 
 @router.post("", dependencies=[Depends(require_permissions(["teachers.create"]))])
 def create_teacher(payload: TeacherCreate, db: Session = Depends(get_tenant_db)):
+    # Generate a temporary password for first login
+    temp_password = "ChangeMe!"  # could be randomized; kept simple for MVP
+    # Outside the try so a full hashing queue surfaces as 503, not 400
+    hashed = password_hasher.hash(temp_password)
     try:
-        # Generate a temporary password for first login
-        temp_password = "ChangeMe!"  # could be randomized; kept simple for MVP
-        hashed = hash_password(temp_password)
-
         # First create the user with Teacher role
         db.execute(
             text("INSERT INTO users(email, full_name, hashed_password) VALUES (:email, :name, :pwd)"),
@@ -178,6 +179,7 @@ def create_teacher(payload: TeacherCreate, db: Session = Depends(get_tenant_db))
             text("INSERT INTO user_roles(user_id, role_id) VALUES (:user, :role)"),
             {"user": user_id, "role": teacher_role_id}
         )
+        register_user(db, user_id, payload.email)
         
         # Create teacher profile
         db.execute(
@@ -612,10 +614,9 @@ def create_or_update_grade(
             "year": payload["academic_year"]
         }).scalar()
         
-        # Use the compute grade function from academic.py
-        from app.api.routers.academic import _compute_grade_for_scores
-        overall, grade, points = _compute_grade_for_scores(
-            db, 
+        # Grade with the tenant's cached grading engine
+        from app.services.grading import get_grading_engine
+        overall, grade, points = get_grading_engine(db).compute(
             payload.get("ca_score"), 
             payload.get("exam_score"), 
             payload.get("overall_score")
@@ -660,6 +661,7 @@ def create_or_update_grade(
             })
         
         db.commit()
+        invalidate_report_cards(db)
         return {"message": "Grade saved successfully"}
         
     except Exception as e:
@@ -667,6 +669,164 @@ def create_or_update_grade(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def _grade_mark_sheet(
+    entries: List[MarkSheetEntry],
+    roster: Dict[int, Tuple[Optional[int], bool]],
+    engine: GradingEngine,
+) -> Tuple[List[Dict[str, Any]], List[MarkSheetRowResult]]:
+    """Validate and grade every mark-sheet row without touching the database.
+
+    ``roster`` maps each student in the class to their existing record id (or
+    None) and whether that record is finalized. Returns the rows to write and a
+    result per entry, in payload order.
+    """
+    rows: List[Dict[str, Any]] = []
+    results: List[MarkSheetRowResult] = []
+    seen = set()
+    for entry in entries:
+        error = None
+        if entry.student_id in seen:
+            error = "Duplicate entry for student"
+        elif entry.student_id not in roster:
+            error = "Student is not in this class"
+        elif roster[entry.student_id][1]:
+            error = "Record is finalized"
+        elif entry.ca_score is None and entry.exam_score is None and entry.overall_score is None:
+            error = "No scores provided"
+        elif any(v is not None and not 0 <= v <= 100 for v in (entry.ca_score, entry.exam_score, entry.overall_score)):
+            error = "Scores must be between 0 and 100"
+        seen.add(entry.student_id)
+        if error:
+            results.append(MarkSheetRowResult(student_id=entry.student_id, status="error", error=error))
+            continue
+
+        overall, grade, points = engine.compute(entry.ca_score, entry.exam_score, entry.overall_score)
+        rows.append({
+            "student_id": entry.student_id,
+            "existing_id": roster[entry.student_id][0],
+            "ca_score": entry.ca_score,
+            "exam_score": entry.exam_score,
+            "overall_score": overall,
+            "grade": grade,
+            "grade_points": points,
+            "remarks": entry.comments,
+        })
+        results.append(MarkSheetRowResult(
+            student_id=entry.student_id, status="saved", overall_score=overall, grade=grade, grade_points=points
+        ))
+    return rows, results
+
+
+@router.post("/grades/mark-sheet", response_model=MarkSheetResult, dependencies=[Depends(require_permissions(["academic.create", "academic.update"]))])
+def save_mark_sheet(
+    payload: MarkSheetCreate,
+    db: Session = Depends(get_tenant_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Save a whole class's marks for one subject and term.
+
+    Authorizes once, grades every row in memory and writes all valid rows in a
+    single statement. Invalid rows are reported per student and do not block
+    the rest of the sheet.
+    """
+    assignment = db.execute(text("""
+        SELECT s.id as subject_id, c.id as class_id
+        FROM teacher_assignments ta
+        JOIN classes c ON ta.class_id = c.id
+        JOIN subjects s ON ta.subject_id = s.id
+        JOIN teachers t ON ta.teacher_id = t.id
+        JOIN users u ON t.email = u.email
+        WHERE u.id = :user_id AND c.name = :class_name AND s.code = :subject_code
+    """), {
+        "user_id": user_id,
+        "class_name": payload.class_name,
+        "subject_code": payload.subject_code
+    }).mappings().first()
+
+    if not assignment:
+        raise HTTPException(status_code=403, detail="You are not authorized to grade this subject")
+
+    # Class membership and any existing record per student, in one query; like the
+    # single-grade endpoint, an existing record matches regardless of its class_id
+    roster_rows = db.execute(text("""
+        SELECT st.id AS student_id, ar.id AS record_id, COALESCE(ar.is_finalized, false) AS is_finalized
+        FROM students st
+        LEFT JOIN LATERAL (
+            SELECT id, is_finalized FROM academic_records
+            WHERE student_id = st.id AND subject_id = :subject_id
+              AND term = :term AND academic_year = :year
+            ORDER BY (class_id IS NOT DISTINCT FROM :class_id) DESC, id
+            LIMIT 1
+        ) ar ON true
+        WHERE st.class_name = :class_name AND st.id = ANY(:student_ids)
+    """), {
+        "subject_id": assignment.subject_id,
+        "class_id": assignment.class_id,
+        "term": payload.term,
+        "year": payload.academic_year,
+        "class_name": payload.class_name,
+        "student_ids": [e.student_id for e in payload.entries],
+    }).mappings().all()
+    roster = {r.student_id: (r.record_id, r.is_finalized) for r in roster_rows}
+
+    rows, results = _grade_mark_sheet(payload.entries, roster, get_grading_engine(db))
+
+    if rows:
+        try:
+            db.execute(text("""
+                WITH sheet AS (
+                    SELECT * FROM unnest(
+                        CAST(:student_ids AS integer[]), CAST(:existing_ids AS integer[]),
+                        CAST(:ca AS numeric[]), CAST(:exam AS numeric[]), CAST(:overall AS numeric[]),
+                        CAST(:grades AS varchar[]), CAST(:points AS numeric[]), CAST(:remarks AS text[])
+                    ) AS s(student_id, existing_id, ca_score, exam_score, overall_score, grade, grade_points, remarks)
+                ),
+                updated AS (
+                    UPDATE academic_records ar
+                    SET ca_score = s.ca_score, exam_score = s.exam_score, overall_score = s.overall_score,
+                        grade = s.grade, grade_points = s.grade_points, remarks = s.remarks,
+                        updated_at = CURRENT_TIMESTAMP
+                    FROM sheet s
+                    WHERE ar.id = s.existing_id AND NOT COALESCE(ar.is_finalized, false)
+                    RETURNING ar.id
+                )
+                INSERT INTO academic_records
+                    (student_id, class_id, subject_id, term, academic_year,
+                     ca_score, exam_score, overall_score, grade, grade_points, remarks)
+                SELECT s.student_id, :class_id, :subject_id, :term, :year,
+                       s.ca_score, s.exam_score, s.overall_score, s.grade, s.grade_points, s.remarks
+                FROM sheet s
+                WHERE s.existing_id IS NULL
+                ON CONFLICT (student_id, class_id, subject_id, academic_year, term) DO UPDATE SET
+                    ca_score = EXCLUDED.ca_score, exam_score = EXCLUDED.exam_score,
+                    overall_score = EXCLUDED.overall_score, grade = EXCLUDED.grade,
+                    grade_points = EXCLUDED.grade_points, remarks = EXCLUDED.remarks,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE NOT COALESCE(academic_records.is_finalized, false)
+            """), {
+                "student_ids": [r["student_id"] for r in rows],
+                "existing_ids": [r["existing_id"] for r in rows],
+                "ca": [r["ca_score"] for r in rows],
+                "exam": [r["exam_score"] for r in rows],
+                "overall": [r["overall_score"] for r in rows],
+                "grades": [r["grade"] for r in rows],
+                "points": [r["grade_points"] for r in rows],
+                "remarks": [r["remarks"] for r in rows],
+                "class_id": assignment.class_id,
+                "subject_id": assignment.subject_id,
+                "term": payload.term,
+                "year": payload.academic_year,
+            })
+            db.commit()
+            invalidate_report_cards(db)
+        except Exception as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+
+    saved = sum(1 for r in results if r.status == "saved")
+    return MarkSheetResult(saved=saved, failed=len(results) - saved, results=results)
+
+
 @router.get("/grades/{class_name}/{subject_code}/stats", response_model=dict, dependencies=[Depends(require_permissions(["academic.read"]))])
 def get_class_grade_stats(
     class_name: str,
@@ -855,6 +1015,51 @@ def mark_attendance(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/attendance/register", response_model=RegisterResult, dependencies=[Depends(require_permissions(["attendance.create", "attendance.update"]))])
+def mark_register(
+    payload: RegisterCreate,
+    db: Session = Depends(get_tenant_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Mark a whole class register for one day in a single write.
+
+    Students listed in ``records`` get their own status; with ``default_status``
+    every other student in the class is marked with it. Entries for students
+    outside the class are rejected individually.
+    """
+    # Class id and roster in one round trip
+    roster_rows = db.execute(text("""
+        SELECT c.id AS class_id, s.id AS student_id
+        FROM classes c
+        LEFT JOIN students s ON s.class_name = c.name
+        WHERE c.name = :class_name
+    """), {"class_name": payload.class_name}).mappings().all()
+    if not roster_rows:
+        raise HTTPException(status_code=404, detail="Class not found")
+    class_id = roster_rows[0].class_id
+    roster = {r.student_id for r in roster_rows if r.student_id is not None}
+
+    records = []
+    rejected = []
+    listed = set()
+    for entry in payload.records:
+        if entry.student_id not in roster:
+            rejected.append(MarkSheetRowResult(student_id=entry.student_id, status="error", error="Student is not in this class"))
+            continue
+        listed.add(entry.student_id)
+        records.append((entry.student_id, entry.status, entry.notes))
+    if payload.default_status:
+        records.extend((sid, payload.default_status, None) for sid in sorted(roster - listed))
+
+    try:
+        recorded = upsert_attendance(db, class_id, payload.date, records, user_id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    return RegisterResult(class_id=class_id, recorded=recorded, rejected=rejected)
+
+
 @router.get("/attendance/{class_name}/stats", response_model=dict, dependencies=[Depends(require_permissions(["attendance.read"]))])
 def get_attendance_stats(
     class_name: str,
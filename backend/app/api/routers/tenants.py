@@ -8,6 +8,12 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 
 from app.tenancy.deps import get_tenant_db
+from app.tenancy.cache import tenant_cache
+from app.tenancy.domains import normalize_domain, tenant_domain_index
+from app.services.rbac import permission_cache, rbac_version_cache
+from app.services.grading import grading_cache
+from app.services.report_cards import report_card_cache
+from app.services.audit import forget_partitions
 from app.api.deps import get_current_user_id
 from app.core.config import settings
 from fastapi import Header
@@ -80,6 +86,13 @@ class TenantRead(BaseModel):
     student_count: int
     teacher_count: int
 
+class TenantDomainCreate(BaseModel):
+    domain: str
+
+class TenantDomainRead(BaseModel):
+    domain: str
+    created_at: Optional[str] = None
+
 class TenantStats(BaseModel):
     total_users: int
     active_users: int
@@ -87,6 +100,8 @@ class TenantStats(BaseModel):
     total_teachers: int
     total_classes: int
     total_subjects: int
+    outstanding_balance: float = 0.0
+    refreshed_at: Optional[str] = None
     recent_activity: List[dict]
 
 # Public Endpoints
@@ -108,10 +123,12 @@ def list_public_tenants():
 def list_tenants(
     user_id: int = Depends(get_super_admin_user),
     q: Optional[str] = Query(None),
-    status: Optional[str] = Query(None)
+    status: Optional[str] = Query(None),
+    mode: Optional[str] = Query(None, pattern="^(stored|exact|estimate)$")
 ):
     """List all tenants (Super Admin only)."""
     from app.db.session import SessionLocal
+    from app.tenancy.metrics import dashboard_counts
     
     db = SessionLocal()
     try:
@@ -136,20 +153,13 @@ def list_tenants(
         
         rows = db.execute(text(query), params).mappings().all()
         
-        # Get statistics for each tenant
+        # Stored metrics, or one live query across tenants for ?mode=exact|estimate
+        counts = dashboard_counts(db, [row.schema_name for row in rows], ["users", "students", "teachers"], mode)
         tenants = []
         for row in rows:
-            # Set search path to this tenant to get stats
-            db.execute(text(f'SET LOCAL search_path TO "{row.schema_name}", public'))
-            
-            try:
-                user_count = db.execute(text("SELECT COUNT(*) FROM users")).scalar() or 0
-                student_count = db.execute(text("SELECT COUNT(*) FROM students")).scalar() or 0
-                teacher_count = db.execute(text("SELECT COUNT(*) FROM teachers")).scalar() or 0
-            except:
-                user_count = 0
-                student_count = 0
-                teacher_count = 0
+            user_count = counts[row.schema_name]["users"]
+            student_count = counts[row.schema_name]["students"]
+            teacher_count = counts[row.schema_name]["teachers"]
             
             tenants.append(TenantRead(
                 id=row.id,
@@ -212,15 +222,19 @@ def create_tenant(
             },
         )
         new_tenant = result.mappings().first()
-
-        # Create schema and seed defaults for the new tenant
-        from app.tenancy.service import TenantService
-        tenant_service = TenantService(db)
-        tenant_service.create_schema(new_tenant.schema_name)
-        db.execute(text(f'SET LOCAL search_path TO "{new_tenant.schema_name}", public'))
-        tenant_service.seed_defaults()
         db.commit()
 
+        # Create the schema and seed defaults by applying every tenant migration
+        from app.tenancy.orchestrator import provision_tenant
+        provisioned = provision_tenant(new_tenant.schema_name)
+        if not provisioned.ok:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Tenant created but provisioning failed: {provisioned.error or '; '.join(provisioned.problems)}",
+            )
+        tenant_cache.invalidate(new_tenant.slug)
+        tenant_domain_index.invalidate()
+
         return TenantRead(
             id=new_tenant.id,
             name=new_tenant.name,
@@ -301,6 +315,7 @@ def update_tenant(
             teacher_count = 0
 
         db.commit()
+        tenant_cache.invalidate(tenant.slug)
         return TenantRead(
             id=updated.id,
             name=updated.name,
@@ -351,6 +366,13 @@ def delete_tenant(
         db.execute(text(f'DROP SCHEMA IF EXISTS "{tenant.schema_name}" CASCADE'))
         db.execute(text("DELETE FROM public.tenants WHERE id = :id"), {"id": tenant_id})
         db.commit()
+        tenant_cache.invalidate(tenant.slug)
+        rbac_version_cache.invalidate(tenant.slug)
+        tenant_domain_index.invalidate()
+        permission_cache.invalidate_tenant(tenant.schema_name)
+        grading_cache.invalidate(tenant.schema_name)
+        report_card_cache.invalidate_tenant(tenant.schema_name)
+        forget_partitions(tenant.schema_name)
         return {"message": "Tenant deleted successfully"}
     finally:
         db.close()
@@ -373,17 +395,20 @@ def get_tenant_stats(
         if not tenant:
             raise HTTPException(status_code=404, detail="Tenant not found")
 
-        # Set search path to this tenant
+        # Counts come from the maintained metrics row rather than a scan per table
+        from app.tenancy.metrics import read_tenant_metrics
+        metrics = read_tenant_metrics(db, [tenant.id])[tenant.schema_name]
+        total_users = metrics["users"]
+        active_users = metrics["active_users"]
+        total_students = metrics["students"]
+        total_teachers = metrics["teachers"]
+        total_classes = metrics["classes"]
+        total_subjects = metrics["subjects"]
+
+        # Set search path to this tenant (after the metrics read, which may commit)
         db.execute(text(f'SET LOCAL search_path TO "{tenant.schema_name}", public'))
 
         try:
-            total_users = db.execute(text("SELECT COUNT(*) FROM users")).scalar() or 0
-            active_users = db.execute(text("SELECT COUNT(*) FROM users WHERE is_active = true")).scalar() or 0
-            total_students = db.execute(text("SELECT COUNT(*) FROM students")).scalar() or 0
-            total_teachers = db.execute(text("SELECT COUNT(*) FROM teachers")).scalar() or 0
-            total_classes = db.execute(text("SELECT COUNT(*) FROM classes")).scalar() or 0
-            total_subjects = db.execute(text("SELECT COUNT(*) FROM subjects")).scalar() or 0
-
             # Get recent activity (last 5 users created)
             recent_users = db.execute(
                 text("SELECT email, full_name, created_at FROM users ORDER BY created_at DESC LIMIT 5")
@@ -416,11 +441,131 @@ def get_tenant_stats(
             total_teachers=total_teachers,
             total_classes=total_classes,
             total_subjects=total_subjects,
+            outstanding_balance=metrics["outstanding_balance"],
+            refreshed_at=metrics["refreshed_at"],
             recent_activity=recent_activity,
         )
     finally:
         db.close()
 
+@router.get("/{tenant_id}/domains", response_model=List[TenantDomainRead])
+def list_tenant_domains(
+    tenant_id: int,
+    user_id: int = Depends(get_super_admin_user)
+):
+    """Email domains that route simple-login users to this tenant (Super Admin only)."""
+    from app.db.session import SessionLocal
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            text("SELECT domain, created_at FROM public.tenant_domains WHERE tenant_id = :id ORDER BY domain"),
+            {"id": tenant_id}
+        ).mappings().all()
+        return [TenantDomainRead(domain=r.domain, created_at=str(r.created_at) if r.created_at else None) for r in rows]
+    finally:
+        db.close()
+
+@router.post("/{tenant_id}/domains", response_model=TenantDomainRead)
+def add_tenant_domain(
+    tenant_id: int,
+    payload: TenantDomainCreate,
+    user_id: int = Depends(get_super_admin_user)
+):
+    """Register an email domain (and its subdomains) for this tenant (Super Admin only)."""
+    from app.db.session import SessionLocal
+    domain = normalize_domain(payload.domain)
+    if not domain:
+        raise HTTPException(status_code=400, detail="Invalid domain")
+    db = SessionLocal()
+    try:
+        exists = db.execute(text("SELECT 1 FROM public.tenants WHERE id = :id"), {"id": tenant_id}).scalar()
+        if not exists:
+            raise HTTPException(status_code=404, detail="Tenant not found")
+        row = db.execute(
+            text("""
+                INSERT INTO public.tenant_domains(tenant_id, domain) VALUES (:id, :domain)
+                ON CONFLICT (domain) DO NOTHING
+                RETURNING domain, created_at
+            """),
+            {"id": tenant_id, "domain": domain}
+        ).mappings().first()
+        if not row:
+            raise HTTPException(status_code=400, detail="Domain is already registered")
+        db.commit()
+        tenant_domain_index.invalidate()
+        return TenantDomainRead(domain=row.domain, created_at=str(row.created_at) if row.created_at else None)
+    finally:
+        db.close()
+
+@router.delete("/{tenant_id}/domains/{domain}")
+def remove_tenant_domain(
+    tenant_id: int,
+    domain: str,
+    user_id: int = Depends(get_super_admin_user)
+):
+    """Stop routing an email domain to this tenant (Super Admin only)."""
+    from app.db.session import SessionLocal
+    normalized = normalize_domain(domain)
+    if not normalized:
+        raise HTTPException(status_code=400, detail="Invalid domain")
+    db = SessionLocal()
+    try:
+        deleted = db.execute(
+            text("DELETE FROM public.tenant_domains WHERE tenant_id = :id AND domain = :domain"),
+            {"id": tenant_id, "domain": normalized}
+        ).rowcount
+        if not deleted:
+            raise HTTPException(status_code=404, detail="Domain not found")
+        db.commit()
+        tenant_domain_index.invalidate()
+        return {"message": "Domain removed successfully"}
+    finally:
+        db.close()
+
+@router.get("/{tenant_id}/indexes")
+def get_tenant_index_report(
+    tenant_id: int,
+    user_id: int = Depends(get_super_admin_user)
+):
+    """Report missing, invalid and unused indexes for a tenant (Super Admin only)."""
+    from app.db.session import SessionLocal
+    from app.tenancy.indexes import index_report
+    db = SessionLocal()
+    try:
+        tenant = db.execute(
+            text("SELECT id, schema_name FROM public.tenants WHERE id = :id"),
+            {"id": tenant_id}
+        ).mappings().first()
+        if not tenant:
+            raise HTTPException(status_code=404, detail="Tenant not found")
+        return index_report(db.connection(), tenant.schema_name)
+    finally:
+        db.close()
+
+
+@router.post("/{tenant_id}/indexes/apply")
+def apply_tenant_index_set(
+    tenant_id: int,
+    user_id: int = Depends(get_super_admin_user)
+):
+    """Build any missing declared indexes concurrently (Super Admin only)."""
+    from app.db.session import SessionLocal, engine
+    from app.tenancy.indexes import apply_tenant_indexes
+    db = SessionLocal()
+    try:
+        schema_name = db.execute(
+            text("SELECT schema_name FROM public.tenants WHERE id = :id"),
+            {"id": tenant_id}
+        ).scalar()
+    finally:
+        db.close()
+    if not schema_name:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    try:
+        return apply_tenant_indexes(engine, schema_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to apply indexes: {str(e)}")
+
 @router.get("/public/config")
 def public_tenant_config(slug: str = Query(..., description="Tenant slug")):
     """Public endpoint to fetch branding and enabled modules by slug (no auth)."""
@@ -458,15 +603,24 @@ def reset_tenant_data(
         if not tenant:
             raise HTTPException(status_code=404, detail="Tenant not found")
 
-        from app.tenancy.service import TenantService
-        tenant_service = TenantService(db)
+        from app.tenancy.migrations import migrate_tenant
         try:
-            # Drop and recreate schema
+            # Drop the schema, then rebuild it from the first migration
             db.execute(text(f'DROP SCHEMA IF EXISTS "{tenant.schema_name}" CASCADE'))
-            tenant_service.create_schema(tenant.schema_name)
-            db.execute(text(f'SET LOCAL search_path TO "{tenant.schema_name}", public'))
-            tenant_service.seed_defaults()
+            # Tokens issued before the reset must not keep their embedded permissions
+            db.execute(
+                text("UPDATE public.tenants SET rbac_version = rbac_version + 1, schema_version = 0 WHERE id = :id"),
+                {"id": tenant_id}
+            )
             db.commit()
+            # The dropped schema took its audit partitions with it
+            forget_partitions(tenant.schema_name)
+            migrate_tenant(tenant.schema_name)
+            tenant_cache.invalidate(tenant.slug)
+            rbac_version_cache.invalidate(tenant.slug)
+            permission_cache.invalidate_tenant(tenant.schema_name)
+            grading_cache.invalidate(tenant.schema_name)
+            report_card_cache.invalidate_tenant(tenant.schema_name)
             return {"message": "Tenant data reset successfully"}
         except Exception as e:
             db.rollback()
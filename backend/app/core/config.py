@@ -8,15 +8,82 @@ class Settings(BaseSettings):
     app_name: str = "Blantyre Synod Schools"
 
     database_url: str = Field(..., alias="DATABASE_URL")
+    # Async driver URL; derived from DATABASE_URL when unset
+    async_database_url: str | None = Field(default=None, alias="ASYNC_DATABASE_URL")
+    # Connection pool sizing, applied to every engine: the sync and the async one, plus a
+    # tenant pair with DB_SEARCH_PATH_AFFINITY. A process can open up to
+    # (DB_POOL_SIZE + DB_MAX_OVERFLOW) x 2 connections (x 4 with affinity): 30 (60) by default.
+    # Keep that times the number of worker processes below Postgres max_connections.
+    db_pool_size: int = Field(5, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(10, alias="DB_MAX_OVERFLOW")
+    db_pool_timeout_seconds: int = Field(30, alias="DB_POOL_TIMEOUT_SECONDS")
+    # Recycle connections older than this many seconds (-1 never recycles)
+    db_pool_recycle_seconds: int = Field(1800, alias="DB_POOL_RECYCLE_SECONDS")
+    # Ping each connection on checkout; recycling alone avoids the extra round trip
+    db_pool_pre_ping: bool = Field(True, alias="DB_POOL_PRE_PING")
+    # Keep tenant connections' search_path between checkouts (dedicated pool) and only
+    # re-issue set_config when a connection switches tenant
+    db_search_path_affinity: bool = Field(False, alias="DB_SEARCH_PATH_AFFINITY")
 
     jwt_secret: str = Field(..., alias="JWT_SECRET")
     jwt_algorithm: str = Field("HS256", alias="JWT_ALGORITHM")
     access_token_expire_minutes: int = Field(60, alias="ACCESS_TOKEN_EXPIRE_MINUTES")
     session_idle_timeout_minutes: int = Field(20, alias="SESSION_IDLE_TIMEOUT_MINUTES")
+    # Re-issue a sliding token only once it is this old, as a percentage of the idle window (0 = every request)
+    token_refresh_threshold_percent: int = Field(50, alias="TOKEN_REFRESH_THRESHOLD_PERCENT")
+    # Number of verified token payloads memoized in-process until their expiry (0 disables)
+    jwt_decode_cache_size: int = Field(4096, alias="JWT_DECODE_CACHE_SIZE")
+    # bcrypt cost factor; stored hashes with a different cost are rehashed on the next login
+    bcrypt_rounds: int = Field(12, alias="BCRYPT_ROUNDS")
+    # Processes dedicated to password hashing (0 hashes in the request thread)
+    password_hash_workers: int = Field(2, alias="PASSWORD_HASH_WORKERS")
+    # Hash/verify jobs in flight or queued across all hashing processes of one API process; further requests wait
+    password_hash_max_pending: int = Field(32, alias="PASSWORD_HASH_MAX_PENDING")
+    # Seconds a request waits for a slot before the API answers 503
+    password_hash_queue_timeout_seconds: float = Field(2.0, alias="PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS")
 
     cors_origins: str | List[str] = Field(default="", alias="CORS_ORIGINS")
     hq_api_key: str | None = Field(default=None, alias="HQ_API_KEY")
 
+    # Seconds a resolved tenant slug -> schema mapping is cached in-process (0 disables)
+    tenant_cache_ttl_seconds: int = Field(300, alias="TENANT_CACHE_TTL_SECONDS")
+    # Seconds a user's effective roles/permissions, and a tenant's RBAC version used to trust
+    # token digests, are cached in-process (0 disables). This is the worst case for another
+    # worker process to stop honouring a revoked permission, from the database or a token.
+    permission_cache_ttl_seconds: int = Field(60, alias="PERMISSION_CACHE_TTL_SECONDS")
+    # Seconds a tenant's compiled grading policy and scale are cached in-process (0 disables)
+    grading_cache_ttl_seconds: int = Field(300, alias="GRADING_CACHE_TTL_SECONDS")
+    # Seconds a class's computed report cards are cached in-process; grade writes invalidate sooner (0 disables)
+    report_card_cache_ttl_seconds: int = Field(600, alias="REPORT_CARD_CACHE_TTL_SECONDS")
+    # Sign roles and a permission bitmap into tenant tokens so authorization skips the database
+    jwt_embed_permissions: bool = Field(False, alias="JWT_EMBED_PERMISSIONS")
+    # What to do with a token whose embedded permissions are out of date: "refresh" or "reject"
+    jwt_stale_permissions_policy: str = Field("refresh", alias="JWT_STALE_PERMISSIONS_POLICY")
+
+    # Apply pending tenant schema migrations when the app boots; disable when a deploy step runs them
+    run_tenant_migrations_on_startup: bool = Field(True, alias="RUN_TENANT_MIGRATIONS_ON_STARTUP")
+    # Tenants migrated in parallel by the startup hook and the migration CLI
+    tenant_migration_workers: int = Field(4, alias="TENANT_MIGRATION_WORKERS")
+    # Default for cross-tenant dashboard counts: "stored" (tenant_metrics), "exact" (count(*)) or "estimate" (planner statistics)
+    tenant_stats_mode: str = Field("stored", alias="TENANT_STATS_MODE")
+    # Seconds between background refreshes of public.tenant_metrics (0 disables the refresher)
+    tenant_metrics_refresh_seconds: int = Field(60, alias="TENANT_METRICS_REFRESH_SECONDS")
+
+    # "async" buffers audit events and writes them in batches; "sync" writes each one before the request continues
+    audit_mode: str = Field("async", alias="AUDIT_MODE")
+    # Audit events held in memory per worker process before the overflow policy applies
+    audit_buffer_size: int = Field(10000, alias="AUDIT_BUFFER_SIZE")
+    audit_batch_size: int = Field(500, alias="AUDIT_BATCH_SIZE")
+    audit_flush_seconds: float = Field(1.0, alias="AUDIT_FLUSH_SECONDS")
+    # When the buffer is full: "drop_oldest", "drop_newest" or "block" (wait up to one flush interval, then drop)
+    audit_overflow_policy: str = Field("drop_oldest", alias="AUDIT_OVERFLOW_POLICY")
+    # Full months of audit_logs kept besides the current one; older monthly partitions are dropped (0 keeps everything)
+    audit_retention_months: int = Field(12, alias="AUDIT_RETENTION_MONTHS")
+    # Monthly partitions created ahead of the current month
+    audit_partitions_ahead: int = Field(2, alias="AUDIT_PARTITIONS_AHEAD")
+    # Seconds between audit partition maintenance runs (0 disables the job)
+    audit_partition_maintenance_seconds: int = Field(3600, alias="AUDIT_PARTITION_MAINTENANCE_SECONDS")
+
     class Config:
         env_file = ".env"
         case_sensitive = True
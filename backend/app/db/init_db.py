@@ -15,6 +15,9 @@ def init_public() -> None:
     # Create platform-level admin table and seed a default platform owner
     db: Session = SessionLocal()
     try:
+        # Trigram matching backs the student search indexes in every tenant schema
+        db.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA public"))
+
         # Add production-ready columns to public.tenants
         db.execute(text("""
             ALTER TABLE IF EXISTS public.tenants
@@ -24,7 +27,16 @@ def init_public() -> None:
             ADD COLUMN IF NOT EXISTS contact_phone varchar(50),
             ADD COLUMN IF NOT EXISTS address text,
             ADD COLUMN IF NOT EXISTS enabled_modules jsonb DEFAULT '[]'::jsonb,
-            ADD COLUMN IF NOT EXISTS branding jsonb DEFAULT '{}'::jsonb
+            ADD COLUMN IF NOT EXISTS branding jsonb DEFAULT '{}'::jsonb,
+            ADD COLUMN IF NOT EXISTS rbac_version integer NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS schema_version integer NOT NULL DEFAULT 0
+        """))
+
+        # Domains that used to be hardcoded in simple_login
+        db.execute(text("""
+            INSERT INTO public.tenant_domains (tenant_id, domain)
+            SELECT id, 'ndirande-high.edu' FROM public.tenants WHERE slug = 'ndirande-high'
+            ON CONFLICT (domain) DO NOTHING
         """))
 
         # Create platform_admins table in public schema
@@ -0,0 +1,87 @@
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict
+
+from sqlalchemy.pool import Pool, QueuePool
+
+
+@dataclass
+class SchemaPoolUsage:
+    """Connection checkout accounting for one tenant schema."""
+
+    checkouts: int = 0
+    timeouts: int = 0
+    in_use: int = 0
+    peak_in_use: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    total_hold_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["avg_wait_ms"] = round(self.total_wait_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0
+        data["avg_hold_ms"] = round(self.total_hold_seconds / self.checkouts * 1000, 3) if self.checkouts else 0.0
+        return data
+
+
+class PoolMetrics:
+    """Per-schema view of how long tenant sessions wait for, and hold, pooled connections.
+
+    The tenant session helpers record one checkout per session: the wait covers
+    pool queueing, pre-ping and connect; the hold runs until the session closes.
+    """
+
+    def __init__(self):
+        self._usage: Dict[str, SchemaPoolUsage] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, schema_name: str) -> SchemaPoolUsage:
+        usage = self._usage.get(schema_name)
+        if usage is None:
+            usage = self._usage.setdefault(schema_name, SchemaPoolUsage())
+        return usage
+
+    def checked_out(self, schema_name: str, wait_seconds: float) -> None:
+        with self._lock:
+            usage = self._get(schema_name)
+            usage.checkouts += 1
+            usage.in_use += 1
+            usage.peak_in_use = max(usage.peak_in_use, usage.in_use)
+            usage.total_wait_seconds += wait_seconds
+            usage.max_wait_seconds = max(usage.max_wait_seconds, wait_seconds)
+
+    def checked_in(self, schema_name: str, hold_seconds: float) -> None:
+        with self._lock:
+            usage = self._get(schema_name)
+            usage.in_use = max(0, usage.in_use - 1)
+            usage.total_hold_seconds += hold_seconds
+
+    def timed_out(self, schema_name: str, wait_seconds: float) -> None:
+        with self._lock:
+            usage = self._get(schema_name)
+            usage.timeouts += 1
+            usage.max_wait_seconds = max(usage.max_wait_seconds, wait_seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {schema: usage.as_dict() for schema, usage in sorted(self._usage.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._usage.clear()
+
+
+pool_metrics = PoolMetrics()
+
+
+def pool_status(pool: Pool) -> Dict[str, Any]:
+    """Current occupancy of an engine pool."""
+    if isinstance(pool, QueuePool):
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "status": pool.status(),
+        }
+    return {"status": pool.status()}
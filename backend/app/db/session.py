@@ -1,22 +1,112 @@
-from contextlib import contextmanager
-from typing import Generator
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncGenerator, Dict, Generator
 
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
+from app.db.pool_metrics import pool_metrics
+
+
+def _pool_options(url: str) -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+    }
+    # SQLite (tests) does not use a sized QueuePool
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout_seconds,
+        )
+    return options
 
 
 engine: Engine = create_engine(
     settings.database_url,
-    pool_pre_ping=True,
     future=True,
+    **_pool_options(settings.database_url),
 )
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 
 
+def _async_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto the async driver for the same database."""
+    for sync_prefix, async_prefix in (
+        ("postgresql+psycopg2://", "postgresql+psycopg://"),
+        ("postgresql://", "postgresql+psycopg://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    ):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    # postgresql+psycopg serves both the sync and the async engine
+    return url
+
+
+_ASYNC_DATABASE_URL = settings.async_database_url or _async_url(settings.database_url)
+
+async_engine: AsyncEngine = create_async_engine(_ASYNC_DATABASE_URL, **_pool_options(_ASYNC_DATABASE_URL))
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+class TenantSession(Session):
+    """Session scoped to the tenant schema recorded in ``info["tenant_schema"]``."""
+
+
+def _apply_search_path(session: Session, transaction, connection: Connection) -> None:
+    """Point a connection at the session's tenant unless it already is.
+
+    Used in search_path affinity mode: the setting is session-level rather than
+    transaction-local, so a pooled connection keeps it across checkouts and the
+    set_config round trip is only paid when a connection changes tenant. Runs for
+    every connection the session begins on, including after a mid-request commit.
+    """
+    if not session.info.get("search_path_affinity"):
+        return
+    search_path = f"{session.info['tenant_schema']}, public"
+    if connection.info.get("search_path") == search_path:
+        return
+    connection.execute(text("select set_config('search_path', :sp, false)"), {"sp": search_path})
+    connection.info["search_path"] = search_path
+
+
+def _forget_search_path(connection: Connection) -> None:
+    # A rolled back transaction also rolls back a set_config issued inside it
+    connection.info.pop("search_path", None)
+
+
+def track_search_path(sync_engine: Engine) -> None:
+    event.listen(sync_engine, "rollback", _forget_search_path)
+
+
+event.listen(TenantSession, "after_begin", _apply_search_path)
+
+if settings.db_search_path_affinity:
+    # Tenant connections keep a tenant search_path between checkouts, so they get
+    # their own pools and never serve public-schema sessions.
+    tenant_engine: Engine = create_engine(settings.database_url, future=True, **_pool_options(settings.database_url))
+    async_tenant_engine: AsyncEngine = create_async_engine(_ASYNC_DATABASE_URL, **_pool_options(_ASYNC_DATABASE_URL))
+    track_search_path(tenant_engine)
+    track_search_path(async_tenant_engine.sync_engine)
+else:
+    tenant_engine = engine
+    async_tenant_engine = async_engine
+
+TenantSessionLocal = sessionmaker(
+    bind=tenant_engine, class_=TenantSession, autoflush=False, autocommit=False, future=True
+)
+AsyncTenantSessionLocal = async_sessionmaker(
+    bind=async_tenant_engine, sync_session_class=TenantSession, autoflush=False, expire_on_commit=False
+)
+
+
 def get_public_session() -> Generator[Session, None, None]:
     db = SessionLocal()
     try:
@@ -25,18 +115,38 @@ def get_public_session() -> Generator[Session, None, None]:
         db.close()
 
 
+def _record_checkout(schema_name: str, started: float) -> float:
+    acquired = time.perf_counter()
+    pool_metrics.checked_out(schema_name, acquired - started)
+    return acquired
+
+
 @contextmanager
 def tenant_session(schema_name: str) -> Generator[Session, None, None]:
-    session = SessionLocal()
+    session = TenantSessionLocal()
+    # Lets per-tenant caches key off the session without another round trip
+    session.info["tenant_schema"] = schema_name
+    session.info["search_path_affinity"] = settings.db_search_path_affinity
+    acquired = None
     try:
         with session.begin():
-            session.execute(
-                text("select set_config('search_path', :sp, true)").execution_options(autocommit=False),
-                {"sp": f"{schema_name}, public"},
-            )
+            started = time.perf_counter()
+            try:
+                session.connection()
+            except PoolTimeoutError:
+                pool_metrics.timed_out(schema_name, time.perf_counter() - started)
+                raise
+            acquired = _record_checkout(schema_name, started)
+            if not settings.db_search_path_affinity:
+                session.execute(
+                    text("select set_config('search_path', :sp, true)").execution_options(autocommit=False),
+                    {"sp": f"{schema_name}, public"},
+                )
             yield session
     finally:
         session.close()
+        if acquired is not None:
+            pool_metrics.checked_in(schema_name, time.perf_counter() - acquired)
 
 
 def get_tenant_session(schema_name: str) -> Generator[Session, None, None]:
@@ -44,4 +154,34 @@ def get_tenant_session(schema_name: str) -> Generator[Session, None, None]:
         yield s
 
 
+@asynccontextmanager
+async def async_tenant_session(schema_name: str) -> AsyncGenerator[AsyncSession, None]:
+    """Async counterpart of tenant_session; accepts the same text() SQL."""
+    session = AsyncTenantSessionLocal()
+    session.info["tenant_schema"] = schema_name
+    session.info["search_path_affinity"] = settings.db_search_path_affinity
+    acquired = None
+    try:
+        async with session.begin():
+            started = time.perf_counter()
+            try:
+                await session.connection()
+            except PoolTimeoutError:
+                pool_metrics.timed_out(schema_name, time.perf_counter() - started)
+                raise
+            acquired = _record_checkout(schema_name, started)
+            if not settings.db_search_path_affinity:
+                await session.execute(
+                    text("select set_config('search_path', :sp, true)"),
+                    {"sp": f"{schema_name}, public"},
+                )
+            yield session
+    finally:
+        await session.close()
+        if acquired is not None:
+            pool_metrics.checked_in(schema_name, time.perf_counter() - acquired)
+
 
+async def get_async_tenant_session(schema_name: str) -> AsyncGenerator[AsyncSession, None]:
+    async with async_tenant_session(schema_name) as s:
+        yield s
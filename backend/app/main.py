@@ -1,5 +1,6 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.core.config import settings
 from app.api.routers.auth import router as auth_router
@@ -15,9 +16,13 @@ from app.api.routers.communications import router as communications_router
 from app.api.routers.parents import router as parents_router
 from app.db.init_db import init_public
 from sqlalchemy.orm import Session
-from sqlalchemy import text
 from app.db.session import SessionLocal
-from app.tenancy.service import TenantService
+from app.services.audit import audit_partition_maintainer, audit_writer
+from app.services.password_hasher import PasswordHasherBusy, password_hasher
+from app.tenancy.domains import tenant_domain_index
+from app.tenancy.metrics import metrics_refresher
+from app.tenancy.migrations import outdated_schemas
+from app.tenancy.orchestrator import provision_tenants
 
 
 app = FastAPI(title=settings.app_name)
@@ -34,10 +39,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Refreshed-Token"],
+    expose_headers=["X-Refreshed-Token", "X-Next-Cursor", "X-Total-Count"],
 )
 
 
+@app.exception_handler(PasswordHasherBusy)
+def password_hasher_busy(request: Request, exc: PasswordHasherBusy) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-ins in progress, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
 @app.get("/api/health")
 def health() -> dict[str, str]:
     return {"status": "ok"}
@@ -59,17 +73,32 @@ app.include_router(parents_router, prefix="/api/parents", tags=["parents"])
 @app.on_event("startup")
 def on_startup() -> None:
     init_public()
-    # Ensure all tenant schemas exist and have baseline RBAC seeded
-    db: Session = SessionLocal()
+    if settings.run_tenant_migrations_on_startup:
+        # Only tenants behind the latest migration are touched; none on a routine restart
+        db: Session = SessionLocal()
+        try:
+            schema_names = outdated_schemas(db)
+        finally:
+            db.close()
+        if schema_names:
+            # A broken tenant is reported but does not keep the others from serving
+            report = provision_tenants(schema_names)
+            for result in report.failed:
+                print(f"Tenant {result.schema_name} failed provisioning: {result.error or '; '.join(result.problems)}")
+    db = SessionLocal()
     try:
-        schema_names = db.execute(text("SELECT schema_name FROM tenants ORDER BY id ASC")).scalars().all()
-        svc = TenantService(db)
-        for schema_name in schema_names:
-            svc.ensure_schema(schema_name)
-            db.execute(text(f"SET LOCAL search_path TO \"{schema_name}\", public"))
-            svc.seed_defaults()
-        db.commit()
+        tenant_domain_index.load(db)
     finally:
         db.close()
+    metrics_refresher.start()
+    audit_writer.start()
+    audit_partition_maintainer.start()
+    password_hasher.start()
 
 
+@app.on_event("shutdown")
+def on_shutdown() -> None:
+    metrics_refresher.stop()
+    audit_writer.stop()
+    audit_partition_maintainer.stop()
+    password_hasher.shutdown()
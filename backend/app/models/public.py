@@ -1,6 +1,7 @@
 from datetime import datetime
+from decimal import Decimal
 
-from sqlalchemy import String, UniqueConstraint
+from sqlalchemy import BigInteger, ForeignKey, Integer, Numeric, String, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.base import PublicBase, TimestampMixin
@@ -17,6 +18,53 @@ class Tenant(PublicBase, TimestampMixin):
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     slug: Mapped[str] = mapped_column(String(64), nullable=False)
     schema_name: Mapped[str] = mapped_column(String(64), nullable=False)
+    # Bumped whenever the tenant's roles or permissions change; tokens carrying
+    # an embedded permission digest with an older version are stale
+    rbac_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    # Highest tenant migration applied to the schema (see app.tenancy.migrations)
+    schema_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
 
+class TenantMetrics(PublicBase):
+    """Dashboard counts per tenant, kept current by app.tenancy.metrics."""
 
+    __tablename__ = "tenant_metrics"
+
+    tenant_id: Mapped[int] = mapped_column(ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True)
+    users: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    active_users: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    roles: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    permissions: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    students: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    teachers: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    classes: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    subjects: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    invoices: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    payments: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    outstanding_balance: Mapped[Decimal] = mapped_column(Numeric(14, 2), nullable=False, default=0, server_default="0")
+    # Sum of the schema's insert/update/delete counters when the row was computed;
+    # the refresher only recounts tenants whose counters have moved since
+    change_marker: Mapped[int] = mapped_column(BigInteger, nullable=False, default=-1, server_default="-1")
+    refreshed_at: Mapped[datetime] = mapped_column(default=func.now(), nullable=False)
+
+
+class TenantDomain(PublicBase):
+    """Email domain that identifies a tenant at login; subdomains match too."""
+
+    __tablename__ = "tenant_domains"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    tenant_id: Mapped[int] = mapped_column(ForeignKey("tenants.id", ondelete="CASCADE"), nullable=False, index=True)
+    domain: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now(), nullable=False)
+
+
+class UserDirectoryEntry(PublicBase):
+    """Where a tenant user lives, so a login by email alone finds the schema in one lookup."""
+
+    __tablename__ = "user_directory"
+
+    tenant_id: Mapped[int] = mapped_column(ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Stored lower-cased
+    email: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
@@ -210,3 +210,44 @@ class ExamScheduleRead(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+# Report card schemas
+class SubjectGrade(BaseModel):
+    subject_name: str
+    ca_score: float
+    exam_score: float
+    overall_score: float
+    grade: Optional[str] = None
+    grade_points: float
+    is_finalized: bool
+
+
+class StudentReportCard(BaseModel):
+    student_id: int
+    first_name: str
+    last_name: str
+    admission_no: str
+    class_name: str
+    academic_year: str
+    term: str
+    subjects: List[SubjectGrade]
+    total_subjects: int
+    total_points: float
+    gpa: float
+    overall_gpa: float  # Alias for gpa to match frontend
+    term_average: float  # Term average percentage
+    class_position: Optional[int] = None  # Student's position in class
+    total_students_in_class: Optional[int] = None  # Total students in class
+    attendance_percentage: Optional[float] = None  # Attendance percentage
+
+
+class ClassReportCards(BaseModel):
+    class_name: str
+    students: List[StudentReportCard]
+
+
+class ReportCardBatch(BaseModel):
+    academic_year: str
+    term: str
+    classes: List[ClassReportCards]
@@ -51,3 +51,12 @@ class StudentRead(BaseModel):
         from_attributes = True
 
 
+class StudentSearchResult(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    admission_no: str
+    student_number: Optional[str] = None
+    class_name: Optional[str] = None
+    score: float
+
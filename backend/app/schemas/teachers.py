@@ -117,3 +117,54 @@ class TeacherDashboard(BaseModel):
     current_assignments: List[TeacherAssignmentRead]
     recent_performance: Optional[TeacherPerformanceRead]
     attendance_rate: Optional[float]  # Percentage of classes attended
+
+
+class MarkSheetEntry(BaseModel):
+    student_id: int
+    ca_score: Optional[float] = None
+    exam_score: Optional[float] = None
+    overall_score: Optional[float] = None
+    comments: Optional[str] = None
+
+
+class MarkSheetCreate(BaseModel):
+    class_name: str
+    subject_code: str
+    term: str
+    academic_year: str
+    entries: List[MarkSheetEntry]
+
+
+class MarkSheetRowResult(BaseModel):
+    student_id: int
+    status: str  # saved | error
+    overall_score: Optional[float] = None
+    grade: Optional[str] = None
+    grade_points: Optional[float] = None
+    error: Optional[str] = None
+
+
+class MarkSheetResult(BaseModel):
+    saved: int
+    failed: int
+    results: List[MarkSheetRowResult]
+
+
+class RegisterEntry(BaseModel):
+    student_id: int
+    status: str = "present"
+    notes: Optional[str] = None
+
+
+class RegisterCreate(BaseModel):
+    class_name: str
+    date: date
+    records: List[RegisterEntry] = []
+    # Status for every student in the class not listed in records, e.g. "present"
+    default_status: Optional[str] = None
+
+
+class RegisterResult(BaseModel):
+    class_id: int
+    recorded: int
+    rejected: List[MarkSheetRowResult]
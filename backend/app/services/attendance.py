@@ -0,0 +1,45 @@
+from datetime import date
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+def upsert_attendance(
+    db: Session,
+    class_id: int,
+    on_date: date,
+    records: Sequence[Tuple[int, str, Optional[str]]],
+    recorded_by: Optional[int],
+) -> int:
+    """Write a class register in one statement; returns the number of students written.
+
+    ``records`` holds (student_id, status, notes). A student listed twice keeps
+    the last entry, since one upsert cannot touch the same row twice. Does not
+    commit.
+    """
+    latest: Dict[int, Tuple[str, Optional[str]]] = {}
+    for student_id, status, notes in records:
+        latest[student_id] = (status, notes)
+    if not latest:
+        return 0
+    db.execute(
+        text("""
+            INSERT INTO attendance(student_id, class_id, date, status, notes, recorded_by)
+            SELECT r.student_id, :class_id, :date, r.status, r.notes, :recorded_by
+            FROM unnest(
+                CAST(:student_ids AS integer[]), CAST(:statuses AS varchar[]), CAST(:notes AS text[])
+            ) AS r(student_id, status, notes)
+            ON CONFLICT (student_id, class_id, date) DO UPDATE SET
+            status = EXCLUDED.status, notes = EXCLUDED.notes, recorded_by = EXCLUDED.recorded_by
+        """),
+        {
+            "class_id": class_id,
+            "date": on_date,
+            "recorded_by": recorded_by,
+            "student_ids": list(latest),
+            "statuses": [status for status, _ in latest.values()],
+            "notes": [notes for _, notes in latest.values()],
+        },
+    )
+    return len(latest)
@@ -0,0 +1,530 @@
+"""Buffered audit trail writer.
+
+Request handlers enqueue audit events in memory; a background thread writes
+them to each tenant's ``audit_logs`` table in batches, one multi-row INSERT per
+tenant schema per flush. The buffer is bounded: when it is full the overflow
+policy decides whether the newest event, the oldest event, or the caller
+(blocking briefly) gives way. ``mode="sync"`` writes every event before the
+request continues, for deployments that cannot lose any.
+
+``audit_logs`` is range-partitioned by month on ``created_at``. Writers create
+a missing month on first use, the maintenance thread creates upcoming months
+ahead of time and drops whole partitions once they fall out of the retention
+window, so purging old events never scans or deletes rows.
+"""
+import json
+import re
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timezone
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal, engine
+
+AUDIT_MODES = ("async", "sync")
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+AUDIT_LOGS_SQL = """
+    CREATE TABLE IF NOT EXISTS "{schema}".audit_logs (
+        id BIGSERIAL,
+        user_id INTEGER,
+        action VARCHAR(100) NOT NULL,
+        resource_type VARCHAR(50) NOT NULL,
+        resource_id INTEGER,
+        old_values JSONB,
+        new_values JSONB,
+        ip_address INET,
+        user_agent TEXT,
+        tenant_schema VARCHAR(64),
+        created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'UTC'),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)
+"""
+
+# Created on the parent, so every partition gets its own copy
+AUDIT_LOG_INDEXES = {
+    "idx_audit_logs_created_at": "(created_at)",
+    "idx_audit_logs_user_id": "(user_id, created_at)",
+    "idx_audit_logs_action": "(action, created_at)",
+}
+
+_PARTITION_RE = re.compile(r"^audit_logs_p(\d{4})(\d{2})$")
+
+
+@dataclass
+class AuditEvent:
+    tenant_schema: str
+    user_id: Optional[int]
+    action: str
+    resource_type: str
+    resource_id: Optional[int] = None
+    old_values: Optional[dict] = None
+    new_values: Optional[dict] = None
+    ip_address: Optional[str] = None
+    user_agent: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+@dataclass
+class AuditStats:
+    enqueued: int = 0
+    written: int = 0
+    dropped: int = 0
+    failed_flushes: int = 0
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"audit_logs_p{month:%Y%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """Month covered by an audit_logs partition, or None for a table this module did not name."""
+    match = _PARTITION_RE.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def expired_partitions(names: Iterable[str], retention_months: int, today: Optional[date] = None) -> List[str]:
+    """Partitions entirely older than the retention window; nothing expires when retention is 0.
+
+    The current month plus ``retention_months`` full months before it are kept.
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(today or datetime.now(timezone.utc).date()), -retention_months)
+    expired = []
+    for name in names:
+        month = partition_month(name)
+        if month is not None and month < cutoff:
+            expired.append(name)
+    return sorted(expired)
+
+
+# (schema, month) partitions this process has seen committed
+_known_partitions: Set[Tuple[str, date]] = set()
+_known_lock = threading.Lock()
+
+
+def remember_partitions(schema_name: str, months: Iterable[date]) -> None:
+    """Record partitions as existing; call only once their transaction has committed."""
+    with _known_lock:
+        _known_partitions.update((schema_name, m) for m in months)
+
+
+def forget_partitions(schema_name: str) -> None:
+    with _known_lock:
+        _known_partitions.difference_update({k for k in _known_partitions if k[0] == schema_name})
+
+
+def create_audit_partitions(conn: Connection, schema_name: str, months: Iterable[date]) -> List[date]:
+    """Create the monthly partitions not yet known to exist, in the caller's transaction.
+
+    Returns the months that were checked; pass them to remember_partitions after commit.
+    """
+    months = sorted({month_start(m) for m in months})
+    with _known_lock:
+        missing = [m for m in months if (schema_name, m) not in _known_partitions]
+    if not missing:
+        return []
+    # Concurrent writers would otherwise race on the catalog for the same month
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"audit_partitions:{schema_name}"})
+    for month in missing:
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{schema_name}"."{partition_name(month)}" '
+            f'PARTITION OF "{schema_name}".audit_logs '
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        ))
+    return missing
+
+
+def list_audit_partitions(conn: Connection, schema_name: str) -> List[str]:
+    return conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = :schema AND p.relname = 'audit_logs'
+        ORDER BY c.relname
+    """), {"schema": schema_name}).scalars().all()
+
+
+def drop_expired_audit_partitions(
+    conn: Connection, schema_name: str, retention_months: int, today: Optional[date] = None
+) -> List[str]:
+    """Drop whole months past retention; a catalog change, not a row-by-row delete."""
+    dropped = expired_partitions(list_audit_partitions(conn, schema_name), retention_months, today)
+    for name in dropped:
+        conn.execute(text(f'DROP TABLE IF EXISTS "{schema_name}"."{name}"'))
+    return dropped
+
+
+def create_audit_log_table(conn: Connection, schema_name: str, months_ahead: int) -> None:
+    """Create the partitioned audit_logs table, moving rows over from a plain one if present.
+
+    Older deployments got an unpartitioned audit_logs from enhance_security.py;
+    it is renamed out of the way, copied month by month and dropped.
+    """
+    relkind = conn.execute(text("""
+        SELECT c.relkind FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema AND c.relname = 'audit_logs'
+    """), {"schema": schema_name}).scalar()
+    legacy = relkind == "r"
+    if legacy:
+        conn.execute(text(f'ALTER TABLE "{schema_name}".audit_logs RENAME TO audit_logs_legacy'))
+        conn.execute(text(f'ALTER SEQUENCE IF EXISTS "{schema_name}".audit_logs_id_seq RENAME TO audit_logs_legacy_id_seq'))
+        for index_name in AUDIT_LOG_INDEXES:
+            conn.execute(text(f'DROP INDEX IF EXISTS "{schema_name}".{index_name}'))
+
+    conn.execute(text(AUDIT_LOGS_SQL.format(schema=schema_name)))
+    for index_name, columns in AUDIT_LOG_INDEXES.items():
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS {index_name} ON "{schema_name}".audit_logs {columns}'))
+    current = month_start(datetime.now(timezone.utc).date())
+    months = [add_months(current, i) for i in range(months_ahead + 1)]
+
+    if legacy:
+        months += conn.execute(text(f"""
+            SELECT DISTINCT CAST(date_trunc('month', created_at) AS date)
+            FROM "{schema_name}".audit_logs_legacy WHERE created_at IS NOT NULL
+        """)).scalars().all()
+        create_audit_partitions(conn, schema_name, months)
+        conn.execute(text(f"""
+            INSERT INTO "{schema_name}".audit_logs
+            (user_id, action, resource_type, resource_id, old_values, new_values,
+             ip_address, user_agent, tenant_schema, created_at)
+            SELECT user_id, action, resource_type, resource_id, old_values, new_values,
+                   ip_address, user_agent, tenant_schema,
+                   COALESCE(created_at, now() AT TIME ZONE 'UTC')
+            FROM "{schema_name}".audit_logs_legacy
+        """))
+        conn.execute(text(f'DROP TABLE "{schema_name}".audit_logs_legacy'))
+    else:
+        create_audit_partitions(conn, schema_name, months)
+
+
+def maintain_audit_partitions(
+    bind: Engine, schema_name: str, months_ahead: int, retention_months: int
+) -> Dict[str, List[str]]:
+    """Create upcoming months and drop expired ones for one tenant."""
+    current = month_start(datetime.now(timezone.utc).date())
+    # Trust the catalog rather than this process's memory
+    forget_partitions(schema_name)
+    with bind.begin() as conn:
+        existing = [m for m in map(partition_month, list_audit_partitions(conn, schema_name)) if m]
+        remember_partitions(schema_name, existing)
+        created = create_audit_partitions(conn, schema_name, [add_months(current, i) for i in range(months_ahead + 1)])
+        dropped = drop_expired_audit_partitions(conn, schema_name, retention_months)
+    forget_partitions(schema_name)
+    remember_partitions(schema_name, [m for m in existing + created if partition_name(m) not in dropped])
+    return {"created": [partition_name(m) for m in created], "dropped": dropped}
+
+
+def query_audit_logs(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    """Audit events in [start, end), newest first.
+
+    The created_at range lets Postgres skip every partition outside it.
+    Events still waiting in the writer's buffer are not visible yet.
+    """
+    query = """
+        SELECT id, user_id, action, resource_type, resource_id, old_values, new_values,
+               host(ip_address) AS ip_address, user_agent, created_at
+        FROM audit_logs
+        WHERE created_at >= :start AND created_at < :end
+    """
+    params: Dict[str, Any] = {"start": as_utc_naive(start), "end": as_utc_naive(end), "limit": limit, "offset": offset}
+    if user_id is not None:
+        query += " AND user_id = :user_id"
+        params["user_id"] = user_id
+    if action:
+        query += " AND action = :action"
+        params["action"] = action
+    if resource_type:
+        query += " AND resource_type = :resource_type"
+        params["resource_type"] = resource_type
+    query += " ORDER BY created_at DESC, id DESC LIMIT :limit OFFSET :offset"
+    return [dict(r) for r in db.execute(text(query), params).mappings().all()]
+
+
+def as_utc_naive(value: datetime) -> datetime:
+    """created_at is stored as UTC without a time zone; naive input is taken to be UTC."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def insert_audit_events(bind: Engine, schema_name: str, batch: List[AuditEvent]) -> int:
+    """Write one tenant's events with a single multi-row INSERT."""
+    with bind.begin() as conn:
+        months = create_audit_partitions(conn, schema_name, (e.created_at.astimezone(timezone.utc).date() for e in batch))
+        conn.execute(
+            text(f"""
+                INSERT INTO "{schema_name}".audit_logs
+                (user_id, action, resource_type, resource_id, old_values, new_values,
+                 ip_address, user_agent, tenant_schema, created_at)
+                SELECT r.user_id, r.action, r.resource_type, r.resource_id,
+                       CAST(r.old_values AS jsonb), CAST(r.new_values AS jsonb),
+                       CAST(NULLIF(r.ip_address, '') AS inet), r.user_agent, :schema,
+                       r.created_at AT TIME ZONE 'UTC'
+                FROM unnest(
+                    CAST(:user_ids AS integer[]), CAST(:actions AS varchar[]),
+                    CAST(:resource_types AS varchar[]), CAST(:resource_ids AS integer[]),
+                    CAST(:old_values AS text[]), CAST(:new_values AS text[]),
+                    CAST(:ip_addresses AS text[]), CAST(:user_agents AS text[]),
+                    CAST(:created_ats AS timestamptz[])
+                ) AS r(user_id, action, resource_type, resource_id, old_values, new_values,
+                       ip_address, user_agent, created_at)
+            """),
+            {
+                "schema": schema_name,
+                "user_ids": [e.user_id for e in batch],
+                "actions": [e.action for e in batch],
+                "resource_types": [e.resource_type for e in batch],
+                "resource_ids": [e.resource_id for e in batch],
+                "old_values": [json.dumps(e.old_values, default=str) if e.old_values is not None else None for e in batch],
+                "new_values": [json.dumps(e.new_values, default=str) if e.new_values is not None else None for e in batch],
+                "ip_addresses": [e.ip_address for e in batch],
+                "user_agents": [e.user_agent for e in batch],
+                "created_ats": [e.created_at for e in batch],
+            },
+        )
+    remember_partitions(schema_name, months)
+    return len(batch)
+
+
+class AuditWriter:
+    """Bounded in-memory audit buffer flushed by a daemon thread.
+
+    A flush runs every ``flush_seconds`` or as soon as ``batch_size`` events
+    are waiting. Each tenant's share of a batch is written in its own
+    transaction. Connection failures put those events back at the front of
+    the buffer for the next attempt; any other database error (e.g. a tenant
+    without an audit_logs table) drops them, as the inline writer used to.
+    Events still buffered when the process stops are written by ``stop``.
+    """
+
+    def __init__(
+        self,
+        mode: str = "async",
+        capacity: int = 10000,
+        batch_size: int = 500,
+        flush_seconds: float = 1.0,
+        overflow_policy: str = "drop_oldest",
+        bind: Optional[Engine] = None,
+    ):
+        if mode not in AUDIT_MODES:
+            raise ValueError(f"Unknown audit mode: {mode}")
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown audit overflow policy: {overflow_policy}")
+        self.mode = mode
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.overflow_policy = overflow_policy
+        self.bind = bind or engine
+        self.stats = AuditStats()
+        self._buffer: Deque[AuditEvent] = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def enqueue(self, event: AuditEvent) -> bool:
+        """Buffer an event (or write it now in sync mode); False if it was dropped."""
+        if self.mode == "sync":
+            insert_audit_events(self.bind, event.tenant_schema, [event])
+            with self._cond:
+                self.stats.enqueued += 1
+                self.stats.written += 1
+            return True
+        with self._cond:
+            if len(self._buffer) >= self.capacity:
+                if self.overflow_policy == "block":
+                    self._cond.wait_for(lambda: len(self._buffer) < self.capacity, timeout=self.flush_seconds)
+                if len(self._buffer) >= self.capacity:
+                    if self.overflow_policy != "drop_oldest":
+                        self.stats.dropped += 1
+                        return False
+                    self._buffer.popleft()
+                    self.stats.dropped += 1
+            self._buffer.append(event)
+            self.stats.enqueued += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def flush(self) -> int:
+        """Write up to one batch now; returns the number of events written."""
+        with self._cond:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            self._cond.notify_all()
+        written = 0
+        by_schema: Dict[str, List[AuditEvent]] = {}
+        for event in batch:
+            by_schema.setdefault(event.tenant_schema, []).append(event)
+        # One transaction per tenant, so a tenant without audit_logs cannot sink the others
+        for schema_name, events in by_schema.items():
+            try:
+                written += insert_audit_events(self.bind, schema_name, events)
+            except OperationalError as e:
+                with self._cond:
+                    self.stats.failed_flushes += 1
+                    # Keep the oldest events; whatever no longer fits is dropped
+                    room = max(0, self.capacity - len(self._buffer))
+                    kept = events[:room]
+                    self._buffer.extendleft(reversed(kept))
+                    self.stats.dropped += len(events) - len(kept)
+                print(f"Audit flush for {schema_name} failed, will retry: {e}")
+            except DBAPIError as e:
+                with self._cond:
+                    self.stats.failed_flushes += 1
+                    self.stats.dropped += len(events)
+                print(f"Audit flush for {schema_name} failed, dropped {len(events)} event(s): {e}")
+        with self._cond:
+            self.stats.written += written
+        return written
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def start(self) -> None:
+        if self.mode != "async" or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the worker and write whatever is still buffered."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        while self._buffer and self.flush():
+            pass
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stop.is_set() or len(self._buffer) >= self.batch_size,
+                    timeout=self.flush_seconds,
+                )
+            while self.flush() >= self.batch_size:
+                pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "mode": self.mode,
+                "overflow_policy": self.overflow_policy,
+                "capacity": self.capacity,
+                "pending": len(self._buffer),
+                **asdict(self.stats),
+            }
+
+
+audit_writer = AuditWriter(
+    mode=settings.audit_mode,
+    capacity=settings.audit_buffer_size,
+    batch_size=settings.audit_batch_size,
+    flush_seconds=settings.audit_flush_seconds,
+    overflow_policy=settings.audit_overflow_policy,
+)
+
+
+class AuditPartitionMaintainer:
+    """Daemon thread that keeps every tenant's audit_logs partitions current.
+
+    Runs once at start and then every ``interval_seconds``; an advisory lock
+    makes all but one worker process skip each round.
+    """
+
+    def __init__(self, interval_seconds: int, months_ahead: int, retention_months: int):
+        self.interval_seconds = interval_seconds
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-partitions", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            self.run_once()
+            if self._stop.wait(self.interval_seconds):
+                break
+
+    def run_once(self) -> Dict[str, Dict[str, List[str]]]:
+        """Maintain every tenant whose audit_logs is partitioned; returns changes per schema."""
+        db = SessionLocal()
+        changes: Dict[str, Dict[str, List[str]]] = {}
+        try:
+            locked = db.execute(text("SELECT pg_try_advisory_xact_lock(hashtext('audit_partition_maintenance'))")).scalar()
+            if not locked:
+                return changes
+            schema_names = db.execute(text("""
+                SELECT t.schema_name FROM public.tenants t
+                JOIN pg_namespace n ON n.nspname = t.schema_name
+                JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = 'audit_logs' AND c.relkind = 'p'
+                ORDER BY t.id
+            """)).scalars().all()
+            # Each tenant commits on its own; the lock above stays held until db closes
+            for schema_name in schema_names:
+                try:
+                    result = maintain_audit_partitions(engine, schema_name, self.months_ahead, self.retention_months)
+                except DBAPIError as e:
+                    print(f"Audit partition maintenance failed for {schema_name}: {e}")
+                    continue
+                if result["created"] or result["dropped"]:
+                    changes[schema_name] = result
+            return changes
+        except Exception as e:
+            print(f"Audit partition maintenance failed: {e}")
+            return changes
+        finally:
+            db.rollback()
+            db.close()
+
+
+audit_partition_maintainer = AuditPartitionMaintainer(
+    interval_seconds=settings.audit_partition_maintenance_seconds,
+    months_ahead=settings.audit_partitions_ahead,
+    retention_months=settings.audit_retention_months,
+)
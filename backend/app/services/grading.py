@@ -0,0 +1,164 @@
+import threading
+import time
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class GradeBand:
+    min_score: float
+    max_score: float
+    letter: str
+    points: Optional[float]
+
+
+class GradingEngine:
+    """A tenant's grading policy and grade scale, compiled for repeated lookups.
+
+    Bands keep the priority order of the scale (sort_order, then highest
+    minimum first): the first band containing the score wins. When no two bands
+    overlap the winner is found by bisecting the band minimums; otherwise the
+    bands are scanned in priority order.
+    """
+
+    def __init__(self, ca_weight: float, exam_weight: float, bands: Sequence[GradeBand]):
+        self.ca_factor = ca_weight / 100.0
+        self.exam_factor = exam_weight / 100.0
+        self.bands: List[GradeBand] = list(bands)
+        by_min = sorted(self.bands, key=lambda b: b.min_score)
+        self._disjoint = all(a.max_score < b.min_score for a, b in zip(by_min, by_min[1:]))
+        self._by_min = by_min
+        self._mins = [b.min_score for b in by_min]
+
+    def band_for(self, overall: float) -> Optional[GradeBand]:
+        if self._disjoint:
+            i = bisect_right(self._mins, overall) - 1
+            if i >= 0 and overall <= self._by_min[i].max_score:
+                return self._by_min[i]
+            return None
+        for band in self.bands:
+            if band.min_score <= overall <= band.max_score:
+                return band
+        return None
+
+    def compute(
+        self, ca_score: Optional[float], exam_score: Optional[float], explicit_overall: Optional[float]
+    ) -> Tuple[Optional[float], Optional[str], Optional[float]]:
+        """Returns (overall_score, grade_letter, grade_points)."""
+        overall: Optional[float] = None
+        if explicit_overall is not None:
+            overall = float(explicit_overall)
+        elif ca_score is not None or exam_score is not None:
+            overall = round(float(ca_score or 0) * self.ca_factor + float(exam_score or 0) * self.exam_factor, 2)
+        if overall is None:
+            return None, None, None
+        band = self.band_for(overall)
+        if band is None:
+            return overall, None, None
+        return overall, band.letter, band.points
+
+
+def load_grading_engine(db: Session) -> GradingEngine:
+    """Read the policy and scale for the tenant on the session's search_path."""
+    policy = db.execute(text("SELECT ca_weight, exam_weight FROM grading_policies LIMIT 1")).mappings().first()
+    ca_w = float(policy.ca_weight) if policy and policy.ca_weight is not None else 40.0
+    ex_w = float(policy.exam_weight) if policy and policy.exam_weight is not None else 60.0
+    rows = db.execute(text("""
+        SELECT letter, min_score, max_score, points
+        FROM grade_scales
+        ORDER BY sort_order ASC, min_score DESC
+    """)).mappings().all()
+    bands = [
+        GradeBand(
+            min_score=float(r.min_score),
+            max_score=float(r.max_score),
+            letter=r.letter,
+            points=float(r.points) if r.points is not None else None,
+        )
+        for r in rows
+        # Incomplete bands can never match a score
+        if r.min_score is not None and r.max_score is not None
+    ]
+    return GradingEngine(ca_w, ex_w, bands)
+
+
+class GradingEngineCache:
+    """Process-local compiled grading engines keyed by tenant schema.
+
+    The grading policy and scale endpoints invalidate their tenant's entry; the
+    TTL bounds staleness for changes made by other worker processes. A TTL of 0
+    disables caching.
+
+    Each invalidation bumps the tenant's generation; an engine loaded before
+    the change is not stored after it.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, GradingEngine]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, schema_name: str) -> int:
+        return self._generations.get(schema_name, 0)
+
+    def get(self, schema_name: str) -> Optional[GradingEngine]:
+        if self.ttl_seconds <= 0:
+            return None
+        entry = self._entries.get(schema_name)
+        if entry is None:
+            return None
+        expires_at, engine = entry
+        if expires_at < time.monotonic():
+            with self._lock:
+                if self._entries.get(schema_name) is entry:
+                    del self._entries[schema_name]
+            return None
+        return engine
+
+    def set(self, schema_name: str, engine: GradingEngine, generation: int) -> None:
+        """Store an engine loaded under ``generation``; dropped if the tenant was invalidated since."""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if self._generations.get(schema_name, 0) != generation:
+                return
+            self._entries[schema_name] = (time.monotonic() + self.ttl_seconds, engine)
+
+    def invalidate(self, schema_name: str) -> None:
+        with self._lock:
+            self._generations[schema_name] = self._generations.get(schema_name, 0) + 1
+            self._entries.pop(schema_name, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+grading_cache = GradingEngineCache(ttl_seconds=settings.grading_cache_ttl_seconds)
+
+
+def get_grading_engine(db: Session) -> GradingEngine:
+    """The tenant's compiled grading engine; sessions without a known tenant schema always load."""
+    schema_name = db.info.get("tenant_schema")
+    if not schema_name:
+        return load_grading_engine(db)
+    engine = grading_cache.get(schema_name)
+    if engine is None:
+        generation = grading_cache.generation(schema_name)
+        engine = load_grading_engine(db)
+        grading_cache.set(schema_name, engine, generation)
+    return engine
+
+
+def invalidate_grading(db: Session) -> None:
+    """Drop the cached engine after the tenant's policy or scale changed."""
+    schema_name = db.info.get("tenant_schema")
+    if schema_name:
+        grading_cache.invalidate(schema_name)
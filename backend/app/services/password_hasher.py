@@ -0,0 +1,151 @@
+"""bcrypt hashing and verification on a dedicated process pool.
+
+A bcrypt call costs a few hundred milliseconds of CPU. Running them in a small
+process pool keeps a login storm from starving every other request in the
+worker, and a bounded number of pending jobs turns overload into a quick 503
+instead of an ever-growing queue.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.security import hash_password, verify_and_update_password
+
+
+class PasswordHasherBusy(Exception):
+    """Every password hashing slot stayed taken for the whole queue timeout."""
+
+
+@dataclass
+class HashOperationStats:
+    """Latency accounting for one kind of password operation."""
+
+    calls: int = 0
+    rejected: int = 0
+    total_wait_seconds: float = 0.0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["avg_wait_ms"] = round(self.total_wait_seconds / self.calls * 1000, 3) if self.calls else 0.0
+        data["avg_ms"] = round(self.total_seconds / self.calls * 1000, 3) if self.calls else 0.0
+        return data
+
+
+class PasswordHasher:
+    """Runs hash/verify jobs on ``workers`` processes, with at most ``max_pending`` in flight.
+
+    A caller that cannot get a slot within ``queue_timeout`` seconds gets
+    PasswordHasherBusy. With no workers the job runs in the calling thread,
+    still bounded by the same slots. The slots are shared by every hashing
+    process, not counted per process. If a pool process dies (e.g. the OOM
+    killer), the pool is replaced and the job retried once.
+    """
+
+    def __init__(self, workers: int, max_pending: int, queue_timeout: float, rounds: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, HashOperationStats] = {}
+        self._in_flight = 0
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self.workers <= 0:
+            return None
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = self._new_executor()
+        return self._executor
+
+    def _new_executor(self) -> Executor:
+        # Spawned, not forked: the parent already runs threads and holds pooled connections
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _discard_executor(self, broken: Executor) -> None:
+        # Only the first caller to notice replaces the pool; later ones already see the new one
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        executor = self._get_executor()
+        if executor is None:
+            return fn(*args)
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            self._discard_executor(executor)
+            return self._get_executor().submit(fn, *args).result()
+
+    def start(self) -> None:
+        """Spawn the worker processes now rather than on the first login."""
+        executor = self._get_executor()
+        if executor is not None:
+            for future in [executor.submit(time.sleep, 0) for _ in range(self.workers)]:
+                future.result()
+
+    def _run(self, operation: str, fn: Callable[..., Any], *args: Any) -> Any:
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._stats.setdefault(operation, HashOperationStats()).rejected += 1
+            raise PasswordHasherBusy(f"Password {operation} queue is full")
+        acquired = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return self._submit(fn, *args)
+        finally:
+            self._slots.release()
+            finished = time.perf_counter()
+            with self._lock:
+                self._in_flight -= 1
+                stats = self._stats.setdefault(operation, HashOperationStats())
+                stats.calls += 1
+                stats.total_wait_seconds += acquired - started
+                stats.total_seconds += finished - started
+                stats.max_seconds = max(stats.max_seconds, finished - started)
+
+    def hash(self, password: str) -> str:
+        return self._run("hash", hash_password, password, self.rounds)
+
+    def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """(matches, replacement hash when the stored one uses outdated parameters)."""
+        return self._run("verify", verify_and_update_password, password, hashed_password, self.rounds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "rounds": self.rounds,
+                "operations": {op: stats.as_dict() for op, stats in sorted(self._stats.items())},
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    workers=settings.password_hash_workers,
+    max_pending=settings.password_hash_max_pending,
+    queue_timeout=settings.password_hash_queue_timeout_seconds,
+    rounds=settings.bcrypt_rounds,
+)
@@ -0,0 +1,349 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.tenancy.cache import tenant_cache
+from app.tenancy.service import DEFAULT_PERMISSIONS
+
+
+@dataclass(frozen=True)
+class EffectivePermissions:
+    """Role and permission names granted to a user within one tenant."""
+
+    roles: FrozenSet[str]
+    permissions: FrozenSet[str]
+
+    def has_any_role(self, required: Iterable[str]) -> bool:
+        return not self.roles.isdisjoint(required)
+
+    def has_any_permission(self, required: Iterable[str]) -> bool:
+        return not self.permissions.isdisjoint(required)
+
+
+class PermissionCache:
+    """Process-local cache of effective permissions keyed by (tenant schema, user id).
+
+    The settings endpoints that mutate users, roles and role permissions
+    invalidate affected entries; the TTL bounds staleness for changes made by
+    other worker processes. A TTL of 0 disables caching.
+
+    Every invalidation bumps the tenant's generation. Readers take the
+    generation before loading and pass it to ``set``, so permissions loaded
+    before a revocation are never stored after it.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Tuple[str, int], Tuple[float, EffectivePermissions]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, schema_name: str) -> int:
+        return self._generations.get(schema_name, 0)
+
+    def get(self, schema_name: str, user_id: int) -> Optional[EffectivePermissions]:
+        if self.ttl_seconds <= 0:
+            return None
+        key = (schema_name, user_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, perms = entry
+        if expires_at < time.monotonic():
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            return None
+        return perms
+
+    def set(self, schema_name: str, user_id: int, perms: EffectivePermissions, generation: int) -> None:
+        """Store permissions loaded under ``generation``; dropped if the tenant was invalidated since."""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if self._generations.get(schema_name, 0) != generation:
+                return
+            self._entries[(schema_name, user_id)] = (time.monotonic() + self.ttl_seconds, perms)
+
+    def invalidate_user(self, schema_name: str, user_id: int) -> None:
+        with self._lock:
+            self._generations[schema_name] = self._generations.get(schema_name, 0) + 1
+            self._entries.pop((schema_name, user_id), None)
+
+    def invalidate_tenant(self, schema_name: str) -> None:
+        with self._lock:
+            self._generations[schema_name] = self._generations.get(schema_name, 0) + 1
+            for key in [k for k in self._entries if k[0] == schema_name]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+permission_cache = PermissionCache(ttl_seconds=settings.permission_cache_ttl_seconds)
+
+
+def load_effective_permissions(db: Session, user_id: int) -> EffectivePermissions:
+    """Fetch a user's role and permission names in a single round trip."""
+    rows = db.execute(
+        text(
+            """
+            SELECT r.name AS role_name, p.name AS permission_name
+            FROM user_roles ur
+            JOIN roles r ON r.id = ur.role_id
+            LEFT JOIN role_permissions rp ON rp.role_id = r.id
+            LEFT JOIN permissions p ON p.id = rp.permission_id
+            WHERE ur.user_id = :uid
+            """
+        ),
+        {"uid": user_id},
+    ).all()
+    return EffectivePermissions(
+        roles=frozenset(r.role_name for r in rows),
+        permissions=frozenset(r.permission_name for r in rows if r.permission_name is not None),
+    )
+
+
+def get_effective_permissions(db: Session, user_id: int) -> EffectivePermissions:
+    """Return the user's effective permissions, computed at most once per request.
+
+    Results are memoized on the tenant session (so the authorization dependency
+    and the handler share one lookup) and in the process-wide cache. Sessions
+    without a known tenant schema always query.
+    """
+    schema_name = db.info.get("tenant_schema")
+    if not schema_name:
+        return load_effective_permissions(db, user_id)
+
+    memo: Dict[int, EffectivePermissions] = db.info.setdefault("effective_permissions", {})
+    perms = memo.get(user_id)
+    if perms is not None:
+        return perms
+
+    perms = permission_cache.get(schema_name, user_id)
+    if perms is None:
+        generation = permission_cache.generation(schema_name)
+        perms = load_effective_permissions(db, user_id)
+        permission_cache.set(schema_name, user_id, perms, generation)
+    memo[user_id] = perms
+    return perms
+
+
+class RbacVersionCache:
+    """Process-local tenant slug -> ``public.tenants.rbac_version``.
+
+    Kept apart from the tenant resolution cache so a permission change made in
+    another worker process stops that process trusting old token digests within
+    PERMISSION_CACHE_TTL_SECONDS, not TENANT_CACHE_TTL_SECONDS. A TTL of 0 reads
+    the row on every request. Uses the same generation guard as PermissionCache.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, int]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, slug: str) -> Optional[int]:
+        if self.ttl_seconds <= 0:
+            return None
+        entry = self._entries.get(slug)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def generation(self, slug: str) -> int:
+        return self._generations.get(slug, 0)
+
+    def set(self, slug: str, version: int, generation: int) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if self._generations.get(slug, 0) == generation:
+                self._entries[slug] = (time.monotonic() + self.ttl_seconds, version)
+
+    def invalidate(self, slug: str) -> None:
+        with self._lock:
+            self._generations[slug] = self._generations.get(slug, 0) + 1
+            self._entries.pop(slug, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+rbac_version_cache = RbacVersionCache(ttl_seconds=settings.permission_cache_ttl_seconds)
+
+_RBAC_VERSION_SQL = "SELECT rbac_version FROM public.tenants WHERE slug = :slug"
+
+
+def current_rbac_version(slug: str, db: Optional[Session] = None) -> Optional[int]:
+    """The tenant's RBAC version, read by primary key at most once per TTL; None for unknown tenants."""
+    version = rbac_version_cache.get(slug)
+    if version is not None:
+        return version
+    generation = rbac_version_cache.generation(slug)
+    public_db = db or SessionLocal()
+    try:
+        version = public_db.execute(text(_RBAC_VERSION_SQL), {"slug": slug}).scalar()
+    finally:
+        if db is None:
+            public_db.close()
+    if version is not None:
+        rbac_version_cache.set(slug, version, generation)
+    return version
+
+
+async def current_rbac_version_async(slug: str, db: AsyncSession) -> Optional[int]:
+    version = rbac_version_cache.get(slug)
+    if version is not None:
+        return version
+    generation = rbac_version_cache.generation(slug)
+    version = (await db.execute(text(_RBAC_VERSION_SQL), {"slug": slug})).scalar()
+    if version is not None:
+        rbac_version_cache.set(slug, version, generation)
+    return version
+
+
+def bump_rbac_version(db: Session) -> None:
+    """Mark every permission digest issued for the session's tenant as stale."""
+    schema_name = db.info.get("tenant_schema")
+    if not schema_name:
+        return
+    slug = db.execute(
+        text(
+            "UPDATE public.tenants SET rbac_version = rbac_version + 1 "
+            "WHERE schema_name = :schema RETURNING slug"
+        ),
+        {"schema": schema_name},
+    ).scalar()
+    db.commit()
+    if slug:
+        tenant_cache.invalidate(slug)
+        rbac_version_cache.invalidate(slug)
+
+
+def invalidate_user_permissions(db: Session, user_id: int) -> None:
+    """Drop cached permissions for one user of the session's tenant."""
+    schema_name = db.info.get("tenant_schema")
+    db.info.get("effective_permissions", {}).pop(user_id, None)
+    if schema_name:
+        permission_cache.invalidate_user(schema_name, user_id)
+        bump_rbac_version(db)
+
+
+def invalidate_tenant_permissions(db: Session) -> None:
+    """Drop cached permissions for every user of the session's tenant."""
+    schema_name = db.info.get("tenant_schema")
+    db.info.pop("effective_permissions", None)
+    if schema_name:
+        permission_cache.invalidate_tenant(schema_name)
+        bump_rbac_version(db)
+
+
+# Bit positions for the permission bitmap signed into tokens. Only ever append.
+PERMISSION_CATALOGUE: Tuple[str, ...] = tuple(name for name, _ in DEFAULT_PERMISSIONS)
+_PERMISSION_BITS: Dict[str, int] = {name: bit for bit, name in enumerate(PERMISSION_CATALOGUE)}
+
+
+def encode_permission_bitmap(permissions: Iterable[str]) -> Optional[str]:
+    """Pack permission names into a hex bitmap, or None if any name is not catalogued."""
+    bitmap = 0
+    for name in permissions:
+        bit = _PERMISSION_BITS.get(name)
+        if bit is None:
+            return None
+        bitmap |= 1 << bit
+    return format(bitmap, "x")
+
+
+def decode_permission_bitmap(bitmap: str) -> FrozenSet[str]:
+    value = int(bitmap, 16)
+    return frozenset(name for bit, name in enumerate(PERMISSION_CATALOGUE) if value >> bit & 1)
+
+
+def build_rbac_claims(db: Session, user_id: int, rbac_version: int) -> Optional[Dict[str, Any]]:
+    """Build the ``rbac`` token claim for a user.
+
+    Returns None when the user holds a permission outside the catalogue; such
+    tokens simply carry no digest and are authorized against the database.
+    """
+    perms = get_effective_permissions(db, user_id)
+    bitmap = encode_permission_bitmap(perms.permissions)
+    if bitmap is None:
+        return None
+    return {"v": rbac_version, "r": sorted(perms.roles), "p": bitmap}
+
+
+def claims_are_current(claims: Dict[str, Any], rbac_version: Optional[int]) -> bool:
+    return rbac_version is not None and claims.get("v") == rbac_version
+
+
+def _embedded_claims(payload: Dict[str, Any], db: Any) -> Optional[Dict[str, Any]]:
+    """The token's ``rbac`` claim if embedding is on and it was issued for the session's tenant."""
+    claims = payload.get("rbac")
+    if not settings.jwt_embed_permissions or not claims:
+        return None
+    tenant = tenant_cache.get(payload.get("tenant") or "")
+    if tenant is None or tenant.schema_name != db.info.get("tenant_schema"):
+        return None
+    return claims
+
+
+def _decode_claims(claims: Dict[str, Any]) -> Optional[EffectivePermissions]:
+    try:
+        return EffectivePermissions(roles=frozenset(claims["r"]), permissions=decode_permission_bitmap(claims["p"]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def permissions_from_claims(payload: Dict[str, Any], db: Session) -> Optional[EffectivePermissions]:
+    """Return the permissions embedded in a token if they can be trusted for ``db``.
+
+    The token's tenant must be the one the session is bound to and its RBAC
+    version must match public.tenants.rbac_version as read through
+    rbac_version_cache. Anything else returns None so the caller falls back to
+    the database.
+    """
+    claims = _embedded_claims(payload, db)
+    if claims is None or not claims_are_current(claims, current_rbac_version(payload["tenant"], db)):
+        return None
+    return _decode_claims(claims)
+
+
+async def permissions_from_claims_async(payload: Dict[str, Any], db: AsyncSession) -> Optional[EffectivePermissions]:
+    claims = _embedded_claims(payload, db)
+    if claims is None or not claims_are_current(claims, await current_rbac_version_async(payload["tenant"], db)):
+        return None
+    return _decode_claims(claims)
+
+
+def get_request_permissions(db: Session, user_id: int, payload: Dict[str, Any]) -> EffectivePermissions:
+    """Authorize from the token digest when possible, otherwise from the database."""
+    perms = permissions_from_claims(payload, db)
+    if perms is not None:
+        return perms
+    return get_effective_permissions(db, user_id)
+
+
+async def get_effective_permissions_async(db: AsyncSession, user_id: int) -> EffectivePermissions:
+    """Async counterpart of get_effective_permissions sharing the same caches."""
+    memo = db.info.get("effective_permissions")
+    if memo and user_id in memo:
+        return memo[user_id]
+    return await db.run_sync(get_effective_permissions, user_id)
+
+
+async def get_request_permissions_async(db: AsyncSession, user_id: int, payload: Dict[str, Any]) -> EffectivePermissions:
+    perms = await permissions_from_claims_async(payload, db)
+    if perms is not None:
+        return perms
+    return await get_effective_permissions_async(db, user_id)
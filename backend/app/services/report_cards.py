@@ -0,0 +1,201 @@
+"""Report cards computed a whole class at a time.
+
+One query reads every finalized record for a class (or the whole school) and
+term; cards and averages for all students come out of that single pass. Class
+positions are not recomputed here: they are read from term_results, which
+refresh_term_results ranks when results are finalized. Results are cached per
+(tenant, class, year, term) until a grade or student write invalidates the
+tenant.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+ClassCards = Dict[int, Dict[str, Any]]
+_Key = Tuple[str, Optional[str], str, str]
+
+REPORT_CARD_SQL = """
+    SELECT s.id AS student_id, s.first_name, s.last_name, s.admission_no, s.class_name,
+           COALESCE(sub.name, 'Unknown Subject') AS subject_name,
+           ar.ca_score, ar.exam_score, ar.overall_score, ar.grade, ar.grade_points, ar.is_finalized,
+           tr.class_position, tr.class_size
+    FROM academic_records ar
+    JOIN students s ON s.id = ar.student_id
+    LEFT JOIN subjects sub ON sub.id = ar.subject_id
+    LEFT JOIN term_results tr
+      ON tr.student_id = ar.student_id AND tr.academic_year = ar.academic_year AND tr.term = ar.term
+    WHERE ar.academic_year = :year AND ar.term = :term AND ar.is_finalized = true
+      {class_filter}
+    ORDER BY s.class_name, s.id, ar.subject_id
+"""
+
+
+def build_class_cards(rows: Iterable[Any], academic_year: str, term: str) -> Dict[Optional[str], ClassCards]:
+    """Group record rows into cards per class.
+
+    Positions come from the term_results columns on each row; a student with
+    no stored result (e.g. without a class) has no position.
+    """
+    classes: Dict[Optional[str], ClassCards] = {}
+    for r in rows:
+        cards = classes.setdefault(r.class_name, {})
+        card = cards.get(r.student_id)
+        if card is None:
+            card = cards[r.student_id] = {
+                "student_id": r.student_id,
+                "first_name": r.first_name,
+                "last_name": r.last_name,
+                "admission_no": r.admission_no,
+                "class_name": r.class_name or "Not Assigned",
+                "academic_year": academic_year,
+                "term": term,
+                "subjects": [],
+            }
+            if r.class_position is not None:
+                card["class_position"] = r.class_position
+                card["total_students_in_class"] = r.class_size
+        card["subjects"].append({
+            "subject_name": r.subject_name,
+            "ca_score": float(r.ca_score or 0),
+            "exam_score": float(r.exam_score or 0),
+            "overall_score": float(r.overall_score or 0),
+            "grade": r.grade,
+            "grade_points": float(r.grade_points or 0),
+            "is_finalized": bool(r.is_finalized),
+        })
+
+    for cards in classes.values():
+        for card in cards.values():
+            subjects = card["subjects"]
+            total_subjects = len(subjects)
+            total_points = sum(s["grade_points"] for s in subjects)
+            gpa = total_points / total_subjects if total_subjects else 0.0
+            average = sum(s["overall_score"] for s in subjects) / total_subjects if total_subjects else 0.0
+            card.update(
+                total_subjects=total_subjects,
+                total_points=total_points,
+                gpa=round(gpa, 2),
+                overall_gpa=round(gpa, 2),  # Same as gpa for frontend compatibility
+                term_average=round(average, 1),
+                attendance_percentage=85.0,  # Placeholder - would come from attendance system
+            )
+    return classes
+
+
+class ReportCardCache:
+    """Process-local class report cards keyed by (tenant schema, class, year, term).
+
+    Grade, finalization and student writes invalidate the whole tenant; the
+    TTL bounds staleness for writes made by other worker processes. A TTL of 0
+    disables caching.
+
+    Each invalidation bumps the tenant's generation. Readers take the
+    generation before loading and pass it to ``set``, so cards loaded before an
+    invalidation are not stored after it.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[_Key, Tuple[float, ClassCards]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, schema_name: str) -> int:
+        return self._generations.get(schema_name, 0)
+
+    def get(self, key: _Key) -> Optional[ClassCards]:
+        if self.ttl_seconds <= 0:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, cards = entry
+        if expires_at < time.monotonic():
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            return None
+        return cards
+
+    def set(self, key: _Key, cards: ClassCards, generation: int) -> None:
+        """Store cards loaded under ``generation``; dropped if the tenant was invalidated since."""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if self._generations.get(key[0], 0) != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, cards)
+
+    def invalidate_tenant(self, schema_name: str) -> None:
+        with self._lock:
+            self._generations[schema_name] = self._generations.get(schema_name, 0) + 1
+            for key in [k for k in self._entries if k[0] == schema_name]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+report_card_cache = ReportCardCache(ttl_seconds=settings.report_card_cache_ttl_seconds)
+
+# Concurrent requests for the same uncached class wait for one computation
+_inflight: Dict[_Key, asyncio.Lock] = {}
+
+
+async def _load(
+    db: AsyncSession, academic_year: str, term: str, whole_school: bool, class_name: Optional[str] = None
+) -> Dict[Optional[str], ClassCards]:
+    class_filter = "" if whole_school else "AND s.class_name IS NOT DISTINCT FROM :class_name"
+    params = {"year": academic_year, "term": term}
+    if not whole_school:
+        params["class_name"] = class_name
+    rows = (await db.execute(text(REPORT_CARD_SQL.format(class_filter=class_filter)), params)).all()
+    return build_class_cards(rows, academic_year, term)
+
+
+async def get_class_report_cards(db: AsyncSession, class_name: Optional[str], academic_year: str, term: str) -> ClassCards:
+    """Every card for one class and term, keyed by student id."""
+    schema_name = db.info.get("tenant_schema")
+    if not schema_name:
+        return (await _load(db, academic_year, term, False, class_name)).get(class_name, {})
+    key = (schema_name, class_name, academic_year, term)
+    cards = report_card_cache.get(key)
+    if cards is not None:
+        return cards
+    lock = _inflight.setdefault(key, asyncio.Lock())
+    try:
+        async with lock:
+            cards = report_card_cache.get(key)
+            if cards is None:
+                generation = report_card_cache.generation(schema_name)
+                cards = (await _load(db, academic_year, term, False, class_name)).get(class_name, {})
+                report_card_cache.set(key, cards, generation)
+    finally:
+        _inflight.pop(key, None)
+    return cards
+
+
+async def get_school_report_cards(db: AsyncSession, academic_year: str, term: str) -> Dict[Optional[str], ClassCards]:
+    """Every class's cards in one query; also warms the per-class cache."""
+    schema_name = db.info.get("tenant_schema")
+    generation = report_card_cache.generation(schema_name) if schema_name else 0
+    classes = await _load(db, academic_year, term, True)
+    if schema_name:
+        for class_name, cards in classes.items():
+            report_card_cache.set((schema_name, class_name, academic_year, term), cards, generation)
+    return classes
+
+
+def invalidate_report_cards(db: Session) -> None:
+    """Drop the tenant's cached cards after grades or students changed."""
+    schema_name = db.info.get("tenant_schema")
+    if schema_name:
+        report_card_cache.invalidate_tenant(schema_name)
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
 
 from jose import jwt
 from passlib.context import CryptContext
@@ -7,12 +8,24 @@ from passlib.context import CryptContext
 from app.core.config import settings
 
 
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=None)
+def build_password_context(rounds: int) -> CryptContext:
+    """bcrypt context hashing at ``rounds``; hashes made with other rounds need an update."""
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
 
 
-def hash_password(password: str) -> str:
+password_context = build_password_context(settings.bcrypt_rounds)
+
+
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
     """Hash a plaintext password using bcrypt."""
-    return password_context.hash(password)
+    return build_password_context(rounds or settings.bcrypt_rounds).hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -20,6 +33,13 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return password_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(
+    plain_password: str, hashed_password: str, rounds: Optional[int] = None
+) -> Tuple[bool, Optional[str]]:
+    """Verify a password; on success also return a fresh hash if the stored one uses outdated parameters."""
+    return build_password_context(rounds or settings.bcrypt_rounds).verify_and_update(plain_password, hashed_password)
+
+
 def create_access_token(
     *,
     subject: str,
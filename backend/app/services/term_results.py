@@ -0,0 +1,84 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+def refresh_term_results(db: Session, academic_year: str, term: str, class_names: Sequence[str]) -> int:
+    """Rebuild term_results for whole classes from their finalized records; returns rows written.
+
+    Positions rank each class by average score, highest first, ties broken by
+    student id (the same order the report cards use). Students without a class
+    are not ranked. Does not commit.
+    """
+    classes = sorted({c for c in class_names if c})
+    if not classes:
+        return 0
+    params = {"year": academic_year, "term": term, "classes": classes}
+    # Students who left the class or lost their finalized grades drop out of the ranking
+    db.execute(text("""
+        DELETE FROM term_results
+        WHERE academic_year = :year AND term = :term AND class_name = ANY(:classes)
+    """), params)
+    return db.execute(text("""
+        WITH totals AS (
+            SELECT ar.student_id, s.class_name,
+                   count(*) AS total_subjects,
+                   SUM(COALESCE(ar.grade_points, 0)) AS total_points,
+                   AVG(COALESCE(ar.overall_score, 0)) AS average_score
+            FROM academic_records ar
+            JOIN students s ON s.id = ar.student_id
+            WHERE ar.academic_year = :year AND ar.term = :term AND ar.is_finalized = true
+              AND s.class_name = ANY(:classes)
+            GROUP BY ar.student_id, s.class_name
+        )
+        INSERT INTO term_results(
+            student_id, academic_year, term, class_name, total_subjects, total_points,
+            gpa, average_score, class_position, class_size, computed_at
+        )
+        SELECT student_id, :year, :term, class_name, total_subjects, total_points,
+               ROUND(total_points / total_subjects, 2), ROUND(average_score, 2),
+               ROW_NUMBER() OVER (PARTITION BY class_name ORDER BY average_score DESC, student_id),
+               COUNT(*) OVER (PARTITION BY class_name),
+               CURRENT_TIMESTAMP
+        FROM totals
+        ON CONFLICT (student_id, academic_year, term) DO UPDATE SET
+            class_name = EXCLUDED.class_name,
+            total_subjects = EXCLUDED.total_subjects,
+            total_points = EXCLUDED.total_points,
+            gpa = EXCLUDED.gpa,
+            average_score = EXCLUDED.average_score,
+            class_position = EXCLUDED.class_position,
+            class_size = EXCLUDED.class_size,
+            computed_at = EXCLUDED.computed_at
+    """), params).rowcount
+
+
+def classes_of_students(db: Session, student_ids: Sequence[int]) -> List[str]:
+    """Distinct classes the given students belong to."""
+    if not student_ids:
+        return []
+    return db.execute(text("""
+        SELECT DISTINCT class_name FROM students
+        WHERE id = ANY(:ids) AND class_name IS NOT NULL
+    """), {"ids": list(student_ids)}).scalars().all()
+
+
+def get_term_results(
+    db: Session, academic_year: str, term: str, class_name: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Stored aggregates for a term, in class and position order."""
+    query = """
+        SELECT tr.student_id, s.first_name, s.last_name, s.admission_no, tr.class_name,
+               tr.total_subjects, tr.total_points, tr.gpa, tr.average_score,
+               tr.class_position, tr.class_size, tr.computed_at
+        FROM term_results tr
+        JOIN students s ON s.id = tr.student_id
+        WHERE tr.academic_year = :year AND tr.term = :term
+    """
+    params: Dict[str, Any] = {"year": academic_year, "term": term}
+    if class_name:
+        query += " AND tr.class_name = :class_name"
+        params["class_name"] = class_name
+    query += " ORDER BY tr.class_name, tr.class_position"
+    return [dict(r) for r in db.execute(text(query), params).mappings().all()]
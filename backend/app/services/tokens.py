@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from jose import jwt
+
+from app.core.config import settings
+
+
+class DecodedTokenCache:
+    """Bounded LRU of verified JWT payloads keyed by the raw token string.
+
+    An entry lives no longer than the token's own ``exp`` claim, so an expired
+    token is always handed back to python-jose (and rejected) rather than served
+    from memory. Payloads are shared between requests and must not be mutated.
+    A max size of 0 disables caching.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return payload
+
+    def set(self, token: str, payload: Dict[str, Any]) -> None:
+        if self.max_size <= 0 or "exp" not in payload:
+            return
+        with self._lock:
+            self._entries[token] = (float(payload["exp"]), payload)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+decoded_token_cache = DecodedTokenCache(max_size=settings.jwt_decode_cache_size)
+
+
+def decode_access_token(token: str) -> Dict[str, Any]:
+    """Verify and decode a token, reusing the payload of a recently seen token.
+
+    Raises ``jose.JWTError`` for invalid or expired tokens, like ``jwt.decode``.
+    """
+    payload = decoded_token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+        decoded_token_cache.set(token, payload)
+    return payload
+
+
+class RefreshPolicy:
+    """Decides when an authenticated request should receive a re-signed token.
+
+    A token is refreshed once its age reaches ``threshold_percent`` of the idle
+    window; younger tokens are returned to the client unchanged, saving an HMAC
+    encode per request. A threshold of 0 refreshes on every request.
+    """
+
+    def __init__(self, idle_timeout_seconds: int, threshold_percent: int):
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.refresh_after_seconds = idle_timeout_seconds * max(0, min(threshold_percent, 100)) / 100
+
+    def is_idle_expired(self, issued_at: int, now: float) -> bool:
+        return now - issued_at > self.idle_timeout_seconds
+
+    def should_refresh(self, issued_at: int, now: float) -> bool:
+        return now - issued_at >= self.refresh_after_seconds
+
+
+refresh_policy = RefreshPolicy(
+    idle_timeout_seconds=settings.session_idle_timeout_minutes * 60,
+    threshold_percent=settings.token_refresh_threshold_percent,
+)
@@ -0,0 +1,71 @@
+"""public.user_directory: email -> (tenant, user id) across every tenant schema.
+
+Tenant user tables stay the source of truth. The endpoints that create,
+rename or delete users update the directory in the same transaction, and the
+tenant migration and reseed paths rebuild a tenant's entries wholesale.
+"""
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+@dataclass(frozen=True)
+class DirectoryEntry:
+    slug: str
+    schema_name: str
+    user_id: int
+
+
+def _schema(db: Session, schema_name: Optional[str]) -> str:
+    schema_name = schema_name or db.info.get("tenant_schema")
+    if not schema_name:
+        raise ValueError("Tenant schema unknown; pass schema_name")
+    return schema_name
+
+
+def register_user(db: Session, user_id: int, email: str, schema_name: Optional[str] = None) -> None:
+    """Add or re-point a user's directory entry. Does not commit."""
+    db.execute(text("""
+        INSERT INTO public.user_directory(tenant_id, user_id, email)
+        SELECT t.id, :user_id, :email FROM public.tenants t WHERE t.schema_name = :schema
+        ON CONFLICT (tenant_id, user_id) DO UPDATE SET email = EXCLUDED.email
+    """), {"user_id": user_id, "email": email.strip().lower(), "schema": _schema(db, schema_name)})
+
+
+def unregister_user(db: Session, user_id: int, schema_name: Optional[str] = None) -> None:
+    """Drop a deleted user's entry. Does not commit."""
+    db.execute(text("""
+        DELETE FROM public.user_directory d
+        USING public.tenants t
+        WHERE d.tenant_id = t.id AND t.schema_name = :schema AND d.user_id = :user_id
+    """), {"user_id": user_id, "schema": _schema(db, schema_name)})
+
+
+def sync_tenant_directory(db: Session, schema_name: str) -> int:
+    """Rebuild a tenant's entries from its users table; returns the number of users. Does not commit."""
+    params = {"schema": schema_name}
+    db.execute(text("""
+        DELETE FROM public.user_directory d
+        USING public.tenants t
+        WHERE d.tenant_id = t.id AND t.schema_name = :schema
+    """), params)
+    return db.execute(text(f"""
+        INSERT INTO public.user_directory(tenant_id, user_id, email)
+        SELECT t.id, u.id, lower(u.email)
+        FROM "{schema_name}".users u
+        JOIN public.tenants t ON t.schema_name = :schema
+    """), params).rowcount
+
+
+def find_user(db: Session, email: str) -> List[DirectoryEntry]:
+    """Every tenant account registered under an email, oldest tenant first."""
+    rows = db.execute(text("""
+        SELECT t.slug, t.schema_name, d.user_id
+        FROM public.user_directory d
+        JOIN public.tenants t ON t.id = d.tenant_id
+        WHERE d.email = :email
+        ORDER BY t.id
+    """), {"email": email.strip().lower()}).all()
+    return [DirectoryEntry(r.slug, r.schema_name, r.user_id) for r in rows]
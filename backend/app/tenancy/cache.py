@@ -0,0 +1,75 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.tenancy.service import TenantService
+
+
+@dataclass(frozen=True)
+class CachedTenant:
+    slug: str
+    schema_name: str
+    rbac_version: int = 0
+
+
+class TenantResolutionCache:
+    """Process-local slug -> tenant cache with a TTL and explicit invalidation.
+
+    Entries are dropped by the tenant management endpoints whenever a tenant is
+    created, updated, deleted or reset; the TTL bounds staleness for changes made
+    by other worker processes. A TTL of 0 disables caching.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[float, CachedTenant]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, slug: str) -> Optional[CachedTenant]:
+        if self.ttl_seconds <= 0:
+            return None
+        entry = self._entries.get(slug)
+        if entry is None:
+            return None
+        expires_at, tenant = entry
+        if expires_at < time.monotonic():
+            with self._lock:
+                # Only drop the entry if nobody refreshed it in the meantime
+                if self._entries.get(slug) is entry:
+                    del self._entries[slug]
+            return None
+        return tenant
+
+    def set(self, tenant: CachedTenant) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[tenant.slug] = (time.monotonic() + self.ttl_seconds, tenant)
+
+    def invalidate(self, slug: str) -> None:
+        with self._lock:
+            self._entries.pop(slug, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+tenant_cache = TenantResolutionCache(ttl_seconds=settings.tenant_cache_ttl_seconds)
+
+
+def resolve_tenant(db: Session, slug: str) -> Optional[CachedTenant]:
+    """Resolve a tenant slug, only querying the public schema on a cache miss."""
+    cached = tenant_cache.get(slug)
+    if cached is not None:
+        return cached
+    tenant = TenantService(db).get_by_slug(slug)
+    if not tenant:
+        return None
+    resolved = CachedTenant(slug=tenant.slug, schema_name=tenant.schema_name, rbac_version=tenant.rbac_version or 0)
+    tenant_cache.set(resolved)
+    return resolved
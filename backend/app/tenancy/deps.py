@@ -1,8 +1,11 @@
+from typing import AsyncGenerator
+
 from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.session import get_public_session, get_tenant_session
-from app.tenancy.service import TenantService
+from app.db.session import get_async_tenant_session, get_public_session, get_tenant_session
+from app.tenancy.cache import resolve_tenant
 
 
 def get_tenant_slug(x_tenant: str | None = Header(default=None, alias="X-Tenant")) -> str:
@@ -15,7 +18,8 @@ def get_tenant_schema(
     slug: str = Depends(get_tenant_slug),
     db: Session = Depends(get_public_session),
 ) -> str:
-    tenant = TenantService(db).get_by_slug(slug)
+    # The public session only checks out a connection on a cache miss
+    tenant = resolve_tenant(db, slug)
     if not tenant:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tenant not found")
     return tenant.schema_name
@@ -25,4 +29,6 @@ def get_tenant_db(schema_name: str = Depends(get_tenant_schema)):
     yield from get_tenant_session(schema_name)
 
 
-
+async def get_async_tenant_db(schema_name: str = Depends(get_tenant_schema)) -> AsyncGenerator[AsyncSession, None]:
+    async for session in get_async_tenant_session(schema_name):
+        yield session
@@ -0,0 +1,98 @@
+"""Email domain -> tenant resolution for logins that carry no tenant header.
+
+The whole public.tenant_domains table is small, so every worker process keeps
+it in memory: resolving a login is a few dict lookups. The tenant management
+endpoints reload the index after changing domains or tenants; the TTL bounds
+staleness for changes made by other worker processes.
+"""
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+
+_DOMAIN_RE = re.compile(r"^(?=.{3,255}$)([a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z0-9-]{2,}$")
+
+
+@dataclass(frozen=True)
+class DomainTarget:
+    slug: str
+    schema_name: str
+
+
+def normalize_domain(domain: str) -> Optional[str]:
+    """Lower-cased domain without surrounding dots, or None if it is not a valid domain."""
+    domain = domain.strip().strip(".").lower()
+    return domain if _DOMAIN_RE.match(domain) else None
+
+
+class TenantDomainIndex:
+    """In-memory domain -> tenant map, plus tenant slugs for partial matches.
+
+    An email domain resolves by its longest registered suffix, so registering
+    ``school.edu`` also covers ``teacher.school.edu``. Domains nobody
+    registered fall back to the first tenant (by id) whose slug contains one
+    of the domain's words.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._domains: Dict[str, DomainTarget] = {}
+        self._tenants: List[DomainTarget] = []
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self, db: Session) -> int:
+        """Replace the index with the current table contents; returns the number of domains."""
+        domains = db.execute(text("""
+            SELECT d.domain, t.slug, t.schema_name
+            FROM public.tenant_domains d
+            JOIN public.tenants t ON t.id = d.tenant_id
+        """)).all()
+        tenants = db.execute(text("SELECT slug, schema_name FROM public.tenants ORDER BY id")).all()
+        with self._lock:
+            self._domains = {r.domain: DomainTarget(r.slug, r.schema_name) for r in domains}
+            self._tenants = [DomainTarget(r.slug, r.schema_name) for r in tenants]
+            self._expires_at = time.monotonic() + self.ttl_seconds
+        return len(self._domains)
+
+    def is_stale(self) -> bool:
+        return self.ttl_seconds <= 0 or self._expires_at < time.monotonic()
+
+    def lookup(self, email_domain: str) -> Optional[DomainTarget]:
+        domain = email_domain.strip().strip(".").lower()
+        labels = domain.split(".")
+        for i in range(len(labels) - 1):
+            target = self._domains.get(".".join(labels[i:]))
+            if target is not None:
+                return target
+        for part in domain.replace(".edu", "").replace(".", "-").split("-"):
+            if len(part) > 2:  # Ignore very short parts
+                for tenant in self._tenants:
+                    if part in tenant.slug.lower():
+                        return tenant
+        return None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._expires_at = 0.0
+
+
+tenant_domain_index = TenantDomainIndex(ttl_seconds=settings.tenant_cache_ttl_seconds)
+
+
+def resolve_email_domain(email_domain: str) -> Optional[DomainTarget]:
+    """Tenant for an email domain, reloading the index first if it is stale."""
+    if tenant_domain_index.is_stale():
+        db = SessionLocal()
+        try:
+            tenant_domain_index.load(db)
+        finally:
+            db.close()
+    return tenant_domain_index.lookup(email_domain)
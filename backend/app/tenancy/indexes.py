@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """A secondary index every tenant schema should carry."""
+
+    name: str
+    table: str
+    definition: str  # everything after "ON <table>", e.g. "(class_id, date)"
+
+    def create_sql(self, schema_name: str) -> str:
+        return f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON "{schema_name}".{self.table} {self.definition}'
+
+    def drop_sql(self, schema_name: str) -> str:
+        return f'DROP INDEX CONCURRENTLY IF EXISTS "{schema_name}".{self.name}'
+
+
+# Declared secondary indexes, applied after the base DDL and column migrations.
+# Add new entries here rather than to TENANT_BASE_SCHEMA_SQL so existing
+# tenants pick them up without blocking writes.
+TENANT_INDEXES: List[IndexSpec] = [
+    IndexSpec("ix_students_class_name", "students", "(class_name)"),
+    IndexSpec("ix_attendance_class_date", "attendance", "(class_id, date)"),
+    IndexSpec("ix_academic_records_class_term_year", "academic_records", "(class_id, term, academic_year)"),
+    IndexSpec("ix_academic_records_finalized", "academic_records", "(is_finalized)"),
+    IndexSpec("ix_parent_students_student", "parent_students", "(student_id)"),
+    IndexSpec("ix_invoices_student", "invoices", "(student_id)"),
+    IndexSpec("ix_payments_invoice", "payments", "(invoice_id)"),
+    IndexSpec("ix_announcements_published", "announcements", "(is_published, published_at DESC)"),
+    # Student search: trigram GIN indexes serve substring and fuzzy matches,
+    # text_pattern_ops btrees serve short prefix lookups
+    IndexSpec("ix_students_full_name_trgm", "students", "USING gin (lower(first_name || ' ' || last_name) gin_trgm_ops)"),
+    IndexSpec("ix_students_admission_no_trgm", "students", "USING gin (lower(admission_no) gin_trgm_ops)"),
+    IndexSpec("ix_students_student_number_trgm", "students", "USING gin (lower(COALESCE(student_number, '')) gin_trgm_ops)"),
+    IndexSpec("ix_students_first_name_prefix", "students", "(lower(first_name) text_pattern_ops)"),
+    IndexSpec("ix_students_last_name_prefix", "students", "(lower(last_name) text_pattern_ops)"),
+    IndexSpec("ix_students_admission_no_prefix", "students", "(lower(admission_no) text_pattern_ops)"),
+]
+
+# Tables with at least this many live rows are flagged when they are mostly seq-scanned
+SEQ_SCAN_MIN_ROWS = 1000
+
+
+def _index_states(conn: Connection, schema_name: str) -> Dict[str, bool]:
+    """Map index name -> is valid for every index in the schema."""
+    rows = conn.execute(
+        text(
+            """
+            SELECT c.relname AS name, i.indisvalid AS valid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = :schema
+            """
+        ),
+        {"schema": schema_name},
+    ).all()
+    return {r.name: r.valid for r in rows}
+
+
+def apply_tenant_indexes(bind: Engine, schema_name: str) -> Dict[str, List[str]]:
+    """Create any declared index the schema is missing, without locking out writes.
+
+    Runs on an autocommit connection because CREATE INDEX CONCURRENTLY cannot run
+    inside a transaction. An index left INVALID by an interrupted build is
+    dropped and rebuilt. Returns the names created and rebuilt.
+    """
+    created: List[str] = []
+    rebuilt: List[str] = []
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        states = _index_states(conn, schema_name)
+        for spec in TENANT_INDEXES:
+            valid = states.get(spec.name)
+            if valid:
+                continue
+            if valid is False:
+                conn.execute(text(spec.drop_sql(schema_name)))
+                rebuilt.append(spec.name)
+            else:
+                created.append(spec.name)
+            conn.execute(text(spec.create_sql(schema_name)))
+    return {"created": created, "rebuilt": rebuilt}
+
+
+def index_report(conn: Connection, schema_name: str) -> Dict[str, Any]:
+    """Declared indexes that are missing or invalid, plus usage hints from pg_stat.
+
+    Unused indexes have never been scanned since statistics were last reset;
+    unique and primary key indexes are excluded since they enforce constraints.
+    """
+    states = _index_states(conn, schema_name)
+    missing = [s.name for s in TENANT_INDEXES if s.name not in states]
+    invalid = [s.name for s in TENANT_INDEXES if states.get(s.name) is False]
+
+    unused = conn.execute(
+        text(
+            """
+            SELECT s.relname AS table_name, s.indexrelname AS index_name,
+                   pg_relation_size(s.indexrelid) AS size_bytes
+            FROM pg_stat_user_indexes s
+            JOIN pg_index i ON i.indexrelid = s.indexrelid
+            WHERE s.schemaname = :schema AND s.idx_scan = 0
+              AND NOT i.indisunique AND NOT i.indisprimary
+            ORDER BY pg_relation_size(s.indexrelid) DESC
+            """
+        ),
+        {"schema": schema_name},
+    ).mappings().all()
+
+    seq_scanned = conn.execute(
+        text(
+            """
+            SELECT relname AS table_name, seq_scan, COALESCE(idx_scan, 0) AS idx_scan,
+                   n_live_tup AS live_rows
+            FROM pg_stat_user_tables
+            WHERE schemaname = :schema AND n_live_tup >= :min_rows
+              AND seq_scan > COALESCE(idx_scan, 0)
+            ORDER BY seq_scan DESC
+            """
+        ),
+        {"schema": schema_name, "min_rows": SEQ_SCAN_MIN_ROWS},
+    ).mappings().all()
+
+    return {
+        "schema": schema_name,
+        "missing": missing,
+        "invalid": invalid,
+        "unused": [dict(r) for r in unused],
+        "seq_scan_heavy_tables": [dict(r) for r in seq_scanned],
+    }
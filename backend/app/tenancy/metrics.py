@@ -0,0 +1,182 @@
+"""Per-tenant dashboard counts kept in public.tenant_metrics.
+
+A background refresher recounts only the tenants whose counted tables have
+seen inserts, updates or deletes since their row was computed, judged by the
+pg_stat_user_tables counters. Dashboards read one row per tenant instead of
+counting every table on each page load, and may lag writes by up to one
+refresh interval; ``refreshed_at`` says how fresh each row is.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.tenancy.stats import BALANCE_TABLES, TENANT_STATS, outstanding_balances, tenant_counts
+
+METRIC_COUNTS = [
+    "users", "active_users", "roles", "permissions", "students",
+    "teachers", "classes", "subjects", "invoices", "payments",
+]
+METRIC_COLUMNS = METRIC_COUNTS + ["outstanding_balance"]
+# Writes to anything else (attendance, grades, audit logs...) cannot change a metric
+METRIC_TABLES = sorted({TENANT_STATS[stat][0] for stat in METRIC_COUNTS} | set(BALANCE_TABLES))
+
+
+def change_markers(db: Session, schemas: Sequence[str]) -> Dict[str, int]:
+    """Rows written to the metric tables per schema since statistics were last reset."""
+    rows = db.execute(
+        text(
+            """
+            SELECT schemaname AS schema_name, SUM(n_tup_ins + n_tup_upd + n_tup_del) AS writes
+            FROM pg_stat_user_tables
+            WHERE schemaname = ANY(:schemas) AND relname = ANY(:tables)
+            GROUP BY schemaname
+            """
+        ),
+        {"schemas": list(schemas), "tables": METRIC_TABLES},
+    ).all()
+    return {r.schema_name: int(r.writes) for r in rows}
+
+
+def refresh_tenant_metrics(db: Session, tenant_ids: Optional[Sequence[int]] = None, force: bool = False) -> List[str]:
+    """Recount tenants whose data changed (all of them when forced). Returns the schemas refreshed."""
+    query = """
+        SELECT t.id, t.schema_name, m.change_marker
+        FROM public.tenants t
+        LEFT JOIN public.tenant_metrics m ON m.tenant_id = t.id
+    """
+    params: Dict[str, Any] = {}
+    if tenant_ids is not None:
+        query += " WHERE t.id = ANY(:ids)"
+        params["ids"] = list(tenant_ids)
+    tenants = db.execute(text(query), params).mappings().all()
+    if not tenants:
+        return []
+
+    # Read the markers before counting, so a write that lands mid-count triggers another pass
+    markers = change_markers(db, [t["schema_name"] for t in tenants])
+    stale = [
+        t for t in tenants
+        if force or t["change_marker"] is None or t["change_marker"] != markers.get(t["schema_name"], 0)
+    ]
+    if not stale:
+        return []
+
+    schemas = [t["schema_name"] for t in stale]
+    counts = tenant_counts(db, schemas, METRIC_COUNTS, mode="exact")
+    balances = outstanding_balances(db, schemas)
+    columns = ", ".join(METRIC_COLUMNS)
+    db.execute(
+        text(
+            f"""
+            INSERT INTO public.tenant_metrics(tenant_id, {columns}, change_marker, refreshed_at)
+            VALUES (:tenant_id, {", ".join(":" + c for c in METRIC_COLUMNS)}, :change_marker, now())
+            ON CONFLICT (tenant_id) DO UPDATE SET
+                {", ".join(f"{c} = EXCLUDED.{c}" for c in METRIC_COLUMNS)},
+                change_marker = EXCLUDED.change_marker,
+                refreshed_at = EXCLUDED.refreshed_at
+            """
+        ),
+        [
+            {
+                "tenant_id": t["id"],
+                **counts[t["schema_name"]],
+                "outstanding_balance": balances[t["schema_name"]],
+                "change_marker": markers.get(t["schema_name"], 0),
+            }
+            for t in stale
+        ],
+    )
+    db.commit()
+    return schemas
+
+
+def read_tenant_metrics(db: Session, tenant_ids: Optional[Sequence[int]] = None) -> Dict[str, Dict[str, Any]]:
+    """Stored metrics keyed by schema name; tenants without a row yet are counted now."""
+    query = f"""
+        SELECT t.id, t.schema_name, {", ".join("m." + c for c in METRIC_COLUMNS)}, m.refreshed_at
+        FROM public.tenants t
+        LEFT JOIN public.tenant_metrics m ON m.tenant_id = t.id
+    """
+    params: Dict[str, Any] = {}
+    if tenant_ids is not None:
+        query += " WHERE t.id = ANY(:ids)"
+        params["ids"] = list(tenant_ids)
+    rows = db.execute(text(query), params).mappings().all()
+
+    missing = [r["id"] for r in rows if r["refreshed_at"] is None]
+    if missing:
+        refresh_tenant_metrics(db, tenant_ids=missing, force=True)
+        return read_tenant_metrics(db, tenant_ids)
+
+    return {
+        r["schema_name"]: {
+            **{c: r[c] for c in METRIC_COUNTS},
+            "outstanding_balance": float(r["outstanding_balance"]),
+            "refreshed_at": r["refreshed_at"].isoformat(),
+        }
+        for r in rows
+    }
+
+
+def dashboard_counts(db: Session, schemas: Sequence[str], stats: Sequence[str], mode: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Counts for the dashboards: the stored metrics ("stored") or a live "exact"/"estimate" count."""
+    mode = mode or settings.tenant_stats_mode
+    if mode != "stored":
+        return tenant_counts(db, schemas, stats, mode)
+    stored = read_tenant_metrics(db)
+    result: Dict[str, Dict[str, Any]] = {}
+    for schema in schemas:
+        row = stored.get(schema, {})
+        result[schema] = {stat: row.get(stat, 0) for stat in stats}
+        result[schema]["refreshed_at"] = row.get("refreshed_at")
+    return result
+
+
+class TenantMetricsRefresher:
+    """Daemon thread that refreshes changed tenants every ``interval_seconds``.
+
+    Every worker process runs one; an advisory lock makes all but one skip each round.
+    """
+
+    def __init__(self, interval_seconds: int):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tenant-metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            self.refresh_once()
+
+    def refresh_once(self) -> List[str]:
+        db = SessionLocal()
+        try:
+            locked = db.execute(text("SELECT pg_try_advisory_xact_lock(hashtext('tenant_metrics_refresh'))")).scalar()
+            if not locked:
+                return []
+            return refresh_tenant_metrics(db)
+        except Exception as e:
+            db.rollback()
+            print(f"Tenant metrics refresh failed: {e}")
+            return []
+        finally:
+            db.close()
+
+
+metrics_refresher = TenantMetricsRefresher(settings.tenant_metrics_refresh_seconds)
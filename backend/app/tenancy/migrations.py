@@ -0,0 +1,201 @@
+"""Versioned tenant schema migrations.
+
+Every tenant schema records the steps it has applied in its own
+``schema_migrations`` table, and ``public.tenants.schema_version`` mirrors the
+highest one so startup can find out-of-date tenants with a single query. Steps
+must be idempotent: a tenant created before this runner existed replays them
+once and is then recorded as current.
+
+Append new steps to MIGRATIONS with the next version number; never renumber or
+edit a released step. A change to TENANT_INDEXES needs a new step that calls
+apply_tenant_indexes so existing tenants build the new index.
+
+Run from the backend directory:
+
+    python -m app.tenancy.migrations [--tenant SCHEMA] [--all] [--reseed] [--workers N]
+"""
+import argparse
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Generator, Iterable, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import engine
+from app.models.public import UserDirectoryEntry
+from app.services.audit import create_audit_log_table
+from app.services.user_directory import sync_tenant_directory
+from app.tenancy.indexes import apply_tenant_indexes
+from app.tenancy.service import TERM_RESULTS_SQL, TenantService
+
+
+@dataclass(frozen=True)
+class Migration:
+    """One step towards the current tenant schema."""
+
+    version: int
+    name: str
+    apply: Callable[[Session, str], None]
+
+
+def _base_schema(db: Session, schema_name: str) -> None:
+    TenantService(db).create_tables(schema_name)
+
+
+def _default_rbac(db: Session, schema_name: str) -> None:
+    db.execute(text(f'SET LOCAL search_path TO "{schema_name}", public'))
+    TenantService(db).seed_defaults()
+
+
+def _secondary_indexes(db: Session, schema_name: str) -> None:
+    # CREATE INDEX CONCURRENTLY runs on its own autocommit connection
+    apply_tenant_indexes(db.get_bind(), schema_name)
+
+
+def _attendance_notes(db: Session, schema_name: str) -> None:
+    # The bulk attendance endpoints write notes and recorded_by
+    db.execute(text(
+        f'ALTER TABLE "{schema_name}".attendance '
+        "ADD COLUMN IF NOT EXISTS notes text, ADD COLUMN IF NOT EXISTS recorded_by integer"
+    ))
+
+
+def _term_results(db: Session, schema_name: str) -> None:
+    # Finalizing results stores aggregates and class positions here
+    db.execute(text(TERM_RESULTS_SQL.format(schema=schema_name)))
+
+
+def _user_directory(db: Session, schema_name: str) -> None:
+    # Backfill the cross-tenant email directory used by simple-login
+    UserDirectoryEntry.__table__.create(bind=db.connection(), checkfirst=True)
+    sync_tenant_directory(db, schema_name)
+
+
+def _audit_log_partitions(db: Session, schema_name: str) -> None:
+    # Monthly partitions; also converts a plain audit_logs left by enhance_security.py
+    create_audit_log_table(db.connection(), schema_name, settings.audit_partitions_ahead)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "base_schema", _base_schema),
+    Migration(2, "default_rbac", _default_rbac),
+    Migration(3, "secondary_indexes", _secondary_indexes),
+    Migration(4, "attendance_notes", _attendance_notes),
+    Migration(5, "term_results", _term_results),
+    Migration(6, "user_directory", _user_directory),
+    Migration(7, "audit_log_partitions", _audit_log_partitions),
+]
+
+LATEST_VERSION = max(m.version for m in MIGRATIONS)
+
+
+def pending_migrations(applied: Iterable[int], migrations: Sequence[Migration] = MIGRATIONS) -> List[Migration]:
+    """Steps not yet applied, in version order."""
+    done = set(applied)
+    return sorted((m for m in migrations if m.version not in done), key=lambda m: m.version)
+
+
+@contextmanager
+def _migration_lock(bind: Engine, schema_name: str) -> Generator[None, None, None]:
+    """Serialise runners working on the same tenant, e.g. several workers booting at once."""
+    if bind.dialect.name != "postgresql":
+        yield
+        return
+    key = {"key": f"tenant_migrations:{schema_name}"}
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(hashtext(:key))"), key)
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), key)
+
+
+def migrate_tenant(schema_name: str, bind: Optional[Engine] = None) -> List[int]:
+    """Apply the pending steps to one tenant schema. Returns the versions applied."""
+    bind = bind or engine
+    applied_now: List[int] = []
+    with _migration_lock(bind, schema_name):
+        db = Session(bind=bind, autoflush=False, future=True)
+        try:
+            db.execute(text(f'CREATE SCHEMA IF NOT EXISTS "{schema_name}"'))
+            db.execute(text(
+                f"""
+                CREATE TABLE IF NOT EXISTS "{schema_name}".schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(100) NOT NULL,
+                    duration_ms INTEGER,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            ))
+            db.commit()
+            # Read under the lock: another runner may have just finished this tenant
+            applied = db.execute(text(f'SELECT version FROM "{schema_name}".schema_migrations')).scalars().all()
+
+            for migration in pending_migrations(applied):
+                started = time.perf_counter()
+                migration.apply(db, schema_name)
+                db.execute(
+                    text(f'INSERT INTO "{schema_name}".schema_migrations(version, name, duration_ms) VALUES (:v, :n, :ms)'),
+                    {"v": migration.version, "n": migration.name, "ms": int((time.perf_counter() - started) * 1000)},
+                )
+                db.commit()
+                applied_now.append(migration.version)
+
+            db.execute(
+                text("UPDATE public.tenants SET schema_version = :v WHERE schema_name = :s"),
+                {"v": LATEST_VERSION, "s": schema_name},
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    return applied_now
+
+
+def outdated_schemas(db: Session) -> List[str]:
+    """Tenant schemas whose recorded version is behind the latest step."""
+    return db.execute(
+        text("SELECT schema_name FROM public.tenants WHERE schema_version < :v ORDER BY id ASC"),
+        {"v": LATEST_VERSION},
+    ).scalars().all()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Apply pending tenant schema migrations")
+    parser.add_argument("--tenant", action="append", dest="tenants", metavar="SCHEMA",
+                        help="Migrate only this schema (repeatable); defaults to every out-of-date tenant")
+    parser.add_argument("--workers", type=int, default=None, help="Tenants migrated in parallel")
+    parser.add_argument("--all", action="store_true", help="Check every tenant, not just those behind")
+    parser.add_argument("--reseed", action="store_true", help="Re-run the default seed after migrating")
+    args = parser.parse_args(argv)
+
+    if args.tenants:
+        schema_names = args.tenants
+    else:
+        db = Session(bind=engine, future=True)
+        try:
+            if args.all:
+                schema_names = db.execute(text("SELECT schema_name FROM public.tenants ORDER BY id ASC")).scalars().all()
+            else:
+                schema_names = outdated_schemas(db)
+        finally:
+            db.close()
+
+    from app.tenancy.orchestrator import print_progress, provision_tenants
+
+    print(f"Migrating {len(schema_names)} tenant(s) to version {LATEST_VERSION}")
+    report = provision_tenants(schema_names, workers=args.workers, reseed=args.reseed, on_progress=print_progress)
+    print(f"Done in {report.duration_ms / 1000:.1f}s, {len(report.failed)} failed")
+    if report.failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
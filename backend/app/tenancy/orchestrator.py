@@ -0,0 +1,152 @@
+"""Fan tenant provisioning out over a bounded worker pool.
+
+Each tenant is migrated, optionally re-seeded and then verified on its own
+pooled connections. A failing tenant is recorded in the report and never stops
+the rest of the batch.
+"""
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import engine
+from app.services.user_directory import sync_tenant_directory
+from app.tenancy.migrations import LATEST_VERSION, migrate_tenant
+from app.tenancy.service import TENANT_BASE_SCHEMA_SQL, TenantService
+
+# Every table the base DDL declares, plus the migration ledger
+REQUIRED_TABLES = re.findall(r"CREATE TABLE IF NOT EXISTS (\w+)", TENANT_BASE_SCHEMA_SQL) + ["schema_migrations"]
+
+
+@dataclass
+class TenantResult:
+    """Outcome of provisioning one tenant schema."""
+
+    schema_name: str
+    applied: List[int] = field(default_factory=list)
+    problems: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    duration_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.problems
+
+
+@dataclass
+class ProvisionReport:
+    results: List[TenantResult]
+    duration_ms: float
+
+    @property
+    def failed(self) -> List[TenantResult]:
+        return [r for r in self.results if not r.ok]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "tenants": len(self.results),
+            "failed": len(self.failed),
+            "duration_ms": self.duration_ms,
+            "results": [dict(asdict(r), ok=r.ok) for r in self.results],
+        }
+
+
+def verify_tenant(schema_name: str, bind: Optional[Engine] = None) -> List[str]:
+    """Problems that would stop the tenant from serving requests; empty when healthy."""
+    bind = bind or engine
+    problems: List[str] = []
+    with bind.connect() as conn:
+        tables = set(conn.execute(
+            text("SELECT table_name FROM information_schema.tables WHERE table_schema = :schema"),
+            {"schema": schema_name},
+        ).scalars().all())
+        problems.extend(f"missing table {t}" for t in REQUIRED_TABLES if t not in tables)
+        if "schema_migrations" in tables:
+            version = conn.execute(
+                text(f'SELECT COALESCE(MAX(version), 0) FROM "{schema_name}".schema_migrations')
+            ).scalar()
+            if version < LATEST_VERSION:
+                problems.append(f"schema at version {version}, expected {LATEST_VERSION}")
+        if "roles" in tables and not conn.execute(text(f'SELECT EXISTS (SELECT 1 FROM "{schema_name}".roles)')).scalar():
+            problems.append("no roles seeded")
+    return problems
+
+
+def reseed_tenant(schema_name: str, bind: Optional[Engine] = None) -> Dict[str, Any]:
+    """Re-run the idempotent default seed, e.g. after defaults were extended."""
+    db = Session(bind=bind or engine, autoflush=False, future=True)
+    try:
+        db.execute(text(f'SET LOCAL search_path TO "{schema_name}", public'))
+        result = TenantService(db).seed_defaults()
+        # Users the seed created need directory entries for simple-login
+        sync_tenant_directory(db, schema_name)
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+
+def provision_tenant(
+    schema_name: str,
+    reseed: bool = False,
+    verify: bool = True,
+    migrate: Callable[[str], List[int]] = migrate_tenant,
+    check: Callable[[str], List[str]] = verify_tenant,
+) -> TenantResult:
+    result = TenantResult(schema_name=schema_name)
+    started = time.perf_counter()
+    try:
+        result.applied = migrate(schema_name)
+        if reseed:
+            reseed_tenant(schema_name)
+        if verify:
+            result.problems = check(schema_name)
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    result.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+def default_workers() -> int:
+    # A worker holds up to three connections: the advisory lock, the migration session and the
+    # autocommit connection CREATE INDEX CONCURRENTLY runs on (migration 3)
+    pool_capacity = settings.db_pool_size + settings.db_max_overflow
+    return max(1, min(settings.tenant_migration_workers, pool_capacity // 3))
+
+
+def provision_tenants(
+    schema_names: Sequence[str],
+    workers: Optional[int] = None,
+    reseed: bool = False,
+    verify: bool = True,
+    on_progress: Optional[Callable[[int, int, TenantResult], None]] = None,
+    provision: Callable[..., TenantResult] = provision_tenant,
+) -> ProvisionReport:
+    """Provision tenants in parallel; results come back in the order given."""
+    started = time.perf_counter()
+    total = len(schema_names)
+    workers = max(1, min(workers or default_workers(), total or 1))
+    by_schema: Dict[str, TenantResult] = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tenant-provision") as pool:
+        futures = [pool.submit(provision, schema, reseed=reseed, verify=verify) for schema in schema_names]
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            by_schema[result.schema_name] = result
+            if on_progress:
+                on_progress(done, total, result)
+    return ProvisionReport(
+        results=[by_schema[s] for s in schema_names],
+        duration_ms=round((time.perf_counter() - started) * 1000, 2),
+    )
+
+
+def print_progress(done: int, total: int, result: TenantResult) -> None:
+    status = "ok" if result.ok else f"FAILED ({result.error or '; '.join(result.problems)})"
+    applied = f", applied {result.applied}" if result.applied else ""
+    print(f"[{done}/{total}] {result.schema_name}: {status}{applied} in {result.duration_ms:.0f}ms")
@@ -1,11 +1,32 @@
-from typing import Optional
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.models.public import Tenant
+from app.tenancy.indexes import apply_tenant_indexes
 
 
+# Per-student term aggregates and class positions, rebuilt when results are finalized.
+# Shared by the base DDL and tenant migration 5.
+TERM_RESULTS_SQL = """
+    CREATE TABLE IF NOT EXISTS "{schema}".term_results (
+        student_id INTEGER NOT NULL REFERENCES "{schema}".students(id) ON DELETE CASCADE,
+        academic_year VARCHAR(10) NOT NULL,
+        term VARCHAR(20) NOT NULL,
+        class_name VARCHAR(50) NOT NULL,
+        total_subjects INTEGER NOT NULL,
+        total_points DECIMAL(7,2) NOT NULL,
+        gpa DECIMAL(4,2) NOT NULL,
+        average_score DECIMAL(5,2) NOT NULL,
+        class_position INTEGER NOT NULL,
+        class_size INTEGER NOT NULL,
+        computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (student_id, academic_year, term)
+    )
+"""
+
 TENANT_BASE_SCHEMA_SQL = """
     CREATE TABLE IF NOT EXISTS users (
         id SERIAL PRIMARY KEY,
@@ -239,10 +260,205 @@ ALTER TABLE IF EXISTS academic_records ADD COLUMN IF NOT EXISTS overall_score nu
 ALTER TABLE IF EXISTS academic_records ADD COLUMN IF NOT EXISTS grade_points numeric(4,2);
 ALTER TABLE IF EXISTS academic_records ADD COLUMN IF NOT EXISTS is_finalized boolean DEFAULT false;
 ALTER TABLE IF EXISTS students ADD COLUMN IF NOT EXISTS student_number varchar(64);
+ALTER TABLE IF EXISTS attendance ADD COLUMN IF NOT EXISTS notes text;
+ALTER TABLE IF EXISTS attendance ADD COLUMN IF NOT EXISTS recorded_by integer;
 CREATE UNIQUE INDEX IF NOT EXISTS uq_students_student_number ON students(student_number) WHERE student_number IS NOT NULL;
 """
 
 
+# Permissions seeded into every tenant. Append new entries at the end: the
+# position of each name is its bit in the permission bitmap embedded in tokens.
+DEFAULT_PERMISSIONS = [
+    # Student management permissions
+    ("students.read", "View student information"),
+    ("students.create", "Create new students"),
+    ("students.update", "Update student information"),
+    ("students.delete", "Delete students"),
+
+    # Finance management permissions
+    ("finance.read", "View financial information"),
+    ("finance.create", "Create invoices and payments"),
+    ("finance.update", "Update financial records"),
+    ("finance.delete", "Delete financial records"),
+
+    # Academic management permissions
+    ("academic.read", "View academic records"),
+    ("academic.create", "Create academic records"),
+    ("academic.update", "Update academic records"),
+    ("academic.delete", "Delete academic records"),
+    ("academic.manage", "Manage academic settings and schedules"),
+    ("academic.attendance", "Manage student attendance"),
+    ("academic.record", "Record academic results"),
+
+    # Library permissions
+    ("library.read", "Access library resources"),
+    ("library.manage", "Manage library resources"),
+    ("library.upload", "Upload library materials"),
+
+    # Communications permissions
+    ("communications.read", "View announcements and communications"),
+    ("communications.manage", "Manage communications and announcements"),
+    ("communications.send", "Send or publish communications"),
+
+    # Teacher management permissions
+    ("teachers.read", "View teacher information"),
+    ("teachers.create", "Create new teachers"),
+    ("teachers.update", "Update teacher information"),
+    ("teachers.delete", "Delete teachers"),
+
+    # Settings management permissions
+    ("settings.manage", "Manage system settings, users, roles, and permissions"),
+
+    # Dashboard permissions
+    ("dashboard.view", "View dashboard and reports"),
+
+    # Attendance permissions
+    ("attendance.read", "View attendance records"),
+    ("attendance.create", "Create attendance records"),
+    ("attendance.update", "Update attendance records"),
+
+    # Reports permissions
+    ("reports.view", "View system reports"),
+    ("reports.generate", "Generate reports"),
+]
+
+
+DEFAULT_ROLES: List[Tuple[str, str]] = [
+    ("Super Administrator", "Full system access with all permissions"),
+    ("School Administrator", "School-level administration with most permissions"),
+    ("Administrator", "Legacy admin role with broad permissions"),
+    ("Teacher", "Teacher access with student and academic permissions"),
+    ("Finance Officer", "Finance management with limited other access"),
+    ("Student", "Student access with limited read permissions"),
+    ("Parent", "Parent access to view their children's information"),
+]
+
+# Baseline grants; ON CONFLICT keeps grants an administrator added on top
+DEFAULT_ROLE_PERMISSIONS: Dict[str, List[str]] = {
+    "Super Administrator": [
+        "students.read", "students.create", "students.update", "students.delete",
+        "finance.read", "finance.create", "finance.update", "finance.delete",
+        "academic.read", "academic.create", "academic.update", "academic.delete",
+        "academic.manage", "academic.attendance", "academic.record",
+        "teachers.read", "teachers.create", "teachers.update", "teachers.delete",
+        "settings.manage", "dashboard.view", "attendance.read", "attendance.create",
+        "attendance.update", "reports.view", "reports.generate",
+        "library.read", "library.manage", "library.upload",
+        "communications.read", "communications.manage", "communications.send"
+    ],
+    "School Administrator": [
+        "students.read", "students.create", "students.update", "students.delete",
+        "finance.read", "finance.create", "finance.update",
+        "academic.read", "academic.create", "academic.update",
+        "teachers.read", "teachers.create", "teachers.update",
+        "dashboard.view", "attendance.read", "attendance.create",
+        "attendance.update", "reports.view", "reports.generate",
+        "library.read", "library.manage", "library.upload", "settings.manage",
+        "communications.read", "communications.manage", "communications.send"
+    ],
+    "Administrator": [
+        "settings.manage", "dashboard.view",
+        "students.read", "students.create", "students.update", "students.delete",
+        "teachers.read", "teachers.create", "teachers.update",
+        "academic.read", "academic.create", "academic.update",
+        "finance.read", "finance.create", "finance.update",
+        "library.read", "library.manage", "library.upload",
+        "communications.read", "communications.manage", "communications.send"
+    ],
+    "Teacher": [
+        "students.read", "students.update",
+        "academic.read", "academic.create", "academic.update",
+        "dashboard.view", "attendance.read", "attendance.create",
+        "attendance.update", "reports.view",
+        "library.read",
+        "communications.read"
+    ],
+    "Finance Officer": [
+        "students.read",
+        "finance.read", "finance.create", "finance.update", "finance.delete",
+        "dashboard.view", "reports.view", "reports.generate",
+        "communications.read"
+    ],
+    "Student": [
+        "students.read", "academic.read", "dashboard.view",
+        "library.read",
+        "communications.read"
+    ],
+    "Parent": [
+        "students.read", "academic.read", "dashboard.view",
+        "communications.read"
+    ]
+}
+
+# Roles that always receive every library permission, alongside any role holding settings.manage
+LIBRARY_ADMIN_ROLES = ["Administrator", "School Administrator", "Super Administrator"]
+LIBRARY_PERMISSIONS = ["library.read", "library.manage", "library.upload"]
+
+# Demo accounts; only created (and their passwords hashed) when the email is not taken
+DEFAULT_USERS: List[Dict[str, Any]] = [
+    {
+        "email": "admin@blantyresynod.org",
+        "full_name": "System Administrator",
+        "password": "admin123",
+        "roles": ["Super Administrator"]
+    },
+    {
+        "email": "principal@school1.org",
+        "full_name": "School Principal",
+        "password": "principal123",
+        "roles": ["School Administrator"]
+    },
+    {
+        "email": "teacher1@school1.org",
+        "full_name": "John Teacher",
+        "password": "teacher123",
+        "roles": ["Teacher"]
+    },
+    {
+        "email": "finance@school1.org",
+        "full_name": "Finance Manager",
+        "password": "finance123",
+        "roles": ["Finance Officer"]
+    },
+    {
+        "email": "student1@school1.org",
+        "full_name": "Alice Student",
+        "password": "student123",
+        "roles": ["Student"]
+    },
+    {
+        "email": "parent1@school1.org",
+        "full_name": "Bob Parent",
+        "password": "parent123",
+        "roles": ["Parent"]
+    }
+]
+
+# Percentage-based default; points provided for GPA compatibility
+DEFAULT_GRADE_SCALES = [
+    ('A', 80.0, 100.0, 4.00, 'Excellent', 1),
+    ('B', 70.0, 79.99, 3.00, 'Very Good', 2),
+    ('C', 60.0, 69.99, 2.00, 'Good', 3),
+    ('D', 50.0, 59.99, 1.00, 'Pass', 4),
+    ('E', 40.0, 49.99, 0.00, 'Weak', 5),
+    ('F', 0.0, 39.99, 0.00, 'Fail', 6)
+]
+
+
+def _values(rows: Sequence[Sequence[Any]], prefix: str) -> Tuple[str, Dict[str, Any]]:
+    """Render rows as a VALUES list of bind parameters for a single statement."""
+    params: Dict[str, Any] = {}
+    groups = []
+    for i, row in enumerate(rows):
+        names = []
+        for j, value in enumerate(row):
+            key = f"{prefix}{i}_{j}"
+            params[key] = value
+            names.append(f":{key}")
+        groups.append(f"({', '.join(names)})")
+    return "VALUES " + ", ".join(groups), params
+
+
 class TenantService:
     def __init__(self, db: Session):
         self.db = db
@@ -258,6 +474,13 @@ class TenantService:
         return tenant
 
     def ensure_schema(self, schema_name: str) -> None:
+        self.create_tables(schema_name)
+        self.db.commit()
+        # Secondary indexes are built concurrently, outside any transaction
+        apply_tenant_indexes(self.db.get_bind(), schema_name)
+
+    def create_tables(self, schema_name: str) -> None:
+        """Run the base DDL and column updates in the current transaction."""
         # Create schema (idempotent)
         self.db.execute(text(f"CREATE SCHEMA IF NOT EXISTS \"{schema_name}\""))
         # Set search_path and create tables
@@ -266,328 +489,122 @@ class TenantService:
         for statement in statements:
             if statement:  # Ensure statement is not empty
                 self.db.execute(text(statement))
+        self.db.execute(text(TERM_RESULTS_SQL.format(schema=schema_name)))
         # Apply non-breaking schema updates if tables already existed
         for statement in [s.strip() for s in ALTER_TABLES_IF_NEEDED_SQL.split(";") if s.strip()]:
             self.db.execute(text(statement))
-        self.db.commit()
 
-    def seed_defaults(self):
-        """Seed default roles and permissions for a tenant."""
-        # First, ensure we're in the correct schema
-        schema_name = self.db.execute(text("SELECT current_schema()")).scalar()
-        
-        # Create permissions if they don't exist
-        permissions_data = [
-            # Student management permissions
-            ("students.read", "View student information"),
-            ("students.create", "Create new students"),
-            ("students.update", "Update student information"),
-            ("students.delete", "Delete students"),
-            
-            # Finance management permissions
-            ("finance.read", "View financial information"),
-            ("finance.create", "Create invoices and payments"),
-            ("finance.update", "Update financial records"),
-            ("finance.delete", "Delete financial records"),
-            
-            # Academic management permissions
-            ("academic.read", "View academic records"),
-            ("academic.create", "Create academic records"),
-            ("academic.update", "Update academic records"),
-            ("academic.delete", "Delete academic records"),
-            ("academic.manage", "Manage academic settings and schedules"),
-            ("academic.attendance", "Manage student attendance"),
-            ("academic.record", "Record academic results"),
-            
-            # Library permissions
-            ("library.read", "Access library resources"),
-            ("library.manage", "Manage library resources"),
-            ("library.upload", "Upload library materials"),
-            
-            # Communications permissions
-            ("communications.read", "View announcements and communications"),
-            ("communications.manage", "Manage communications and announcements"),
-            ("communications.send", "Send or publish communications"),
-            
-            # Teacher management permissions
-            ("teachers.read", "View teacher information"),
-            ("teachers.create", "Create new teachers"),
-            ("teachers.update", "Update teacher information"),
-            ("teachers.delete", "Delete teachers"),
-            
-            # Settings management permissions
-            ("settings.manage", "Manage system settings, users, roles, and permissions"),
-            
-            # Dashboard permissions
-            ("dashboard.view", "View dashboard and reports"),
-            
-            # Attendance permissions
-            ("attendance.read", "View attendance records"),
-            ("attendance.create", "Create attendance records"),
-            ("attendance.update", "Update attendance records"),
-            
-            # Reports permissions
-            ("reports.view", "View system reports"),
-            ("reports.generate", "Generate reports"),
-        ]
-        
-        for perm_name, perm_desc in permissions_data:
-            existing = self.db.execute(
-                text("SELECT id FROM permissions WHERE name = :name"),
-                {"name": perm_name}
-            ).scalar()
-            if not existing:
-                self.db.execute(
-                    text("INSERT INTO permissions(name, description) VALUES (:name, :description)"),
-                    {"name": perm_name, "description": perm_desc}
-                )
-        
-        # Create roles if they don't exist
-        roles_data = [
-            ("Super Administrator", "Full system access with all permissions"),
-            ("School Administrator", "School-level administration with most permissions"),
-            ("Administrator", "Legacy admin role with broad permissions"),
-            ("Teacher", "Teacher access with student and academic permissions"),
-            ("Finance Officer", "Finance management with limited other access"),
-            ("Student", "Student access with limited read permissions"),
-            ("Parent", "Parent access to view their children's information"),
-        ]
-        
-        for role_name, role_desc in roles_data:
-            existing = self.db.execute(
-                text("SELECT id FROM roles WHERE name = :name"),
-                {"name": role_name}
-            ).scalar()
-            if not existing:
-                self.db.execute(
-                    text("INSERT INTO roles(name, description) VALUES (:name, :description)"),
-                    {"name": role_name, "description": role_desc}
-                )
-        
-        # Assign permissions to roles (baseline)
-        role_permissions = {
-            "Super Administrator": [
-                "students.read", "students.create", "students.update", "students.delete",
-                "finance.read", "finance.create", "finance.update", "finance.delete",
-                "academic.read", "academic.create", "academic.update", "academic.delete",
-                "academic.manage", "academic.attendance", "academic.record",
-                "teachers.read", "teachers.create", "teachers.update", "teachers.delete",
-                "settings.manage", "dashboard.view", "attendance.read", "attendance.create",
-                "attendance.update", "reports.view", "reports.generate",
-                "library.read", "library.manage", "library.upload",
-                "communications.read", "communications.manage", "communications.send"
-            ],
-            "School Administrator": [
-                "students.read", "students.create", "students.update", "students.delete",
-                "finance.read", "finance.create", "finance.update",
-                "academic.read", "academic.create", "academic.update",
-                "teachers.read", "teachers.create", "teachers.update",
-                "dashboard.view", "attendance.read", "attendance.create",
-                "attendance.update", "reports.view", "reports.generate",
-                "library.read", "library.manage", "library.upload", "settings.manage",
-                "communications.read", "communications.manage", "communications.send"
-            ],
-            "Administrator": [
-                "settings.manage", "dashboard.view",
-                "students.read", "students.create", "students.update", "students.delete",
-                "teachers.read", "teachers.create", "teachers.update",
-                "academic.read", "academic.create", "academic.update",
-                "finance.read", "finance.create", "finance.update",
-                "library.read", "library.manage", "library.upload",
-                "communications.read", "communications.manage", "communications.send"
-            ],
-            "Teacher": [
-                "students.read", "students.update",
-                "academic.read", "academic.create", "academic.update",
-                "dashboard.view", "attendance.read", "attendance.create",
-                "attendance.update", "reports.view",
-                "library.read",
-                "communications.read"
-            ],
-            "Finance Officer": [
-                "students.read",
-                "finance.read", "finance.create", "finance.update", "finance.delete",
-                "dashboard.view", "reports.view", "reports.generate",
-                "communications.read"
-            ],
-            "Student": [
-                "students.read", "academic.read", "dashboard.view",
-                "library.read",
-                "communications.read"
-            ],
-            "Parent": [
-                "students.read", "academic.read", "dashboard.view",
-                "communications.read"
-            ]
-        }
-        
-        for role_name, permissions in role_permissions.items():
-            role_id = self.db.execute(
-                text("SELECT id FROM roles WHERE name = :name"),
-                {"name": role_name}
-            ).scalar()
-            
-            if role_id:
-                for perm_name in permissions:
-                    perm_id = self.db.execute(
-                        text("SELECT id FROM permissions WHERE name = :name"),
-                        {"name": perm_name}
-                    ).scalar()
-                    
-                    if perm_id:
-                        # Check if assignment already exists
-                        existing = self.db.execute(
-                            text("SELECT id FROM role_permissions WHERE role_id = :role_id AND permission_id = :perm_id"),
-                            {"role_id": role_id, "perm_id": perm_id}
-                        ).scalar()
-                        
-                        if not existing:
-                            self.db.execute(
-                                text("INSERT INTO role_permissions(role_id, permission_id) VALUES (:role_id, :perm_id)"),
-                                {"role_id": role_id, "perm_id": perm_id}
-                            )
-        
-        # Ensure any role that has settings.manage also gets all library permissions (for legacy roles)
-        lib_perm_ids = self.db.execute(
-            text("SELECT id, name FROM permissions WHERE name IN ('library.read','library.manage','library.upload')")
-        ).mappings().all()
-        settings_manage_id = self.db.execute(
-            text("SELECT id FROM permissions WHERE name = 'settings.manage'")
-        ).scalar()
-        if settings_manage_id and lib_perm_ids:
-            admin_like_role_ids = self.db.execute(
-                text(
-                    """
-                    SELECT DISTINCT r.id
-                    FROM roles r
-                    JOIN role_permissions rp ON rp.role_id = r.id
-                    WHERE rp.permission_id = :pm
-                    UNION
-                    SELECT id FROM roles WHERE name IN ('Administrator','School Administrator','Super Administrator')
-                    """
-                ),
-                {"pm": settings_manage_id}
-            ).scalars().all()
-            for rid in admin_like_role_ids:
-                for lp in lib_perm_ids:
-                    existing = self.db.execute(
-                        text("SELECT 1 FROM role_permissions WHERE role_id = :rid AND permission_id = :pid"),
-                        {"rid": rid, "pid": lp.id}
-                    ).scalar()
-                    if not existing:
-                        self.db.execute(
-                            text("INSERT INTO role_permissions(role_id, permission_id) VALUES (:rid, :pid)"),
-                            {"rid": rid, "pid": lp.id}
-                        )
-        
-        # Create test users if they don't exist
-        test_users = [
-            {
-                "email": "admin@blantyresynod.org",
-                "full_name": "System Administrator",
-                "password": "admin123",
-                "roles": ["Super Administrator"]
-            },
-            {
-                "email": "principal@school1.org",
-                "full_name": "School Principal",
-                "password": "principal123",
-                "roles": ["School Administrator"]
-            },
-            {
-                "email": "teacher1@school1.org",
-                "full_name": "John Teacher",
-                "password": "teacher123",
-                "roles": ["Teacher"]
-            },
-            {
-                "email": "finance@school1.org",
-                "full_name": "Finance Manager",
-                "password": "finance123",
-                "roles": ["Finance Officer"]
-            },
-            {
-                "email": "student1@school1.org",
-                "full_name": "Alice Student",
-                "password": "student123",
-                "roles": ["Student"]
-            },
-            {
-                "email": "parent1@school1.org",
-                "full_name": "Bob Parent",
-                "password": "parent123",
-                "roles": ["Parent"]
-            }
-        ]
-        
-        from app.services.security import hash_password
-        
-        for user_data in test_users:
-            existing = self.db.execute(
-                text("SELECT id FROM users WHERE email = :email"),
-                {"email": user_data["email"]}
-            ).scalar()
-            
-            if not existing:
-                # Create user
-                hashed_password = hash_password(user_data["password"])
-                result = self.db.execute(
-                    text(
-                        """
-                        INSERT INTO users(email, full_name, hashed_password, is_active)
-                        VALUES (:email, :full_name, :password, :is_active)
-                        RETURNING id
-                        """
-                    ),
-                    {
-                        "email": user_data["email"],
-                        "full_name": user_data["full_name"],
-                        "password": hashed_password,
-                        "is_active": True
-                    }
-                )
-                user_id = result.scalar()
-                
-                # Assign roles
-                for role_name in user_data["roles"]:
-                    role_id = self.db.execute(
-                        text("SELECT id FROM roles WHERE name = :name"),
-                        {"name": role_name}
-                    ).scalar()
-                    
-                    if role_id:
-                        self.db.execute(
-                            text("INSERT INTO user_roles(user_id, role_id) VALUES (:user_id, :role_id)"),
-                            {"user_id": user_id, "role_id": role_id}
-                        )
-        
-        # Ensure default grading policy exists BEFORE committing so current tenant search_path applies
-        existing_policy = self.db.execute(text("SELECT id FROM grading_policies LIMIT 1")).scalar()
-        if not existing_policy:
-            self.db.execute(text("""
-                INSERT INTO grading_policies(policy_type, ca_weight, exam_weight, pass_mark)
-                VALUES ('percentage', 40.0, 60.0, 50.0)
-            """))
-
-        # Ensure default grade scales exist (A-F)
-        existing_scales = self.db.execute(text("SELECT COUNT(*) FROM grade_scales")).scalar() or 0
-        if existing_scales == 0:
-            # Percentage-based default; points provided for GPA compatibility
-            scales = [
-                ('A', 80.0, 100.0, 4.00, 'Excellent', 1),
-                ('B', 70.0, 79.99, 3.00, 'Very Good', 2),
-                ('C', 60.0, 69.99, 2.00, 'Good', 3),
-                ('D', 50.0, 59.99, 1.00, 'Pass', 4),
-                ('E', 40.0, 49.99, 0.00, 'Weak', 5),
-                ('F', 0.0, 39.99, 0.00, 'Fail', 6)
-            ]
-            for letter, min_s, max_s, pts, note, ord in scales:
-                self.db.execute(text("""
-                    INSERT INTO grade_scales(letter, min_score, max_score, points, remarks, sort_order)
-                    VALUES (:l, :min, :max, :p, :r, :o)
-                """), {"l": letter, "min": min_s, "max": max_s, "p": pts, "r": note, "o": ord})
+    def seed_defaults(self) -> Dict[str, Any]:
+        """Seed default roles, permissions, demo users and grading for the tenant on the search_path.
+
+        Each step is one set-based statement, so re-running against a seeded
+        tenant costs a handful of round trips and no password hashing. Returns
+        per-step timings in milliseconds and the number of users created.
+        """
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        def lap(step: str) -> None:
+            nonlocal started
+            now = time.perf_counter()
+            timings[step] = round((now - started) * 1000, 2)
+            started = now
+
+        values, params = _values(DEFAULT_PERMISSIONS, "p")
+        self.db.execute(text(f"""
+            INSERT INTO permissions(name, description)
+            SELECT v.name, v.description FROM ({values}) AS v(name, description)
+            ON CONFLICT (name) DO NOTHING
+        """), params)
+        lap("permissions")
+
+        values, params = _values(DEFAULT_ROLES, "r")
+        self.db.execute(text(f"""
+            INSERT INTO roles(name, description)
+            SELECT v.name, v.description FROM ({values}) AS v(name, description)
+            ON CONFLICT (name) DO NOTHING
+        """), params)
+        lap("roles")
+
+        grants = [(role, perm) for role, perms in DEFAULT_ROLE_PERMISSIONS.items() for perm in perms]
+        values, params = _values(grants, "g")
+        self.db.execute(text(f"""
+            INSERT INTO role_permissions(role_id, permission_id)
+            SELECT r.id, p.id
+            FROM ({values}) AS v(role_name, permission_name)
+            JOIN roles r ON r.name = v.role_name
+            JOIN permissions p ON p.name = v.permission_name
+            ON CONFLICT (role_id, permission_id) DO NOTHING
+        """), params)
+
+        # Any role that has settings.manage also gets all library permissions (for legacy roles)
+        self.db.execute(text("""
+            INSERT INTO role_permissions(role_id, permission_id)
+            SELECT r.id, lp.id
+            FROM roles r
+            JOIN permissions lp ON lp.name = ANY(:library)
+            WHERE r.name = ANY(:admin_roles)
+               OR EXISTS (
+                    SELECT 1 FROM role_permissions rp
+                    JOIN permissions sm ON sm.id = rp.permission_id
+                    WHERE rp.role_id = r.id AND sm.name = 'settings.manage'
+               )
+            ON CONFLICT (role_id, permission_id) DO NOTHING
+        """), {"library": LIBRARY_PERMISSIONS, "admin_roles": LIBRARY_ADMIN_ROLES})
+        lap("role_permissions")
+
+        existing_emails = set(self.db.execute(
+            text("SELECT email FROM users WHERE email = ANY(:emails)"),
+            {"emails": [u["email"] for u in DEFAULT_USERS]}
+        ).scalars().all())
+        missing_users = [u for u in DEFAULT_USERS if u["email"] not in existing_emails]
+        created = []
+        if missing_users:
+            from app.services.security import hash_password
+
+            values, params = _values(
+                [(u["email"], u["full_name"], hash_password(u["password"])) for u in missing_users], "u"
+            )
+            created = self.db.execute(text(f"""
+                INSERT INTO users(email, full_name, hashed_password, is_active)
+                SELECT v.email, v.full_name, v.hashed_password, true
+                FROM ({values}) AS v(email, full_name, hashed_password)
+                ON CONFLICT (email) DO NOTHING
+                RETURNING email
+            """), params).scalars().all()
+        lap("users")
+
+        # Roles are only assigned to accounts created just now, so later edits stick
+        assignments = [(u["email"], role) for u in missing_users if u["email"] in created for role in u["roles"]]
+        if assignments:
+            values, params = _values(assignments, "a")
+            self.db.execute(text(f"""
+                INSERT INTO user_roles(user_id, role_id)
+                SELECT u.id, r.id
+                FROM ({values}) AS v(email, role_name)
+                JOIN users u ON u.email = v.email
+                JOIN roles r ON r.name = v.role_name
+                ON CONFLICT (user_id, role_id) DO NOTHING
+            """), params)
+        lap("user_roles")
+
+        # Default grading policy and grade scales (A-F), only for a tenant that has none
+        self.db.execute(text("""
+            INSERT INTO grading_policies(policy_type, ca_weight, exam_weight, pass_mark)
+            SELECT 'percentage', 40.0, 60.0, 50.0
+            WHERE NOT EXISTS (SELECT 1 FROM grading_policies)
+        """))
+        values, params = _values(DEFAULT_GRADE_SCALES, "s")
+        self.db.execute(text(f"""
+            INSERT INTO grade_scales(letter, min_score, max_score, points, remarks, sort_order)
+            SELECT v.letter, v.min_score, v.max_score, v.points, v.remarks, v.sort_order
+            FROM ({values}) AS v(letter, min_score, max_score, points, remarks, sort_order)
+            WHERE NOT EXISTS (SELECT 1 FROM grade_scales)
+        """), params)
+        lap("grading")
 
         # Final commit for all seeded data
         self.db.commit()
-
-
+        lap("commit")
+        timings["total"] = round(sum(timings.values()), 2)
+        return {"timings_ms": timings, "users_created": len(created)}
@@ -0,0 +1,137 @@
+"""Row counts across many tenant schemas in one or two round trips.
+
+"exact" mode runs a single UNION ALL of count(*) subqueries. "estimate" mode
+reads the planner's pg_class.reltuples instead, falling back to the exact query
+only for filtered counts and for tables that have never been analyzed.
+"""
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+STATS_MODES = ("exact", "estimate")
+
+# stat name -> (table, optional WHERE clause)
+TENANT_STATS: Dict[str, Tuple[str, Optional[str]]] = {
+    "users": ("users", None),
+    "active_users": ("users", "is_active = true"),
+    "roles": ("roles", None),
+    "permissions": ("permissions", None),
+    "students": ("students", None),
+    "teachers": ("teachers", None),
+    "classes": ("classes", None),
+    "subjects": ("subjects", None),
+    "invoices": ("invoices", None),
+    "payments": ("payments", None),
+}
+
+
+def _existing_tables(db: Session, schemas: Sequence[str], tables: Set[str]) -> Set[Tuple[str, str]]:
+    """(schema, table) pairs that exist, so a half-provisioned tenant cannot fail the whole query."""
+    rows = db.execute(
+        text(
+            """
+            SELECT n.nspname AS schema_name, c.relname AS table_name
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = ANY(:schemas) AND c.relname = ANY(:tables) AND c.relkind IN ('r', 'p')
+            """
+        ),
+        {"schemas": list(schemas), "tables": sorted(tables)},
+    ).all()
+    return {(r.schema_name, r.table_name) for r in rows}
+
+
+def build_count_query(pairs: Sequence[Tuple[str, str]]) -> str:
+    """UNION ALL of one count(*) per (schema, stat); rows come back as (i, n) with i the pair's position."""
+    parts = []
+    for i, (schema, stat) in enumerate(pairs):
+        table, where = TENANT_STATS[stat]
+        sql = f'SELECT {i} AS i, count(*) AS n FROM "{schema}".{table}'
+        if where:
+            sql += f" WHERE {where}"
+        parts.append(sql)
+    return "\nUNION ALL\n".join(parts)
+
+
+def _exact(db: Session, pairs: Sequence[Tuple[str, str]]) -> Dict[Tuple[str, str], int]:
+    if not pairs:
+        return {}
+    rows = db.execute(text(build_count_query(pairs))).all()
+    return {pairs[r.i]: int(r.n) for r in rows}
+
+
+def _estimates(db: Session, schemas: Sequence[str], tables: Set[str]) -> Dict[Tuple[str, str], int]:
+    """Planner row estimates; tables never analyzed (reltuples < 0) are left out."""
+    rows = db.execute(
+        text(
+            """
+            SELECT n.nspname AS schema_name, c.relname AS table_name, c.reltuples AS estimate
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = ANY(:schemas) AND c.relname = ANY(:tables) AND c.relkind IN ('r', 'p')
+              AND c.reltuples >= 0
+            """
+        ),
+        {"schemas": list(schemas), "tables": sorted(tables)},
+    ).all()
+    return {(r.schema_name, r.table_name): int(r.estimate) for r in rows}
+
+
+def tenant_counts(
+    db: Session,
+    schemas: Sequence[str],
+    stats: Sequence[str],
+    mode: str = "exact",
+) -> Dict[str, Dict[str, int]]:
+    """Counts per schema for the requested stats; a missing table counts as 0."""
+    if mode not in STATS_MODES:
+        raise ValueError(f"Unknown stats mode: {mode}")
+    result: Dict[str, Dict[str, int]] = {schema: {stat: 0 for stat in stats} for schema in schemas}
+    if not schemas or not stats:
+        return result
+
+    tables = {TENANT_STATS[stat][0] for stat in stats}
+    existing = _existing_tables(db, schemas, tables)
+    estimates = _estimates(db, schemas, tables) if mode == "estimate" else {}
+
+    exact_pairs: List[Tuple[str, str]] = []
+    for schema in schemas:
+        for stat in stats:
+            table, where = TENANT_STATS[stat]
+            if (schema, table) not in existing:
+                continue
+            if where is None and (schema, table) in estimates:
+                result[schema][stat] = estimates[(schema, table)]
+            else:
+                exact_pairs.append((schema, stat))
+
+    for (schema, stat), n in _exact(db, exact_pairs).items():
+        result[schema][stat] = n
+    return result
+
+
+# Tables outstanding_balances reads
+BALANCE_TABLES = ("invoices", "payments")
+
+
+def outstanding_balances(db: Session, schemas: Sequence[str]) -> Dict[str, Decimal]:
+    """Unpaid invoice amounts per schema, in one UNION ALL query."""
+    result: Dict[str, Decimal] = {schema: Decimal("0") for schema in schemas}
+    if not schemas:
+        return result
+    existing = _existing_tables(db, schemas, {"invoices", "payments"})
+    ready = [s for s in schemas if (s, "invoices") in existing and (s, "payments") in existing]
+    if not ready:
+        return result
+    parts = [
+        f"""SELECT {i} AS i, COALESCE(SUM(GREATEST(inv.amount - COALESCE(p.paid, 0), 0)), 0) AS n
+            FROM "{schema}".invoices inv
+            LEFT JOIN (SELECT invoice_id, SUM(amount) AS paid FROM "{schema}".payments GROUP BY invoice_id) p
+              ON p.invoice_id = inv.id"""
+        for i, schema in enumerate(ready)
+    ]
+    for r in db.execute(text("\nUNION ALL\n".join(parts))).all():
+        result[ready[r.i]] = Decimal(r.n)
+    return result
@@ -0,0 +1,58 @@
+"""Micro-benchmark for the per-request token handling in get_current_user_id.
+
+Compares the previous behaviour (decode with python-jose and re-sign a fresh
+token on every request) with the memoized decode plus threshold refresh policy.
+
+Run from the backend directory:
+
+    python benchmarks/bench_token_refresh.py [iterations]
+"""
+import os
+import sys
+import time
+import timeit
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench.db")
+os.environ.setdefault("JWT_SECRET", "benchmark-secret")
+
+from jose import jwt  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.services.security import create_access_token  # noqa: E402
+from app.services.tokens import decode_access_token, decoded_token_cache, refresh_policy  # noqa: E402
+
+
+def legacy_request(token: str) -> str:
+    payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+    idle_limit = timedelta(minutes=settings.session_idle_timeout_minutes)
+    return create_access_token(subject=str(payload["sub"]), expires_delta=idle_limit, extra={"tenant": payload["tenant"]})
+
+
+def current_request(token: str) -> str:
+    payload = decode_access_token(token)
+    issued_at = int(payload["iat"])
+    now = time.time()
+    if refresh_policy.should_refresh(issued_at, now):
+        idle_limit = timedelta(seconds=refresh_policy.idle_timeout_seconds)
+        return create_access_token(subject=str(payload["sub"]), expires_delta=idle_limit, extra={"tenant": payload["tenant"]})
+    return token
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    token = create_access_token(subject="42", extra={"tenant": "ndirande-high"})
+    decoded_token_cache.clear()
+
+    legacy = timeit.timeit(lambda: legacy_request(token), number=iterations)
+    current = timeit.timeit(lambda: current_request(token), number=iterations)
+
+    print(f"iterations:             {iterations}")
+    print(f"decode + re-sign:       {legacy / iterations * 1e6:8.2f} us/request")
+    print(f"memoized + threshold:   {current / iterations * 1e6:8.2f} us/request")
+    print(f"speedup:                {legacy / current:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ import random
 sys.path.insert(0, "/app")
 
 from app.db.session import SessionLocal
+from app.services.user_directory import register_user
 
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
@@ -116,6 +117,7 @@ def main():
                 
                 parent_user = db.execute(text("SELECT id FROM users WHERE email = :email"), {"email": parent_data["email"]}).fetchone()
                 parent_id = parent_user[0]
+                register_user(db, parent_id, parent_data["email"], schema_name="ndirande_high")
                 print(f"  ✓ Created parent: {parent_data['email']}")
                 
                 # Assign parent role
@@ -3,13 +3,14 @@ import asyncio
 from typing import Generator, AsyncGenerator
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
 from app.core.config import settings
 from app.db.session import get_public_session
-from app.tenancy.deps import get_tenant_db
+from app.tenancy.deps import get_async_tenant_db, get_tenant_db
 from app.services.security import create_access_token
 
 
@@ -26,6 +27,10 @@ test_engine = create_engine(
 # Create test session factory
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
 
+# Async routes read the same database file through aiosqlite
+test_async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+TestingAsyncSessionLocal = async_sessionmaker(bind=test_async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -289,8 +294,15 @@ def client(public_db_session: Session, tenant_db_session: Session) -> Generator[
         finally:
             pass
     
+    async def override_get_async_tenant_db():
+        # Make rows written through the sync fixtures visible to the aiosqlite connection
+        tenant_db_session.commit()
+        async with TestingAsyncSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_public_session] = override_get_public_session
     app.dependency_overrides[get_tenant_db] = override_get_tenant_db
+    app.dependency_overrides[get_async_tenant_db] = override_get_async_tenant_db
     
     with TestClient(app) as test_client:
         yield test_client
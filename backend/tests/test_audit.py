@@ -0,0 +1,166 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from app.services import audit
+from app.services.audit import (
+    AuditEvent,
+    AuditWriter,
+    add_months,
+    as_utc_naive,
+    create_audit_partitions,
+    expired_partitions,
+    forget_partitions,
+    partition_month,
+    partition_name,
+    remember_partitions,
+)
+
+
+def _event(schema="school_a", action="ACCESS_GRANTED"):
+    return AuditEvent(tenant_schema=schema, user_id=1, action=action, resource_type="test")
+
+
+@pytest.fixture
+def written(monkeypatch):
+    calls = []
+
+    def fake_insert(bind, schema_name, batch):
+        calls.append((schema_name, [e.action for e in batch]))
+        return len(batch)
+
+    monkeypatch.setattr(audit, "insert_audit_events", fake_insert)
+    return calls
+
+
+class TestAuditWriter:
+    def test_flush_groups_batch_by_tenant(self, written):
+        writer = AuditWriter(batch_size=10, bind=object())
+        for schema, action in [("a", "1"), ("b", "2"), ("a", "3")]:
+            writer.enqueue(_event(schema, action))
+        assert writer.flush() == 3
+        assert written == [("a", ["1", "3"]), ("b", ["2"])]
+        assert writer.pending() == 0
+        assert writer.snapshot()["written"] == 3
+
+    def test_flush_takes_at_most_one_batch(self, written):
+        writer = AuditWriter(batch_size=2, bind=object())
+        for i in range(5):
+            writer.enqueue(_event(action=str(i)))
+        assert writer.flush() == 2
+        assert writer.pending() == 3
+
+    def test_drop_oldest_keeps_newest_events(self, written):
+        writer = AuditWriter(capacity=2, batch_size=10, overflow_policy="drop_oldest", bind=object())
+        for i in range(3):
+            assert writer.enqueue(_event(action=str(i)))
+        writer.flush()
+        assert written == [("school_a", ["1", "2"])]
+        assert writer.snapshot()["dropped"] == 1
+
+    def test_drop_newest_rejects_new_events(self, written):
+        writer = AuditWriter(capacity=2, batch_size=10, overflow_policy="drop_newest", bind=object())
+        results = [writer.enqueue(_event(action=str(i))) for i in range(3)]
+        assert results == [True, True, False]
+        writer.flush()
+        assert written == [("school_a", ["0", "1"])]
+
+    def test_connection_failure_requeues_events(self, monkeypatch):
+        def failing_insert(bind, schema_name, batch):
+            raise OperationalError("INSERT", {}, Exception("connection lost"))
+
+        monkeypatch.setattr(audit, "insert_audit_events", failing_insert)
+        writer = AuditWriter(batch_size=10, bind=object())
+        writer.enqueue(_event(action="0"))
+        assert writer.flush() == 0
+        assert writer.pending() == 1
+        assert writer.snapshot()["failed_flushes"] == 1
+
+    def test_other_errors_drop_only_that_tenant(self, monkeypatch):
+        written = []
+
+        def insert(bind, schema_name, batch):
+            if schema_name == "broken":
+                raise ProgrammingError("INSERT", {}, Exception("relation does not exist"))
+            written.append(schema_name)
+            return len(batch)
+
+        monkeypatch.setattr(audit, "insert_audit_events", insert)
+        writer = AuditWriter(batch_size=10, bind=object())
+        writer.enqueue(_event("broken"))
+        writer.enqueue(_event("school_a"))
+        assert writer.flush() == 1
+        assert written == ["school_a"]
+        assert writer.pending() == 0
+        assert writer.snapshot()["dropped"] == 1
+
+    def test_stop_drains_buffer(self, written):
+        writer = AuditWriter(batch_size=2, flush_seconds=60, bind=object())
+        writer.start()
+        writer.enqueue(_event(action="0"))
+        writer.stop()
+        assert writer.pending() == 0
+        assert [a for _, actions in written for a in actions] == ["0"]
+
+    def test_sync_mode_writes_immediately(self, written):
+        writer = AuditWriter(mode="sync", bind=object())
+        writer.enqueue(_event(action="0"))
+        assert written == [("school_a", ["0"])]
+        assert writer.pending() == 0
+
+    def test_rejects_unknown_policy(self):
+        with pytest.raises(ValueError):
+            AuditWriter(overflow_policy="spill", bind=object())
+
+
+class _RecordingConn:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+
+
+class TestAuditPartitions:
+    def test_month_arithmetic_crosses_years(self):
+        assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+        assert add_months(date(2026, 1, 1), -13) == date(2024, 12, 1)
+
+    def test_partition_names_round_trip(self):
+        assert partition_name(date(2026, 3, 1)) == "audit_logs_p202603"
+        assert partition_month("audit_logs_p202603") == date(2026, 3, 1)
+        assert partition_month("audit_logs_legacy") is None
+
+    def test_expired_partitions_keep_retention_window(self):
+        names = [partition_name(add_months(date(2025, 1, 1), i)) for i in range(24)]
+        expired = expired_partitions(names, retention_months=12, today=date(2026, 10, 17))
+        assert expired[0] == "audit_logs_p202501"
+        assert expired[-1] == "audit_logs_p202509"
+        assert "audit_logs_p202510" not in expired
+
+    def test_zero_retention_keeps_everything(self):
+        assert expired_partitions(["audit_logs_p200001"], retention_months=0) == []
+
+    def test_create_skips_known_months(self):
+        forget_partitions("school_a")
+        remember_partitions("school_a", [date(2026, 10, 1)])
+        conn = _RecordingConn()
+        created = create_audit_partitions(conn, "school_a", [date(2026, 10, 5), date(2026, 11, 20)])
+        assert created == [date(2026, 11, 1)]
+        ddl = [s for s in conn.statements if "PARTITION OF" in s]
+        assert len(ddl) == 1
+        assert "audit_logs_p202611" in ddl[0]
+        assert "FROM ('2026-11-01') TO ('2026-12-01')" in ddl[0]
+        forget_partitions("school_a")
+
+    def test_create_does_not_remember_before_commit(self):
+        forget_partitions("school_a")
+        create_audit_partitions(_RecordingConn(), "school_a", [date(2026, 10, 1)])
+        conn = _RecordingConn()
+        assert create_audit_partitions(conn, "school_a", [date(2026, 10, 1)]) == [date(2026, 10, 1)]
+
+    def test_range_bounds_are_utc(self):
+        cat = timezone(timedelta(hours=2))
+        assert as_utc_naive(datetime(2026, 11, 1, 1, 0, tzinfo=cat)) == datetime(2026, 10, 31, 23, 0)
+        assert as_utc_naive(datetime(2026, 11, 1)) == datetime(2026, 11, 1)
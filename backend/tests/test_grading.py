@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import grading
+from app.services.grading import GradeBand, GradingEngine, GradingEngineCache, get_grading_engine
+
+DEFAULT_BANDS = [
+    GradeBand(80.0, 100.0, "A", 4.0),
+    GradeBand(70.0, 79.99, "B", 3.0),
+    GradeBand(60.0, 69.99, "C", 2.0),
+    GradeBand(50.0, 59.99, "D", 1.0),
+    GradeBand(40.0, 49.99, "E", 0.0),
+    GradeBand(0.0, 39.99, "F", 0.0),
+]
+
+
+class TestGradingEngine:
+    """Test grade computation against a compiled scale."""
+
+    def test_weighted_overall_and_band(self):
+        engine = GradingEngine(40.0, 60.0, DEFAULT_BANDS)
+        assert engine.compute(70, 80, None) == (76.0, "B", 3.0)
+        assert engine.compute(None, None, 80) == (80.0, "A", 4.0)
+        assert engine.compute(None, None, None) == (None, None, None)
+
+    def test_bisect_matches_linear_scan(self):
+        engine = GradingEngine(40.0, 60.0, DEFAULT_BANDS)
+        for tenths in range(0, 1001):
+            score = tenths / 10
+            expected = next((b for b in DEFAULT_BANDS if b.min_score <= score <= b.max_score), None)
+            assert engine.band_for(score) == expected
+
+    def test_gaps_and_out_of_range_have_no_grade(self):
+        engine = GradingEngine(40.0, 60.0, DEFAULT_BANDS)
+        assert engine.compute(None, None, 79.995) == (79.995, None, None)
+        assert engine.compute(None, None, 101) == (101.0, None, None)
+
+    def test_overlapping_bands_follow_scale_order(self):
+        bands = [GradeBand(50.0, 100.0, "PASS", 1.0), GradeBand(0.0, 50.0, "FAIL", 0.0)]
+        engine = GradingEngine(50.0, 50.0, bands)
+        assert engine.band_for(50.0).letter == "PASS"
+        assert engine.band_for(49.0).letter == "FAIL"
+
+
+class TestGradingEngineCache:
+    """Test the per-tenant engine cache."""
+
+    def test_invalidate_drops_tenant_entry(self):
+        cache = GradingEngineCache(ttl_seconds=60)
+        engine = GradingEngine(40.0, 60.0, DEFAULT_BANDS)
+        cache.set("school_a", engine, 0)
+        assert cache.get("school_a") is engine
+        cache.invalidate("school_a")
+        assert cache.get("school_a") is None
+
+    def test_entries_expire_after_ttl(self, monkeypatch: pytest.MonkeyPatch):
+        now = [1000.0]
+        monkeypatch.setattr(grading.time, "monotonic", lambda: now[0])
+        cache = GradingEngineCache(ttl_seconds=10)
+        cache.set("school_a", GradingEngine(40.0, 60.0, DEFAULT_BANDS), 0)
+        now[0] += 11
+        assert cache.get("school_a") is None
+
+    def test_load_racing_policy_change_is_not_cached(self, monkeypatch: pytest.MonkeyPatch):
+        cache = GradingEngineCache(ttl_seconds=60)
+        monkeypatch.setattr(grading, "grading_cache", cache)
+        old_engine = GradingEngine(40.0, 60.0, DEFAULT_BANDS)
+
+        def load_then_change(db):
+            # The admin saves a new policy while this load is in flight
+            cache.invalidate("school_a")
+            return old_engine
+
+        monkeypatch.setattr(grading, "load_grading_engine", load_then_change)
+        db = SimpleNamespace(info={"tenant_schema": "school_a"})
+        assert get_grading_engine(db) is old_engine
+        assert cache.get("school_a") is None
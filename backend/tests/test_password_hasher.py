@@ -0,0 +1,57 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services.password_hasher import PasswordHasher, PasswordHasherBusy
+
+
+class TestPasswordHasher:
+    """Test bounded password hashing and rehash-on-login."""
+
+    def test_hash_and_verify(self):
+        hasher = PasswordHasher(workers=0, max_pending=2, queue_timeout=0.1, rounds=4)
+        hashed = hasher.hash("s3cret")
+        assert hashed.startswith("$2b$04$")
+        assert hasher.verify("s3cret", hashed) == (True, None)
+        assert hasher.verify("wrong", hashed) == (False, None)
+        assert hasher.snapshot()["operations"]["verify"]["calls"] == 2
+
+    def test_changed_rounds_rehash_on_verify(self):
+        old_hash = PasswordHasher(workers=0, max_pending=2, queue_timeout=0.1, rounds=4).hash("s3cret")
+        verified, new_hash = PasswordHasher(workers=0, max_pending=2, queue_timeout=0.1, rounds=5).verify("s3cret", old_hash)
+        assert verified
+        assert new_hash.startswith("$2b$05$")
+
+    def test_full_queue_is_rejected(self):
+        hasher = PasswordHasher(workers=0, max_pending=1, queue_timeout=0.01, rounds=4)
+        hasher._slots.acquire()
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash("s3cret")
+        assert hasher.snapshot()["operations"]["hash"]["rejected"] == 1
+
+    def test_broken_pool_is_replaced(self):
+        class _Executor:
+            def __init__(self, broken):
+                self.broken = broken
+                self.shut_down = False
+
+            def submit(self, fn, *args):
+                future = Future()
+                if self.broken:
+                    future.set_exception(BrokenProcessPool("worker died"))
+                else:
+                    future.set_result(fn(*args))
+                return future
+
+            def shutdown(self, wait=True, cancel_futures=False):
+                self.shut_down = True
+
+        hasher = PasswordHasher(workers=1, max_pending=2, queue_timeout=0.1, rounds=4)
+        broken, fresh = _Executor(broken=True), _Executor(broken=False)
+        hasher._executor = broken
+        hasher._new_executor = lambda: fresh
+        assert hasher.hash("s3cret").startswith("$2b$04$")
+        assert broken.shut_down
+        assert hasher._executor is fresh
+        assert hasher.snapshot()["in_flight"] == 0
@@ -0,0 +1,170 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services import rbac
+from app.services.rbac import (
+    EffectivePermissions,
+    decode_permission_bitmap,
+    encode_permission_bitmap,
+    get_effective_permissions,
+    get_effective_permissions_async,
+    invalidate_user_permissions,
+    permission_cache,
+    permissions_from_claims,
+    permissions_from_claims_async,
+    rbac_version_cache,
+)
+from app.tenancy.cache import CachedTenant, tenant_cache
+from tests.conftest import TestingAsyncSessionLocal
+
+
+@pytest.fixture
+def rbac_version_bumps(monkeypatch: pytest.MonkeyPatch) -> list:
+    """Record RBAC version bumps instead of updating public.tenants (absent on SQLite)."""
+    bumps = []
+    monkeypatch.setattr(rbac, "bump_rbac_version", lambda db: bumps.append(db.info.get("tenant_schema")))
+    return bumps
+
+
+@pytest.fixture
+def cached_tenant_session(tenant_db_session: Session, rbac_version_bumps: list):
+    """Tenant session tagged with a schema so the permission cache is used."""
+    permission_cache.clear()
+    tenant_db_session.info["tenant_schema"] = "test_tenant"
+    yield tenant_db_session
+    tenant_db_session.info.pop("tenant_schema", None)
+    tenant_db_session.info.pop("effective_permissions", None)
+    permission_cache.clear()
+
+
+class TestEffectivePermissions:
+    """Test the cached effective-permission lookup."""
+
+    def test_loads_roles_and_permissions(self, tenant_db_session: Session, test_user: dict):
+        perms = get_effective_permissions(tenant_db_session, test_user["id"])
+        assert "Administrator" in perms.roles
+        assert "students.read" in perms.permissions
+        assert perms.has_any_permission({"students.read", "nonexistent"})
+        assert not perms.has_any_role({"Parent"})
+
+    def test_unknown_user_has_nothing(self, tenant_db_session: Session):
+        perms = get_effective_permissions(tenant_db_session, 999999)
+        assert perms.roles == frozenset()
+        assert perms.permissions == frozenset()
+
+    def test_cached_until_invalidated(
+        self, cached_tenant_session: Session, test_user: dict, rbac_version_bumps: list
+    ):
+        before = get_effective_permissions(cached_tenant_session, test_user["id"])
+        assert "Administrator" in before.roles
+
+        cached_tenant_session.execute(text("DELETE FROM user_roles WHERE user_id = :u"), {"u": test_user["id"]})
+        cached_tenant_session.commit()
+        assert get_effective_permissions(cached_tenant_session, test_user["id"]) == before
+
+        invalidate_user_permissions(cached_tenant_session, test_user["id"])
+        assert get_effective_permissions(cached_tenant_session, test_user["id"]).roles == frozenset()
+        assert rbac_version_bumps == ["test_tenant"]
+
+    def test_load_racing_revocation_is_not_cached(
+        self, cached_tenant_session: Session, test_user: dict, monkeypatch: pytest.MonkeyPatch
+    ):
+        real_load = rbac.load_effective_permissions
+
+        def load_then_revoke(db, user_id):
+            perms = real_load(db, user_id)
+            # A settings change commits and invalidates while this load is in flight
+            permission_cache.invalidate_user("test_tenant", user_id)
+            return perms
+
+        monkeypatch.setattr(rbac, "load_effective_permissions", load_then_revoke)
+        assert "Administrator" in get_effective_permissions(cached_tenant_session, test_user["id"]).roles
+        assert permission_cache.get("test_tenant", test_user["id"]) is None
+
+    @pytest.mark.asyncio
+    async def test_async_lookup_matches_sync(self, tenant_db_session: Session, test_user: dict):
+        tenant_db_session.commit()
+        async with TestingAsyncSessionLocal() as session:
+            perms = await get_effective_permissions_async(session, test_user["id"])
+        assert perms == get_effective_permissions(tenant_db_session, test_user["id"])
+
+
+class TestEmbeddedPermissions:
+    """Test the permission digest signed into tokens."""
+
+    def test_bitmap_round_trip(self):
+        bitmap = encode_permission_bitmap({"students.read", "reports.view"})
+        assert decode_permission_bitmap(bitmap) == frozenset({"students.read", "reports.view"})
+
+    def test_uncatalogued_permission_has_no_bitmap(self):
+        assert encode_permission_bitmap({"students.read", "finance.write"}) is None
+
+    def test_claims_trusted_only_for_current_version(
+        self, cached_tenant_session: Session, monkeypatch: pytest.MonkeyPatch
+    ):
+        monkeypatch.setattr(settings, "jwt_embed_permissions", True)
+        tenant_cache.set(CachedTenant(slug="test-tenant", schema_name="test_tenant"))
+        rbac_version_cache.set("test-tenant", 3, rbac_version_cache.generation("test-tenant"))
+        payload = {
+            "sub": "1",
+            "tenant": "test-tenant",
+            "rbac": {"v": 3, "r": ["Teacher"], "p": encode_permission_bitmap({"students.read"})},
+        }
+        try:
+            assert permissions_from_claims(payload, cached_tenant_session) == EffectivePermissions(
+                roles=frozenset({"Teacher"}), permissions=frozenset({"students.read"})
+            )
+            payload["rbac"]["v"] = 2
+            assert permissions_from_claims(payload, cached_tenant_session) is None
+            payload["rbac"]["v"] = 3
+            payload["tenant"] = "other-tenant"
+            assert permissions_from_claims(payload, cached_tenant_session) is None
+        finally:
+            tenant_cache.invalidate("test-tenant")
+            rbac_version_cache.invalidate("test-tenant")
+
+    def test_claims_follow_rbac_version_not_tenant_cache(
+        self, cached_tenant_session: Session, monkeypatch: pytest.MonkeyPatch
+    ):
+        monkeypatch.setattr(settings, "jwt_embed_permissions", True)
+        # The tenant resolution cache still holds the version the token was issued under
+        tenant_cache.set(CachedTenant(slug="test-tenant", schema_name="test_tenant", rbac_version=3))
+        rbac_version_cache.set("test-tenant", 4, rbac_version_cache.generation("test-tenant"))
+        payload = {"sub": "1", "tenant": "test-tenant", "rbac": {"v": 3, "r": [], "p": "1"}}
+        try:
+            assert permissions_from_claims(payload, cached_tenant_session) is None
+        finally:
+            tenant_cache.invalidate("test-tenant")
+            rbac_version_cache.invalidate("test-tenant")
+
+    def test_version_loaded_before_bump_is_not_cached(self):
+        generation = rbac_version_cache.generation("test-tenant")
+        rbac_version_cache.invalidate("test-tenant")
+        rbac_version_cache.set("test-tenant", 3, generation)
+        assert rbac_version_cache.get("test-tenant") is None
+
+    @pytest.mark.asyncio
+    async def test_async_claims_match_sync(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(settings, "jwt_embed_permissions", True)
+        tenant_cache.set(CachedTenant(slug="test-tenant", schema_name="test_tenant"))
+        rbac_version_cache.set("test-tenant", 3, rbac_version_cache.generation("test-tenant"))
+        payload = {"sub": "1", "tenant": "test-tenant", "rbac": {"v": 3, "r": ["Teacher"], "p": "1"}}
+        try:
+            async with TestingAsyncSessionLocal() as session:
+                session.info["tenant_schema"] = "test_tenant"
+                perms = await permissions_from_claims_async(payload, session)
+            assert perms.roles == frozenset({"Teacher"})
+        finally:
+            tenant_cache.invalidate("test-tenant")
+            rbac_version_cache.invalidate("test-tenant")
+
+    def test_claims_ignored_when_disabled(self, cached_tenant_session: Session, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(settings, "jwt_embed_permissions", False)
+        tenant_cache.set(CachedTenant(slug="test-tenant", schema_name="test_tenant"))
+        payload = {"tenant": "test-tenant", "rbac": {"v": 0, "r": [], "p": "1"}}
+        try:
+            assert permissions_from_claims(payload, cached_tenant_session) is None
+        finally:
+            tenant_cache.invalidate("test-tenant")
@@ -0,0 +1,131 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import report_cards
+from app.services.report_cards import ReportCardCache, build_class_cards, get_class_report_cards
+from app.services.term_results import refresh_term_results
+
+
+def _row(student_id, class_name, subject, overall, points, first_name="Pupil", position=None, size=None):
+    return SimpleNamespace(
+        student_id=student_id, first_name=first_name, last_name=str(student_id),
+        admission_no=f"ADM{student_id}", class_name=class_name, subject_name=subject,
+        ca_score=None, exam_score=None, overall_score=overall, grade="A",
+        grade_points=points, is_finalized=True, class_position=position, class_size=size,
+    )
+
+
+class TestBuildClassCards:
+    """Test cards, averages and positions computed from one pass over the records."""
+
+    def test_totals_and_gpa(self):
+        rows = [_row(1, "Form 1", "Maths", 80, 4.0), _row(1, "Form 1", "English", 65, 2.0)]
+        card = build_class_cards(rows, "2025", "Term 1")["Form 1"][1]
+        assert card["total_subjects"] == 2
+        assert card["total_points"] == 6.0
+        assert card["gpa"] == card["overall_gpa"] == 3.0
+        assert card["term_average"] == 72.5
+        assert card["subjects"][0]["ca_score"] == 0.0
+        assert "_average" not in card
+
+    def test_positions_come_from_term_results(self):
+        rows = [
+            _row(1, "Form 1", "Maths", 60, 2.0, position=3, size=3),
+            _row(1, "Form 1", "English", 90, 4.0, position=3, size=3),
+            _row(2, "Form 1", "Maths", 90, 4.0, position=1, size=3),
+        ]
+        form1 = build_class_cards(rows, "2025", "Term 1")["Form 1"]
+        assert form1[1]["class_position"] == 3
+        assert form1[2]["class_position"] == 1
+        assert all(card["total_students_in_class"] == 3 for card in form1.values())
+
+    def test_students_without_stored_results_are_not_ranked(self):
+        card = build_class_cards([_row(1, None, "Maths", 70, 3.0)], "2025", "Term 1")[None][1]
+        assert card["class_name"] == "Not Assigned"
+        assert "class_position" not in card
+
+    def test_report_query_reads_positions_from_term_results(self):
+        assert "LEFT JOIN term_results tr" in report_cards.REPORT_CARD_SQL
+
+
+class TestReportCardCache:
+    """Test per-class caching and tenant invalidation."""
+
+    def test_invalidate_tenant_drops_only_that_tenant(self):
+        cache = ReportCardCache(ttl_seconds=60)
+        cache.set(("school_a", "Form 1", "2025", "Term 1"), {1: {}}, 0)
+        cache.set(("school_a", "Form 2", "2025", "Term 1"), {2: {}}, 0)
+        cache.set(("school_b", "Form 1", "2025", "Term 1"), {3: {}}, 0)
+        cache.invalidate_tenant("school_a")
+        assert cache.get(("school_a", "Form 1", "2025", "Term 1")) is None
+        assert cache.get(("school_a", "Form 2", "2025", "Term 1")) is None
+        assert cache.get(("school_b", "Form 1", "2025", "Term 1")) == {3: {}}
+
+    def test_zero_ttl_disables_caching(self):
+        cache = ReportCardCache(ttl_seconds=0)
+        cache.set(("school_a", "Form 1", "2025", "Term 1"), {1: {}}, 0)
+        assert cache.get(("school_a", "Form 1", "2025", "Term 1")) is None
+
+    def test_set_after_invalidation_is_dropped(self):
+        cache = ReportCardCache(ttl_seconds=60)
+        generation = cache.generation("school_a")
+        cache.invalidate_tenant("school_a")
+        cache.set(("school_a", "Form 1", "2025", "Term 1"), {1: {}}, generation)
+        assert cache.get(("school_a", "Form 1", "2025", "Term 1")) is None
+        cache.set(("school_a", "Form 1", "2025", "Term 1"), {1: {}}, cache.generation("school_a"))
+        assert cache.get(("school_a", "Form 1", "2025", "Term 1")) == {1: {}}
+
+    def test_load_racing_invalidation_is_not_cached(self, monkeypatch):
+        cache = ReportCardCache(ttl_seconds=60)
+        monkeypatch.setattr(report_cards, "report_card_cache", cache)
+
+        async def stale_load(db, year, term, whole_school, class_name=None):
+            # Grades are finalized and the tenant invalidated while this query runs
+            cache.invalidate_tenant("school_a")
+            return {"Form 1": {1: {"stale": True}}}
+
+        monkeypatch.setattr(report_cards, "_load", stale_load)
+        db = SimpleNamespace(info={"tenant_schema": "school_a"})
+        cards = asyncio.run(get_class_report_cards(db, "Form 1", "2025", "Term 1"))
+        assert cards == {1: {"stale": True}}
+        assert cache.get(("school_a", "Form 1", "2025", "Term 1")) is None
+
+    def test_failed_load_releases_inflight_lock(self, monkeypatch):
+        monkeypatch.setattr(report_cards, "report_card_cache", ReportCardCache(ttl_seconds=60))
+
+        async def failing_load(db, year, term, whole_school, class_name=None):
+            raise RuntimeError("database went away")
+
+        monkeypatch.setattr(report_cards, "_load", failing_load)
+        db = SimpleNamespace(info={"tenant_schema": "school_a"})
+        with pytest.raises(RuntimeError):
+            asyncio.run(get_class_report_cards(db, "Form 1", "2025", "Term 1"))
+        assert ("school_a", "Form 1", "2025", "Term 1") not in report_cards._inflight
+
+
+class _RecordingSession:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, statement, params=None):
+        self.calls.append((str(statement), params))
+        return SimpleNamespace(rowcount=3)
+
+
+class TestTermResults:
+    """Test the class-wide rebuild run on finalize."""
+
+    def test_rebuilds_each_class_once(self):
+        db = _RecordingSession()
+        assert refresh_term_results(db, "2025", "Term 1", ["Form 2", "Form 1", "Form 2", None]) == 3
+        (delete_sql, delete_params), (insert_sql, insert_params) = db.calls
+        assert delete_sql.strip().startswith("DELETE FROM term_results")
+        assert delete_params["classes"] == insert_params["classes"] == ["Form 1", "Form 2"]
+        assert "PARTITION BY class_name ORDER BY average_score DESC, student_id" in insert_sql
+
+    def test_no_classes_skips_the_database(self):
+        db = _RecordingSession()
+        assert refresh_term_results(db, "2025", "Term 1", [None]) == 0
+        assert db.calls == []
@@ -35,6 +35,32 @@ class TestStudentManagement:
         response = client.get("/api/students", headers=readonly_auth_headers)
         assert response.status_code in (401, 403)
     
+    def test_list_students_keyset_pagination(self, client: TestClient, auth_headers: dict, tenant_db_session: Session):
+        """Test paging through students with a cursor and a field projection."""
+        for i, (first, last) in enumerate([("Ada", "Banda"), ("Ada", "Phiri"), ("Chikondi", "Mwale")]):
+            tenant_db_session.execute(text("""
+                INSERT INTO students(first_name, last_name, admission_no) VALUES (:f, :l, :a)
+            """), {"f": first, "l": last, "a": f"PAGE{i}"})
+        tenant_db_session.commit()
+
+        response = client.get("/api/students?limit=2&fields=id,first_name,last_name&include_total=true", headers=auth_headers)
+        assert response.status_code == 200
+        first_page = response.json()
+        assert [(s["first_name"], s["last_name"]) for s in first_page] == [("Ada", "Banda"), ("Ada", "Phiri")]
+        assert set(first_page[0]) == {"id", "first_name", "last_name"}
+        assert response.headers["X-Total-Count"] == "3"
+
+        cursor = response.headers["X-Next-Cursor"]
+        response = client.get(f"/api/students?limit=2&fields=id,first_name,last_name&cursor={cursor}", headers=auth_headers)
+        assert response.status_code == 200
+        assert [s["first_name"] for s in response.json()] == ["Chikondi"]
+        assert "X-Next-Cursor" not in response.headers
+
+    def test_list_students_rejects_unknown_fields(self, client: TestClient, auth_headers: dict):
+        """Test that projections are limited to student fields."""
+        response = client.get("/api/students?fields=id,hashed_password", headers=auth_headers)
+        assert response.status_code == 400
+
     def test_list_students_filter_by_class(self, client: TestClient, auth_headers: dict, test_student: dict):
         """Test listing students filtered by class."""
         # Test with existing class
@@ -0,0 +1,78 @@
+from datetime import date
+
+from app.api.routers.teachers import _grade_mark_sheet
+from app.services.attendance import upsert_attendance
+from app.schemas.teachers import MarkSheetEntry
+from app.services.grading import GradeBand, GradingEngine
+
+ENGINE = GradingEngine(40.0, 60.0, [GradeBand(50.0, 100.0, "P", 1.0), GradeBand(0.0, 49.99, "F", 0.0)])
+
+
+class TestMarkSheetGrading:
+    """Test validation and grading of a whole mark sheet."""
+
+    def test_grades_valid_rows_and_reports_each_entry(self):
+        roster = {1: (None, False), 2: (17, False), 3: (18, True)}
+        entries = [
+            MarkSheetEntry(student_id=1, ca_score=60, exam_score=70),
+            MarkSheetEntry(student_id=2, overall_score=40, comments="Needs support"),
+            MarkSheetEntry(student_id=3, ca_score=50, exam_score=50),
+            MarkSheetEntry(student_id=4, ca_score=50, exam_score=50),
+            MarkSheetEntry(student_id=1, ca_score=10, exam_score=10),
+            MarkSheetEntry(student_id=2, ca_score=120),
+        ]
+        rows, results = _grade_mark_sheet(entries, roster, ENGINE)
+
+        assert [r["student_id"] for r in rows] == [1, 2]
+        assert rows[0] == {
+            "student_id": 1, "existing_id": None, "ca_score": 60, "exam_score": 70,
+            "overall_score": 66.0, "grade": "P", "grade_points": 1.0, "remarks": None,
+        }
+        assert rows[1]["existing_id"] == 17 and rows[1]["grade"] == "F"
+        assert [(r.student_id, r.status, r.error) for r in results] == [
+            (1, "saved", None),
+            (2, "saved", None),
+            (3, "error", "Record is finalized"),
+            (4, "error", "Student is not in this class"),
+            (1, "error", "Duplicate entry for student"),
+            (2, "error", "Duplicate entry for student"),
+        ]
+
+    def test_rejects_out_of_range_and_empty_rows(self):
+        roster = {1: (None, False), 2: (None, False)}
+        entries = [MarkSheetEntry(student_id=1, exam_score=101), MarkSheetEntry(student_id=2)]
+        rows, results = _grade_mark_sheet(entries, roster, ENGINE)
+        assert rows == []
+        assert [r.error for r in results] == ["Scores must be between 0 and 100", "No scores provided"]
+
+
+class _RecordingSession:
+    def __init__(self):
+        self.calls = []
+
+    def execute(self, statement, params=None):
+        self.calls.append((str(statement), params))
+
+
+class TestAttendanceUpsert:
+    """Test the single-statement register write."""
+
+    def test_one_statement_and_last_entry_wins(self):
+        db = _RecordingSession()
+        written = upsert_attendance(
+            db, 3, date(2026, 2, 2),
+            [(1, "present", None), (2, "absent", "Sick"), (1, "late", "Bus")],
+            recorded_by=9,
+        )
+        assert written == 2
+        assert len(db.calls) == 1
+        sql, params = db.calls[0]
+        assert "unnest" in sql and "ON CONFLICT (student_id, class_id, date)" in sql
+        assert params["student_ids"] == [1, 2]
+        assert params["statuses"] == ["late", "absent"]
+        assert params["notes"] == ["Bus", "Sick"]
+
+    def test_empty_register_skips_the_database(self):
+        db = _RecordingSession()
+        assert upsert_attendance(db, 3, date(2026, 2, 2), [], recorded_by=9) == 0
+        assert db.calls == []
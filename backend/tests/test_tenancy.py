@@ -0,0 +1,348 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.pool_metrics import PoolMetrics
+from app.db.session import TenantSession, track_search_path
+from app.tenancy import cache as tenancy_cache
+from app.tenancy.indexes import TENANT_INDEXES, IndexSpec
+from app.tenancy.migrations import MIGRATIONS, LATEST_VERSION, Migration, pending_migrations
+from app.tenancy import metrics as tenancy_metrics
+from app.tenancy.stats import build_count_query, tenant_counts
+from app.tenancy.orchestrator import REQUIRED_TABLES, TenantResult, provision_tenant, provision_tenants
+from app.tenancy.service import (
+    DEFAULT_PERMISSIONS,
+    DEFAULT_ROLE_PERMISSIONS,
+    DEFAULT_ROLES,
+    DEFAULT_USERS,
+    TENANT_BASE_SCHEMA_SQL,
+    _values,
+)
+from app.tenancy.cache import CachedTenant, TenantResolutionCache, resolve_tenant
+from app.services.user_directory import DirectoryEntry
+from app.tenancy.domains import DomainTarget, TenantDomainIndex, normalize_domain
+
+
+class TestTenantResolutionCache:
+    """Test the in-process slug -> schema cache."""
+
+    def test_get_returns_cached_entry(self):
+        cache = TenantResolutionCache(ttl_seconds=60)
+        cache.set(CachedTenant(slug="school-a", schema_name="school_a"))
+        assert cache.get("school-a").schema_name == "school_a"
+        assert cache.get("school-b") is None
+
+    def test_entries_expire_after_ttl(self, monkeypatch: pytest.MonkeyPatch):
+        now = [1000.0]
+        monkeypatch.setattr(tenancy_cache.time, "monotonic", lambda: now[0])
+        cache = TenantResolutionCache(ttl_seconds=10)
+        cache.set(CachedTenant(slug="school-a", schema_name="school_a"))
+        now[0] += 11
+        assert cache.get("school-a") is None
+
+    def test_invalidate_drops_entry(self):
+        cache = TenantResolutionCache(ttl_seconds=60)
+        cache.set(CachedTenant(slug="school-a", schema_name="school_a"))
+        cache.invalidate("school-a")
+        assert cache.get("school-a") is None
+
+    def test_zero_ttl_disables_cache(self):
+        cache = TenantResolutionCache(ttl_seconds=0)
+        cache.set(CachedTenant(slug="school-a", schema_name="school_a"))
+        assert cache.get("school-a") is None
+
+    def test_resolve_tenant_only_queries_on_miss(self, public_db_session: Session, test_tenant: dict):
+        tenancy_cache.tenant_cache.clear()
+        resolved = resolve_tenant(public_db_session, test_tenant["slug"])
+        assert resolved.schema_name == test_tenant["schema_name"]
+
+        # A cached entry survives the row disappearing until it is invalidated
+        public_db_session.execute(text("DELETE FROM tenants WHERE slug = :s"), {"s": test_tenant["slug"]})
+        public_db_session.commit()
+        assert resolve_tenant(public_db_session, test_tenant["slug"]).schema_name == test_tenant["schema_name"]
+
+        tenancy_cache.tenant_cache.invalidate(test_tenant["slug"])
+        assert resolve_tenant(public_db_session, test_tenant["slug"]) is None
+
+
+class _DomainRowsSession:
+    """Answers the two queries TenantDomainIndex.load issues."""
+
+    def __init__(self, domains, tenants):
+        self.domains = domains
+        self.tenants = tenants
+
+    def execute(self, statement, params=None):
+        rows = self.domains if "tenant_domains" in str(statement) else self.tenants
+        return type("Result", (), {"all": lambda _self: rows})()
+
+
+class TestTenantDomainIndex:
+    """Test in-memory email domain -> tenant resolution."""
+
+    def _index(self) -> TenantDomainIndex:
+        index = TenantDomainIndex(ttl_seconds=60)
+        index.load(_DomainRowsSession(
+            domains=[SimpleNamespace(domain="ndirande-high.edu", slug="ndirande-high", schema_name="ndirande_high")],
+            tenants=[
+                SimpleNamespace(slug="ndirande-high", schema_name="ndirande_high"),
+                SimpleNamespace(slug="mulanje-sec", schema_name="mulanje_sec"),
+            ],
+        ))
+        return index
+
+    def test_registered_domain_and_subdomains(self):
+        index = self._index()
+        assert index.lookup("ndirande-high.edu").schema_name == "ndirande_high"
+        assert index.lookup("Teacher.Ndirande-High.edu").schema_name == "ndirande_high"
+
+    def test_unregistered_domain_falls_back_to_slug_words(self):
+        index = self._index()
+        assert index.lookup("mulanje.ac.mw").slug == "mulanje-sec"
+        assert index.lookup("example.com") is None
+
+    def test_invalidate_marks_index_stale(self):
+        index = self._index()
+        assert not index.is_stale()
+        index.invalidate()
+        assert index.is_stale()
+
+    def test_normalize_domain(self):
+        assert normalize_domain(" .School.EDU. ") == "school.edu"
+        assert normalize_domain("user@school.edu") is None
+        assert normalize_domain("localhost") is None
+
+
+class TestPoolMetrics:
+    """Test per-schema connection checkout accounting."""
+
+    def test_tracks_wait_hold_and_concurrency(self):
+        metrics = PoolMetrics()
+        metrics.checked_out("school_a", 0.010)
+        metrics.checked_out("school_a", 0.030)
+        metrics.checked_in("school_a", 0.5)
+        metrics.timed_out("school_b", 30.0)
+
+        snapshot = metrics.snapshot()
+        assert snapshot["school_a"]["checkouts"] == 2
+        assert snapshot["school_a"]["in_use"] == 1
+        assert snapshot["school_a"]["peak_in_use"] == 2
+        assert snapshot["school_a"]["avg_wait_ms"] == pytest.approx(20.0)
+        assert snapshot["school_a"]["max_wait_seconds"] == pytest.approx(0.030)
+        assert snapshot["school_b"]["timeouts"] == 1
+        assert snapshot["school_b"]["checkouts"] == 0
+
+
+class TestSearchPathAffinity:
+    """Test that set_config is only issued when a connection changes tenant."""
+
+    @pytest.fixture
+    def calls(self) -> list:
+        return []
+
+    @pytest.fixture
+    def make_session(self, calls: list):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+
+        @event.listens_for(engine, "connect")
+        def register_set_config(dbapi_connection, _):
+            # Stand-in for Postgres' set_config so the issued calls can be counted
+            dbapi_connection.create_function("set_config", 3, lambda name, value, local: calls.append(value) or value)
+
+        track_search_path(engine)
+        factory = sessionmaker(bind=engine, class_=TenantSession)
+
+        def make(schema_name: str) -> Session:
+            session = factory()
+            session.info["tenant_schema"] = schema_name
+            session.info["search_path_affinity"] = True
+            return session
+
+        yield make
+        engine.dispose()
+
+    def test_skips_set_config_for_same_tenant(self, make_session, calls: list):
+        for _ in range(3):
+            with make_session("school_a") as session, session.begin():
+                session.execute(text("SELECT 1"))
+        assert calls == ["school_a, public"]
+
+        with make_session("school_b") as session, session.begin():
+            session.execute(text("SELECT 1"))
+        assert calls == ["school_a, public", "school_b, public"]
+
+    def test_reapplies_after_rollback(self, make_session, calls: list):
+        session = make_session("school_a")
+        session.execute(text("SELECT 1"))
+        session.rollback()
+        session.execute(text("SELECT 1"))
+        session.commit()
+        session.close()
+        assert calls == ["school_a, public", "school_a, public"]
+
+
+class TestTenantIndexes:
+    """Test the declared tenant index set."""
+
+    def test_create_sql_is_concurrent_and_schema_qualified(self):
+        spec = IndexSpec("ix_attendance_class_date", "attendance", "(class_id, date)")
+        assert spec.create_sql("school_a") == (
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_attendance_class_date ON "school_a".attendance (class_id, date)'
+        )
+        assert spec.drop_sql("school_a") == 'DROP INDEX CONCURRENTLY IF EXISTS "school_a".ix_attendance_class_date'
+
+    def test_declared_indexes_target_tenant_tables(self):
+        names = [spec.name for spec in TENANT_INDEXES]
+        assert len(names) == len(set(names))
+        for spec in TENANT_INDEXES:
+            assert f"CREATE TABLE IF NOT EXISTS {spec.table} (" in TENANT_BASE_SCHEMA_SQL
+
+
+
+class TestTenantMigrations:
+    """Test pending-step selection and the parallel runner."""
+
+    def test_versions_are_unique_and_ascending(self):
+        versions = [m.version for m in MIGRATIONS]
+        assert versions == sorted(set(versions))
+        assert LATEST_VERSION == versions[-1]
+
+    def test_only_pending_steps_run_in_order(self):
+        steps = [Migration(v, f"step_{v}", lambda db, schema: None) for v in (3, 1, 2)]
+        assert [m.version for m in pending_migrations([], steps)] == [1, 2, 3]
+        assert [m.version for m in pending_migrations([1, 3], steps)] == [2]
+        assert pending_migrations([1, 2, 3], steps) == []
+
+
+class TestSeedDefaults:
+    """Test the data behind the set-based tenant seed."""
+
+    def test_values_renders_bind_parameters(self):
+        values, params = _values([("a", 1), ("b", 2)], "p")
+        assert values == "VALUES (:p0_0, :p0_1), (:p1_0, :p1_1)"
+        assert params == {"p0_0": "a", "p0_1": 1, "p1_0": "b", "p1_1": 2}
+
+    def test_grants_reference_declared_roles_and_permissions(self):
+        permissions = {name for name, _ in DEFAULT_PERMISSIONS}
+        roles = {name for name, _ in DEFAULT_ROLES}
+        assert set(DEFAULT_ROLE_PERMISSIONS) <= roles
+        for perms in DEFAULT_ROLE_PERMISSIONS.values():
+            assert set(perms) <= permissions
+        for user in DEFAULT_USERS:
+            assert set(user["roles"]) <= roles
+
+
+class TestProvisioningOrchestrator:
+    """Test the parallel tenant provisioning batch."""
+
+    def test_required_tables_cover_base_schema(self):
+        assert {"users", "roles", "students", "schema_migrations"} <= set(REQUIRED_TABLES)
+
+    def test_failures_are_recorded_not_raised(self):
+        def migrate(schema: str):
+            if schema == "school_b":
+                raise ValueError("boom")
+            return [1]
+
+        result = provision_tenant("school_b", migrate=migrate, check=lambda schema: [])
+        assert not result.ok and result.error == "ValueError: boom"
+        result = provision_tenant("school_a", migrate=migrate, check=lambda schema: ["no roles seeded"])
+        assert not result.ok and result.applied == [1]
+
+    def test_batch_reports_progress_in_input_order(self):
+        progress = []
+
+        def provision(schema: str, reseed: bool, verify: bool) -> TenantResult:
+            return TenantResult(schema_name=schema, error="boom" if schema == "school_b" else None)
+
+        report = provision_tenants(
+            ["school_a", "school_b", "school_c"],
+            workers=2,
+            on_progress=lambda done, total, result: progress.append((done, total)),
+            provision=provision,
+        )
+        assert [r.schema_name for r in report.results] == ["school_a", "school_b", "school_c"]
+        assert [r.schema_name for r in report.failed] == ["school_b"]
+        assert sorted(progress) == [(1, 3), (2, 3), (3, 3)]
+
+
+class TestCrossTenantStats:
+    """Test the single-query cross-tenant counts."""
+
+    def test_count_query_is_one_union(self):
+        sql = build_count_query([("school_a", "students"), ("school_b", "active_users")])
+        assert sql == (
+            'SELECT 0 AS i, count(*) AS n FROM "school_a".students\n'
+            "UNION ALL\n"
+            'SELECT 1 AS i, count(*) AS n FROM "school_b".users WHERE is_active = true'
+        )
+
+    def test_rejects_unknown_mode(self, db_session: Session):
+        with pytest.raises(ValueError):
+            tenant_counts(db_session, ["school_a"], ["students"], mode="guess")
+
+    def test_no_tenants_needs_no_query(self, db_session: Session):
+        assert tenant_counts(db_session, [], ["students"], mode="exact") == {}
+
+
+class TestTenantMetrics:
+    """Test how dashboards pick between stored and live counts."""
+
+    def test_stored_mode_reads_metrics_table(self, monkeypatch: pytest.MonkeyPatch, db_session: Session):
+        stored = {"school_a": {"students": 12, "invoices": 3, "refreshed_at": "2026-01-01T00:00:00"}}
+        monkeypatch.setattr(tenancy_metrics, "read_tenant_metrics", lambda db: stored)
+        counts = tenancy_metrics.dashboard_counts(db_session, ["school_a", "school_b"], ["students", "invoices"], "stored")
+        assert counts["school_a"] == {"students": 12, "invoices": 3, "refreshed_at": "2026-01-01T00:00:00"}
+        assert counts["school_b"] == {"students": 0, "invoices": 0, "refreshed_at": None}
+
+    def test_live_mode_bypasses_metrics_table(self, monkeypatch: pytest.MonkeyPatch, db_session: Session):
+        monkeypatch.setattr(tenancy_metrics, "read_tenant_metrics", lambda db: pytest.fail("read stored metrics"))
+        assert tenancy_metrics.dashboard_counts(db_session, [], ["students"], "exact") == {}
+
+    def test_refresher_disabled_at_zero_interval(self):
+        refresher = tenancy_metrics.TenantMetricsRefresher(interval_seconds=0)
+        refresher.start()
+        assert refresher._thread is None
+
+    def test_change_markers_only_watch_metric_tables(self):
+        calls = []
+
+        class _Session:
+            def execute(self, statement, params=None):
+                calls.append((str(statement), params))
+                return SimpleNamespace(all=lambda: [SimpleNamespace(schema_name="school_a", writes=7)])
+
+        assert tenancy_metrics.change_markers(_Session(), ["school_a"]) == {"school_a": 7}
+        sql, params = calls[0]
+        assert "relname = ANY(:tables)" in sql
+        assert {"students", "users", "invoices", "payments"} <= set(params["tables"])
+        assert "attendance" not in params["tables"]
+        assert "audit_logs" not in params["tables"]
+
+
+class TestUserDirectoryLogin:
+    """Test how simple-login picks a tenant from directory entries and the email domain."""
+
+    def _patch(self, monkeypatch: pytest.MonkeyPatch, entries, by_domain):
+        from app.api.routers import auth
+        monkeypatch.setattr(auth, "find_user", lambda db, email: entries)
+        monkeypatch.setattr(auth, "resolve_email_domain", lambda domain: by_domain)
+        return auth._login_target
+
+    def test_single_directory_entry_wins(self, monkeypatch: pytest.MonkeyPatch):
+        login_target = self._patch(monkeypatch, [DirectoryEntry("school-a", "school_a", 7)], None)
+        assert login_target("t@anything.org") == (DomainTarget("school-a", "school_a"), True)
+
+    def test_domain_picks_between_several_accounts(self, monkeypatch: pytest.MonkeyPatch):
+        entries = [DirectoryEntry("school-a", "school_a", 7), DirectoryEntry("school-b", "school_b", 3)]
+        login_target = self._patch(monkeypatch, entries, DomainTarget("school-b", "school_b"))
+        assert login_target("t@school-b.edu") == (DomainTarget("school-b", "school_b"), True)
+        login_target = self._patch(monkeypatch, entries, None)
+        assert login_target("t@elsewhere.org") == (None, True)
+
+    def test_users_missing_from_directory_fall_back_to_domain(self, monkeypatch: pytest.MonkeyPatch):
+        login_target = self._patch(monkeypatch, [], DomainTarget("school-a", "school_a"))
+        assert login_target("t@school-a.edu") == (DomainTarget("school-a", "school_a"), False)
@@ -0,0 +1,58 @@
+import pytest
+from jose import JWTError
+
+from app.services import tokens
+from app.services.security import create_access_token
+from app.services.tokens import DecodedTokenCache, RefreshPolicy, decode_access_token
+
+
+class TestRefreshPolicy:
+    """Test the sliding-token refresh thresholds."""
+
+    def test_refreshes_only_after_threshold(self):
+        policy = RefreshPolicy(idle_timeout_seconds=1200, threshold_percent=50)
+        assert not policy.should_refresh(issued_at=1000, now=1000 + 599)
+        assert policy.should_refresh(issued_at=1000, now=1000 + 600)
+
+    def test_zero_threshold_refreshes_every_request(self):
+        policy = RefreshPolicy(idle_timeout_seconds=1200, threshold_percent=0)
+        assert policy.should_refresh(issued_at=1000, now=1000)
+
+    def test_idle_expiry(self):
+        policy = RefreshPolicy(idle_timeout_seconds=1200, threshold_percent=50)
+        assert not policy.is_idle_expired(issued_at=1000, now=2200)
+        assert policy.is_idle_expired(issued_at=1000, now=2201)
+
+
+class TestDecodedTokenCache:
+    """Test memoization of verified token payloads."""
+
+    def test_decode_is_memoized(self, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(tokens, "decoded_token_cache", DecodedTokenCache(max_size=8))
+        token = create_access_token(subject="7", extra={"tenant": "test-tenant"})
+        first = decode_access_token(token)
+        assert first["sub"] == "7"
+        assert decode_access_token(token) is first
+
+    def test_expired_entries_are_not_served(self, monkeypatch: pytest.MonkeyPatch):
+        now = [1000.0]
+        monkeypatch.setattr(tokens.time, "time", lambda: now[0])
+        cache = DecodedTokenCache(max_size=8)
+        cache.set("token", {"sub": "7", "exp": 1010})
+        assert cache.get("token") is not None
+        now[0] = 1010
+        assert cache.get("token") is None
+
+    def test_evicts_least_recently_used(self):
+        cache = DecodedTokenCache(max_size=2)
+        far_future = 4102444800
+        cache.set("a", {"exp": far_future})
+        cache.set("b", {"exp": far_future})
+        cache.get("a")
+        cache.set("c", {"exp": far_future})
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+
+    def test_invalid_token_still_rejected(self):
+        with pytest.raises(JWTError):
+            decode_access_token("not-a-token")